@@ -0,0 +1,72 @@
+"""
+Benchmark: dense-array anomalies vs. the groupby + merge of calculate_baseline_and_anomaly.
+
+Usage:
+    python benchmarks/bench_anomaly.py [--stations 27000] [--years 125]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ghcn_tools.anomaly import annual_mean, block_anomalies, ensemble_mean  # noqa: E402
+from ghcn_tools.store import MonthlyBlock  # noqa: E402
+
+
+def calculate_baseline_and_anomaly(data, baseline_start=1920, baseline_end=1940):
+    """The notebook version, without the print."""
+    data['tavg'] = data['tavg'] / 100
+    baseline_data = data[(data['year'] >= baseline_start) & (data['year'] <= baseline_end)]
+    baseline = baseline_data.groupby(['station_id', 'month'])['tavg'].mean().reset_index()
+    baseline.rename(columns={'tavg': 'baseline'}, inplace=True)
+    data_with_baseline = pd.merge(data, baseline, on=['station_id', 'month'], how='left')
+    data_with_baseline['anomaly'] = data_with_baseline['tavg'] - data_with_baseline['baseline']
+    data_with_baseline = data_with_baseline.dropna(subset=['baseline'])
+    return data_with_baseline
+
+
+def measure(func):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stations', type=int, default=27000)
+    parser.add_argument('--years', type=int, default=125)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    value = rng.integers(-2500, 3500, (args.stations, args.years, 12), dtype=np.int16)
+    value[rng.random(value.shape) < 0.3] = -9999
+    block = MonthlyBlock(np.array([f'XX{i:09d}' for i in range(args.stations)]),
+                         np.arange(1900, 1900 + args.years), value)
+    print(f"{args.stations} stations x {args.years} years")
+
+    def dense():
+        ids, anoms, _ = block_anomalies(block, 1920, 1940)
+        monthly, _ = ensemble_mean(anoms)
+        return annual_mean(monthly)
+
+    def long_format():
+        anomaly_data = calculate_baseline_and_anomaly(block.to_long(), 1920, 1940)
+        return anomaly_data.groupby('year')['anomaly'].mean()
+
+    _, t_dense, m_dense = measure(dense)
+    print(f"dense arrays : {t_dense:7.2f} s, peak {m_dense:8.0f} MB")
+    _, t_long, m_long = measure(long_format)
+    print(f"long + merge : {t_long:7.2f} s, peak {m_long:8.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark: batched BI extraction against a synthetic local raster.
+
+Usage:
+    python benchmarks/bench_brightness.py [--stations 27000] [--batch-size 500]
+
+Runs `extract_brightness` with a `RasterBackend` on a global 30 arc-second-like
+grid, once from scratch and once resuming from the written checkpoint.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ghcn_tools.brightness import BI_YEARS, RasterBackend, extract_brightness  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stations', type=int, default=27000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    grid = (rng.gamma(0.3, 5.0, size=(2160, 4320))).astype(np.float32)
+    backend = RasterBackend({year: (grid * (1 + 0.02 * (year - 2012)), (-180, -90, 180, 90)) for year in BI_YEARS})
+    stations = pd.DataFrame({
+        'ID': [f"ST{i:09d}" for i in range(args.stations)],
+        'Lat': rng.uniform(-60, 75, args.stations),
+        'Lon': rng.uniform(-180, 180, args.stations),
+    })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = os.path.join(tmp, 'bi_checkpoint.csv')
+        t0 = time.perf_counter()
+        out = extract_brightness(stations, backend, checkpoint_path=checkpoint,
+                                 batch_size=args.batch_size, max_workers=args.workers)
+        t1 = time.perf_counter()
+        again = extract_brightness(stations, backend, checkpoint_path=checkpoint,
+                                   batch_size=args.batch_size, max_workers=args.workers)
+        t2 = time.perf_counter()
+    assert np.allclose(out[[f"BI_{y}" for y in BI_YEARS]], again[[f"BI_{y}" for y in BI_YEARS]], equal_nan=True)
+    print(f"{args.stations} stations x {len(BI_YEARS)} years: {t1 - t0:.2f} s extract, {t2 - t1:.2f} s resume")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: vectorized GHCN-M decoder vs. the per-line loop of HUSCRN.ipynb.
+
+Usage:
+    python benchmarks/bench_decode.py [path/to/ghcnm.tavg.*.qcu.dat] [--stations 3000]
+
+Without a path a synthetic .dat file is written to a temporary directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ghcn_tools.decode import annual_means, decode_records  # noqa: E402
+
+
+def write_synthetic_dat(path, n_stations, first_year=1880, last_year=2024, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        for s in range(n_stations):
+            sid = f"{'US' if s % 3 else 'GM'}C{s:08d}"
+            for year in range(first_year, last_year + 1):
+                if rng.random() < 0.15:
+                    continue
+                vals = rng.integers(-2500, 3500, 12)
+                vals[rng.random(12) < 0.05] = -9999
+                f.write(f"{sid}{year}TAVG" + ''.join(f"{v:5d}  G" for v in vals) + '\n')
+
+
+def huscrn_loop(path, station_ids, start_year, end_year, min_months):
+    """The parsing loop of HUSCRN.ipynb (Steps 2 and 3), reading from a plain file."""
+    filtered_lines = []
+    with open(path, 'rb') as dat_file:
+        for line in dat_file:
+            sid = line[0:11].decode("utf-8").strip()
+            if sid in station_ids and line[15:19].decode("utf-8") == "TAVG":
+                filtered_lines.append(line.decode("utf-8"))
+    records = []
+    for line in filtered_lines:
+        sid = line[0:11].strip()
+        year = int(line[11:15])
+        if year < start_year or year > end_year:
+            continue
+        monthly = [int(line[19 + m*8:24 + m*8]) for m in range(12)]
+        monthly = [v / 100.0 if v != -9999 else None for v in monthly]
+        if sum(v is not None for v in monthly) >= min_months:
+            avg = np.mean([v for v in monthly if v is not None])
+            records.append([year, avg, sid])
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('--stations', type=int, default=3000, help='synthetic stations if no path is given')
+    args = parser.parse_args()
+
+    tmp = None
+    path = args.path
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, 'synthetic.qcu.dat')
+        write_synthetic_dat(path, args.stations)
+    size_mb = os.path.getsize(path) / 1e6
+
+    # Select every 2nd station so the station filter has real work to do
+    all_ids = decode_records(path)['station_id']
+    station_ids = {sid.decode() for sid in np.unique(all_ids)[::2]}
+    start_year, end_year, min_months = 1900, 2024, 11
+
+    t0 = time.perf_counter()
+    expected = huscrn_loop(path, station_ids, start_year, end_year, min_months)
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rec = decode_records(path, 'TAVG', station_ids, start_year, end_year, min_months)
+    means = annual_means(rec)
+    t_vec = time.perf_counter() - t0
+
+    assert len(expected) == len(rec['year'])
+    assert np.allclose([r[1] for r in expected], means)
+
+    print(f"file: {path} ({size_mb:.1f} MB), matching station-years: {len(expected)}")
+    print(f"per-line loop : {t_loop:8.3f} s")
+    print(f"vectorized    : {t_vec:8.3f} s  ({t_loop / t_vec:.1f}x faster)")
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark suite: time and memory of every pipeline stage on synthetic GHCN data.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scales 100,5000,30000] [--first-year 1850] [--keep DIR]
+
+For every scale a synthetic data set (``ghcn_tools.synthetic``) is generated,
+then the stages run in pipeline order: inventory read, data parse (ingest),
+completeness filter, baseline/anomaly, binning, LOESS, ensemble and map export
+(one marker per station, as before), plus the GeoJSON layer export of
+`ghcn_tools.mapexport` as its own 'map export (geojson)' stage.
+Wall time and peak traced memory (tracemalloc, which also sees NumPy buffers)
+are recorded per stage and saved to ``benchmarks/results/<scale>_<timestamp>.json``
+together with the git revision; the previous result of the same scale is
+printed alongside, so regressions between versions show up.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import folium
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ghcn_tools.anomaly import annual_mean, block_anomalies, ensemble_mean  # noqa: E402
+from ghcn_tools.coverage import CoverageIndex  # noqa: E402
+from ghcn_tools.inventory import read_station_inventory  # noqa: E402
+from ghcn_tools.loess import clear_cache, lowess_batch  # noqa: E402
+from ghcn_tools.mapexport import export_station_map  # noqa: E402
+from ghcn_tools.store import ingest_qcu  # noqa: E402
+from ghcn_tools.synthetic import generate  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class Stages:
+    """Collects wall time and peak traced memory of named stages."""
+
+    def __init__(self):
+        self.results = []
+
+    def run(self, name, func, *args, **kwargs):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        out = func(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.results.append({'stage': name, 'seconds': elapsed, 'peak_mb': peak / 1e6})
+        print(f"  {name:<22} {elapsed:8.3f} s {peak / 1e6:9.1f} MB")
+        return out
+
+
+def _bins(metadata, station_ids, column='Built_2020_10km_percent', nbins=10):
+    meta = metadata[metadata['ID'].isin(station_ids)].set_index('ID')[column]
+    labels = pd.qcut(meta, nbins, labels=False, duplicates='drop')
+    return labels.reindex(station_ids).to_numpy()
+
+
+def _bin_ensembles(anoms, labels):
+    yearly = annual_mean(anoms)
+    groups = [g for g in np.unique(labels[~np.isnan(labels)])]
+    return np.array([ensemble_mean(yearly[labels == g])[0] for g in groups])
+
+
+def _completeness_filter(store):
+    coverage = CoverageIndex.from_store(store)
+    return coverage.query(9, 0.7, 1923, 2023)
+
+
+def _geojson_map_export(stations, path):
+    export_station_map(stations, path, category='country_code', popup_columns=('station_id', 'name'))
+    return os.path.getsize(path)
+
+
+def _map_export(stations, path):
+    m = folium.Map(location=[0, 0], zoom_start=2)
+    for row in stations.itertuples(index=False):
+        folium.CircleMarker(location=[row.latitude, row.longitude], radius=1,
+                            color='blue' if row.country_code == 'US' else 'red', fill=True,
+                            fill_opacity=0.7, popup=f"Station: {row.station_id}, Country: {row.country_code}").add_to(m)
+    m.save(path)
+    return os.path.getsize(path)
+
+
+def run_scale(n_stations, work_dir, first_year=1850, last_year=2025):
+    print(f"\n{n_stations} stations, {first_year}-{last_year}")
+    t0 = time.perf_counter()
+    paths = generate(os.path.join(work_dir, f"synthetic{n_stations}"), n_stations, first_year, last_year)
+    print(f"  (generated {os.path.getsize(paths['dat']) / 1e6:.0f} MB of .dat in {time.perf_counter() - t0:.1f} s)")
+    metadata = pd.read_csv(paths['metadata'])
+    clear_cache()
+
+    stages = Stages()
+    stations = stages.run('inventory read', read_station_inventory, paths['inv'])
+    store = stages.run('data parse', ingest_qcu, paths['dat'], os.path.join(work_dir, f"store{n_stations}"))
+    ids = stages.run('completeness filter', _completeness_filter, store)
+    block = store.select(station_ids=ids, start_year=1923, end_year=2023)
+    kept, anoms, _ = stages.run('baseline/anomaly', block_anomalies, block, 1951, 1980)
+    labels = stages.run('binning', _bins, metadata, kept)
+    yearly = stages.run('ensemble', _bin_ensembles, anoms, labels)
+    stages.run('LOESS', lowess_batch, yearly, block.years.astype(float), 0.1)
+    mapped = stations[stations['station_id'].isin(kept)]
+    size = stages.run('map export', _map_export, mapped, os.path.join(work_dir, f"map{n_stations}.html"))
+    geojson_size = stages.run('map export (geojson)', _geojson_map_export, mapped,
+                              os.path.join(work_dir, f"geojson_map{n_stations}.html"))
+    return {
+        'n_stations': n_stations,
+        'first_year': first_year,
+        'last_year': last_year,
+        'n_records': store.meta['n_records'],
+        'n_filtered': int(len(kept)),
+        'map_bytes': size,
+        'geojson_map_bytes': geojson_size,
+        'stages': stages.results,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _previous(n_stations):
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, f"{n_stations}_*.json")))
+    if not files:
+        return None
+    with open(files[-1]) as f:
+        return json.load(f)
+
+
+def save_and_compare(result):
+    previous = _previous(result['n_stations'])
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(RESULTS_DIR, f"{result['n_stations']}_{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"  saved {path}")
+    if previous:
+        before = {s['stage']: s for s in previous['stages']}
+        print(f"  vs. {previous.get('revision')} ({previous.get('timestamp')}):")
+        for s in result['stages']:
+            if s['stage'] in before and before[s['stage']]['seconds'] > 0:
+                ratio = s['seconds'] / before[s['stage']]['seconds']
+                flag = '  <-- slower' if ratio > 1.25 else ''
+                print(f"  {s['stage']:<22} x{ratio:5.2f} time, {s['peak_mb'] - before[s['stage']]['peak_mb']:+8.1f} MB{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', default='100,5000', help='comma-separated station counts, e.g. 100,5000,30000')
+    parser.add_argument('--first-year', type=int, default=1850)
+    parser.add_argument('--last-year', type=int, default=2025)
+    parser.add_argument('--keep', help='write the synthetic data here instead of a temporary directory')
+    args = parser.parse_args()
+
+    work = args.keep or tempfile.mkdtemp(prefix='ghcn_bench_')
+    try:
+        for n in (int(s) for s in args.scales.split(',')):
+            result = run_scale(n, work, args.first_year, args.last_year)
+            result['revision'] = _git_revision()
+            result['timestamp'] = datetime.datetime.now().isoformat(timespec='seconds')
+            save_and_compare(result)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""
+GHCN-tools: reusable building blocks for the GHCN notebooks and scripts.
+
+The notebooks in the repository root copy the same parsing and filtering
+code from cell to cell. The modules in this package hold that logic once so
+that it can be imported from a notebook, a script or a batch job.
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from ghcn_tools.cli import main
+
+sys.exit(main())
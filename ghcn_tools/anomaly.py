@@ -0,0 +1,164 @@
+"""
+Anomaly and ensemble engine on dense station x year x month arrays.
+
+`calculate_baseline_and_anomaly` in the notebooks builds a baseline with a
+``groupby`` and merges it back onto the melted long frame, and `create_ensemble`
+in huscrn-sep2025.py appends one DataFrame column per pair before averaging.
+Here the data stay a float array of shape (stations, years, 12) with NaN for
+missing months (e.g. `MonthlyBlock.celsius()`), and every step is one masked
+reduction over an axis.
+"""
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.instrument import traced
+
+
+def _masked_mean(data, axis, min_count=1):
+    """NaN-ignoring mean that returns NaN (without warnings) where fewer than ``min_count`` values exist."""
+    valid = ~np.isnan(data)
+    count = valid.sum(axis=axis)
+    total = np.where(valid, data, 0).sum(axis=axis, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    mean[count < max(min_count, 1)] = np.nan
+    return mean.astype(data.dtype, copy=False), count
+
+
+def monthly_climatology(data, years, baseline_start, baseline_end, min_years=1):
+    """
+    Per-station monthly climatology over a baseline window.
+
+    Parameters:
+    data (np.ndarray): (stations, years, 12) values with NaN for missing months.
+    years (array-like): Calendar year of every entry along axis 1.
+    baseline_start (int): First baseline year.
+    baseline_end (int): Last baseline year.
+    min_years (int): Minimum number of baseline years a calendar month needs; otherwise NaN.
+
+    Returns:
+    np.ndarray: (stations, 12) baseline means.
+    """
+    years = np.asarray(years)
+    in_window = (years >= baseline_start) & (years <= baseline_end)
+    clim, _ = _masked_mean(data[:, in_window, :], axis=1, min_count=min_years)
+    return clim
+
+
+def anomalies(data, climatology):
+    """Anomalies of ``data`` (stations, years, 12) against a (stations, 12) climatology."""
+    return data - climatology[:, None, :]
+
+
+def completeness(data, years, start_year=None, end_year=None):
+    """Fraction of months with data per station between ``start_year`` and ``end_year``."""
+    years = np.asarray(years)
+    in_window = np.ones(len(years), dtype=bool)
+    if start_year is not None:
+        in_window &= years >= start_year
+    if end_year is not None:
+        in_window &= years <= end_year
+    n_months = in_window.sum() * 12
+    return (~np.isnan(data[:, in_window, :])).sum(axis=(1, 2)) / max(n_months, 1)
+
+
+def ensemble_mean(anoms, weights=None, min_stations=1):
+    """
+    Monthly ensemble mean across stations.
+
+    Parameters:
+    anoms (np.ndarray): (stations, ...) anomalies with NaN for missing values.
+    weights (array-like, optional): Per-station weights; plain mean if omitted.
+    min_stations (int): Minimum number of reporting stations, otherwise NaN.
+
+    Returns:
+    (np.ndarray, np.ndarray): Ensemble mean with the station axis removed, and the
+    number of stations contributing to each value.
+    """
+    if weights is None:
+        return _masked_mean(anoms, axis=0, min_count=min_stations)
+    w = np.asarray(weights, dtype=np.float64).reshape((-1,) + (1,) * (anoms.ndim - 1))
+    valid = ~np.isnan(anoms)
+    wsum = np.where(valid, w, 0).sum(axis=0)
+    total = np.where(valid, anoms * w, 0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / wsum
+    count = valid.sum(axis=0)
+    mean[count < max(min_stations, 1)] = np.nan
+    return mean.astype(anoms.dtype, copy=False), count
+
+
+def annual_mean(monthly, min_months=1):
+    """Annual means of a (..., years, 12) array, NaN where fewer than ``min_months`` months exist."""
+    mean, _ = _masked_mean(monthly, axis=-1, min_count=min_months)
+    return mean
+
+
+@traced('baseline/anomaly', rows=lambda result: len(result[0]))
+def block_anomalies(block, baseline_start, baseline_end, min_baseline_years=1):
+    """
+    Anomalies for a `MonthlyBlock` in one pass (replaces `calculate_baseline_and_anomaly`).
+
+    Stations without any baseline climatology are dropped, like the
+    ``dropna(subset=['baseline'])`` in the notebooks.
+
+    Returns:
+    (np.ndarray, np.ndarray, np.ndarray): Kept station IDs, (stations, years, 12) anomalies
+    in °C (float32), and the (stations, 12) climatology.
+    """
+    data = block.celsius()
+    clim = monthly_climatology(data, block.years, baseline_start, baseline_end, min_baseline_years)
+    keep = ~np.all(np.isnan(clim), axis=1)
+    return block.station_ids[keep], anomalies(data[keep], clim[keep]), clim[keep]
+
+
+def anomalies_to_long(station_ids, years, anoms):
+    """Long frame (station_id, year, month, anomaly) of the non-missing entries, for the plotting code."""
+    s, y, m = np.nonzero(~np.isnan(anoms))
+    return pd.DataFrame({
+        'station_id': np.asarray(station_ids)[s],
+        'year': np.asarray(years)[y].astype(int),
+        'month': m + 1,
+        'anomaly': anoms[s, y, m],
+    })
+
+
+def series_to_array(series_list):
+    """
+    Align monthly pandas Series (DatetimeIndex) on a common month axis.
+
+    Returns:
+    (np.ndarray, pd.DatetimeIndex): (n_series, n_months) float array with NaN gaps,
+    and the month-end index of the columns.
+    """
+    codes = [s.index.year.to_numpy() * 12 + s.index.month.to_numpy() - 1 for s in series_list]
+    first = min(c.min() for c in codes)
+    last = max(c.max() for c in codes)
+    out = np.full((len(series_list), last - first + 1), np.nan)
+    for row, (s, c) in enumerate(zip(series_list, codes)):
+        out[row, c - first] = s.to_numpy(dtype=float)
+    index = pd.period_range(pd.Period(year=first // 12, month=first % 12 + 1, freq='M'),
+                            periods=out.shape[1], freq='M').to_timestamp(how='end').normalize()
+    return out, index
+
+
+@traced('ensemble', rows=lambda result: len(result[0]))
+def ensemble_from_series(series_list, start=None, end=None, min_months=1):
+    """
+    Monthly and annual ensemble means of monthly anomaly Series (replaces the
+    column-append loop of `create_ensemble`). Months outside [start, end] are dropped.
+
+    Returns:
+    (pd.Series, pd.Series): Monthly ensemble (months without data dropped) and its
+    annual means on a continuous yearly index, like ``resample("Y").mean()``: NaN for
+    years without data or with fewer than ``min_months`` months.
+    """
+    arr, index = series_to_array(series_list)
+    mean, _ = ensemble_mean(arr)
+    monthly = pd.Series(mean, index=index).loc[start:end].dropna()
+    annual = monthly.groupby(monthly.index.year).agg(['mean', 'size'])
+    annual = annual.loc[annual['size'] >= min_months, 'mean']
+    if len(monthly):
+        annual = annual.reindex(np.arange(monthly.index.year.min(), monthly.index.year.max() + 1))
+    annual.index = pd.to_datetime(annual.index.astype(str)) + pd.offsets.YearEnd(0)
+    return monthly, annual
@@ -0,0 +1,138 @@
+"""
+Bootstrap uncertainty bands for station (or pair) ensembles.
+
+`create_ensemble` and the per-bin yearly means of the notebooks only give point
+estimates. Resampling stations with replacement and recomputing the ensemble
+in a Python loop costs one `create_ensemble` per replicate. Here a batch of
+replicates is an index matrix (replicates, units); its per-unit multiplicities
+C turn every replicate ensemble into one matrix product
+
+    ensemble = (C @ where(valid, X, 0)) / (C @ valid)
+
+so 10k replicates of a few thousand stations take seconds. Replicate LOESS
+curves go through `lowess_batch` in one call and replicate trend slopes through
+the closed-form masked least squares of `lsq_lines`.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.loess import lowess_batch
+from ghcn_tools.metadata import lsq_lines
+
+REPLICATE_ELEMENTS = 1 << 25  # max. replicates * units in one count-matrix chunk
+
+
+def bootstrap_indices(n_units, n_replicates, seed=None):
+    """(replicates, units) matrix of unit indices drawn with replacement."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, n_units, size=(n_replicates, n_units))
+
+
+def _multiplicities(indices, n_units):
+    """How often every unit occurs in every replicate, as a float32 (replicates, units) matrix."""
+    r = len(indices)
+    flat = (np.arange(r)[:, None] * n_units + indices).ravel()
+    return np.bincount(flat, minlength=r * n_units).reshape(r, n_units).astype(np.float32)
+
+
+def replicate_ensembles(data, n_replicates=10000, seed=None, indices=None, weights=None, min_units=1):
+    """
+    Ensemble means of bootstrap replicates of the units (rows) of ``data``.
+
+    Parameters:
+    data (np.ndarray): (units, ...) anomalies, NaN for missing; e.g. the (pairs, months)
+        array of `series_to_array` or the (stations, years, 12) array of `block_anomalies`.
+    n_replicates (int): Number of replicates (ignored if ``indices`` is given).
+    seed (int, optional): Random seed.
+    indices (np.ndarray, optional): Precomputed (replicates, units) index matrix.
+    weights (array-like, optional): Per-unit weights of a weighted ensemble.
+    min_units (int): Minimum number of reporting units per value, otherwise NaN.
+
+    Returns:
+    np.ndarray: (replicates, ...) replicate ensemble means.
+    """
+    data = np.asarray(data)
+    n_units = len(data)
+    flat = data.reshape(n_units, -1)
+    valid = ~np.isnan(flat)
+    w = np.ones(n_units) if weights is None else np.asarray(weights, dtype=np.float64)
+    values = np.where(valid, flat, 0).astype(np.float32) * w[:, None].astype(np.float32)
+    present = valid.astype(np.float32)
+    wpresent = present * w[:, None].astype(np.float32)
+    if indices is None:
+        indices = bootstrap_indices(n_units, n_replicates, seed)
+
+    out = np.empty((len(indices), flat.shape[1]), dtype=np.float32)
+    chunk = max(1, REPLICATE_ELEMENTS // max(n_units, 1))
+    for start in range(0, len(indices), chunk):
+        counts = _multiplicities(indices[start:start + chunk], n_units)
+        total = counts @ values
+        wsum = counts @ wpresent
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / wsum
+        mean[(counts @ present) < max(min_units, 1) - 0.5] = np.nan
+        out[start:start + chunk] = mean
+    return out.reshape((len(indices),) + data.shape[1:])
+
+
+def confidence_band(replicates, level=0.95):
+    """Lower and upper percentile bands over the replicate axis (axis 0), ignoring NaN."""
+    alpha = (1 - level) / 2 * 100
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN points give NaN bands
+        low, high = np.nanpercentile(replicates, [alpha, 100 - alpha], axis=0)
+    return low, high
+
+
+def replicate_trends(replicates, x, start=None, end=None):
+    """Least-squares slope of every replicate series (replicates, points) against ``x``."""
+    x = np.asarray(x, dtype=np.float64)
+    keep = np.ones(len(x), dtype=bool)
+    if start is not None:
+        keep &= x >= start
+    if end is not None:
+        keep &= x <= end
+    slope, _, _ = lsq_lines(replicates[:, keep], x[keep])
+    return slope
+
+
+def bootstrap_bands(data, x, n_replicates=10000, level=0.95, frac=None, trend_start=None,
+                    trend_end=None, seed=None, weights=None):
+    """
+    Ensemble estimate with bootstrap confidence bands, optional LOESS bands and trend interval.
+
+    Parameters:
+    data (np.ndarray): (units, points) anomalies, e.g. yearly station or pair anomalies.
+    x (array-like): The x value (year) of every point.
+    n_replicates (int): Number of bootstrap replicates.
+    level (float): Confidence level of the bands.
+    frac (float, optional): Also smooth every replicate with LOESS and band the curves.
+    trend_start, trend_end (float, optional): Trend window; the slope interval is
+        reported per decade when given.
+    seed (int, optional): Random seed.
+    weights (array-like, optional): Per-unit weights.
+
+    Returns:
+    (pd.DataFrame, dict): Per-point frame (x, ensemble, low, high[, loess, loess_low,
+    loess_high]) and, if a trend window is given, {'trend_per_decade', 'low', 'high'}.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    data = np.asarray(data, dtype=np.float64)
+    point = replicate_ensembles(data, indices=np.arange(len(data))[None, :], weights=weights)[0]
+    reps = replicate_ensembles(data, n_replicates, seed, weights=weights)
+    low, high = confidence_band(reps, level)
+    band = pd.DataFrame({'x': x, 'ensemble': point, 'low': low, 'high': high})
+    if frac is not None:
+        band['loess'] = lowess_batch(point, x, frac=frac, cache=False)
+        smooth = lowess_batch(reps, x, frac=frac, cache=False)
+        band['loess_low'], band['loess_high'] = confidence_band(smooth, level)
+
+    trend = {}
+    if trend_start is not None or trend_end is not None:
+        estimate = replicate_trends(point[None, :], x, trend_start, trend_end)[0]
+        slopes = replicate_trends(reps, x, trend_start, trend_end)
+        lo, hi = confidence_band(slopes[:, None], level)
+        trend = {'trend_per_decade': estimate * 10, 'low': lo[0] * 10, 'high': hi[0] * 10}
+    return band, trend
@@ -0,0 +1,197 @@
+"""
+Night-light brightness (BI) extraction for station lists.
+
+The extraction cell of Extract_BI_for_GHCN.ipynb calls `get_brightness` per
+station and year: every call rebuilds the VIIRS annual mean image, blocks on
+``.getInfo()`` for a single point, and a restart depends on a hand-edited
+``processed_batches`` counter. `extract_brightness` instead asks a backend for
+a whole batch of points per request, keeps a bounded number of requests in
+flight, and appends finished stations to a checkpoint CSV keyed by station ID,
+so a restart simply skips the stations already in it. Batches with a failed
+request are kept out of the checkpoint and requested again on the next run.
+
+Backends implement ``sample(lats, lons, year) -> np.ndarray`` (NaN = no data):
+
+- `EarthEngineBackend`: one ``reduceRegions`` over a point FeatureCollection per
+  batch, with the annual mean image built once per year.
+- `RasterBackend`: nearest-pixel lookup in local rasters (GeoTIFF via rasterio,
+  or NumPy arrays on a regular lat/lon grid), for offline runs and benchmarks.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+VIIRS_COLLECTION = "NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG"
+BI_YEARS = [2012, 2017, 2020, 2023]
+
+
+class EarthEngineBackend:
+    """
+    VIIRS annual-mean radiance sampled with Earth Engine (``ee`` must be initialized).
+
+    Parameters:
+    collection (str): Image collection ID.
+    band (str): Band to sample. Defaults to 'avg_rad'.
+    scale (float): Sampling scale in m, as in the notebook.
+    """
+
+    def __init__(self, collection=VIIRS_COLLECTION, band="avg_rad", scale=1000):
+        import ee
+        self.ee = ee
+        self.collection = collection
+        self.band = band
+        self.scale = scale
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def image(self, year):
+        with self._lock:
+            if year not in self._images:
+                viirs = self.ee.ImageCollection(self.collection).filterDate(f"{year}-01-01", f"{year}-12-31")
+                self._images[year] = viirs.select(self.band).mean()
+            return self._images[year]
+
+    def sample(self, lats, lons, year):
+        ee = self.ee
+        points = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point([float(lon), float(lat)]), {"i": i})
+            for i, (lat, lon) in enumerate(zip(lats, lons))
+        ])
+        reduced = self.image(year).reduceRegions(collection=points, reducer=ee.Reducer.mean(), scale=self.scale)
+        out = np.full(len(lats), np.nan)
+        for feature in reduced.getInfo()["features"]:
+            props = feature["properties"]
+            if props.get("mean") is not None:
+                out[props["i"]] = props["mean"]
+        return out
+
+
+class RasterBackend:
+    """
+    Nearest-pixel sampling of local per-year rasters on a regular lat/lon grid.
+
+    Parameters:
+    rasters (dict): year -> (array, bounds), with ``bounds`` = (west, south, east, north)
+        of the array's outer pixel edges and row 0 at the north edge.
+    nodata (float, optional): Raster value to treat as missing.
+    """
+
+    def __init__(self, rasters, nodata=None):
+        self.rasters = {year: (np.asarray(arr), tuple(bounds)) for year, (arr, bounds) in rasters.items()}
+        self.nodata = nodata
+
+    @classmethod
+    def from_geotiffs(cls, paths):
+        """Load one GeoTIFF per year (``{year: path}``) with rasterio."""
+        import rasterio
+        rasters, nodata = {}, None
+        for year, path in paths.items():
+            with rasterio.open(path) as src:
+                b = src.bounds
+                rasters[year] = (src.read(1), (b.left, b.bottom, b.right, b.top))
+                nodata = src.nodata
+        return cls(rasters, nodata=nodata)
+
+    @classmethod
+    def from_npy(cls, paths, bounds=(-180.0, -90.0, 180.0, 90.0)):
+        """Memory-map one global ``.npy`` grid per year (``{year: path}``)."""
+        return cls({year: (np.load(path, mmap_mode="r"), bounds) for year, path in paths.items()})
+
+    def sample(self, lats, lons, year):
+        arr, (west, south, east, north) = self.rasters[year]
+        rows, cols = arr.shape
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        r = np.floor((north - lats) / (north - south) * rows).astype(np.int64)
+        c = np.floor((lons - west) / (east - west) * cols).astype(np.int64)
+        inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+        out = np.full(len(lats), np.nan)
+        out[inside] = arr[r[inside], c[inside]]
+        if self.nodata is not None:
+            out[out == self.nodata] = np.nan
+        return out
+
+
+def read_checkpoint(checkpoint_path, id_col="ID", columns=None):
+    """
+    Stations already extracted (last row wins), or an empty frame.
+
+    With ``columns``, a checkpoint whose header is not ``[id_col] + columns`` raises
+    ValueError: its rows say nothing about the other years, and appending to it would
+    put values under the wrong header.
+    """
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return pd.DataFrame(columns=[id_col] + list(columns or []))
+    done = pd.read_csv(checkpoint_path, on_bad_lines="skip", dtype={id_col: str})
+    if columns is not None and list(done.columns) != [id_col] + list(columns):
+        raise ValueError(f"Checkpoint {checkpoint_path} has columns {list(done.columns)}, expected "
+                         f"{[id_col] + list(columns)}; extract other years to another checkpoint_path")
+    return done.dropna(subset=[id_col]).drop_duplicates(subset=id_col, keep="last")
+
+
+def extract_brightness(stations, backend, years=BI_YEARS, checkpoint_path=None, batch_size=500,
+                       max_workers=4, id_col="ID", lat_col="Lat", lon_col="Lon", decimals=2):
+    """
+    BI_<year> values for every station, resumable through a checkpoint file.
+
+    Parameters:
+    stations (pd.DataFrame): Station metadata with ID, latitude and longitude columns.
+    backend: Object with ``sample(lats, lons, year)`` (`EarthEngineBackend`, `RasterBackend`).
+    years (list): Years to extract.
+    checkpoint_path (str, optional): CSV that finished stations are appended to; stations
+        already in it are not requested again. Batches with a failed request are not
+        checkpointed, so a resumed run requests them again. A checkpoint written for
+        other ``years`` raises ValueError.
+    batch_size (int): Points per backend request.
+    max_workers (int): Maximum number of requests in flight.
+    id_col, lat_col, lon_col (str): Column names in ``stations``.
+    decimals (int): Rounding of the stored values, as in the notebook.
+
+    Returns:
+    pd.DataFrame: ``stations`` with BI_<year> columns merged in (NaN where no data).
+    """
+    columns = [f"BI_{year}" for year in years]
+    stations = stations.astype({id_col: str})
+    done = read_checkpoint(checkpoint_path, id_col, columns)
+    todo = stations.loc[~stations[id_col].isin(done[id_col]), [id_col, lat_col, lon_col]].drop_duplicates(id_col)
+    print(f"{len(stations) - len(todo)} stations already extracted, {len(todo)} to go")
+
+    batches = [todo.iloc[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    pending = {b: len(years) for b in range(len(batches))}
+    failed = {b: [] for b in range(len(batches))}
+    values = {b: np.full((len(batch), len(years)), np.nan) for b, batch in enumerate(batches)}
+    write_header = not (checkpoint_path and os.path.exists(checkpoint_path))
+    results = [done]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(backend.sample, batch[lat_col].to_numpy(), batch[lon_col].to_numpy(), year): (b, y)
+            for b, batch in enumerate(batches) for y, year in enumerate(years)
+        }
+        for future in as_completed(futures):
+            b, y = futures[future]
+            try:
+                values[b][:, y] = future.result()
+            except Exception as e:
+                print(f"Error extracting batch {b + 1}/{len(batches)} for year {years[y]}: {e}")
+                failed[b].append(years[y])
+            pending[b] -= 1
+            if pending[b]:
+                continue
+            rows = pd.DataFrame(np.round(values.pop(b), decimals), columns=columns)
+            rows.insert(0, id_col, batches[b][id_col].to_numpy())
+            results.append(rows)
+            if failed[b]:
+                print(f"Batch {b + 1}/{len(batches)} incomplete (failed years {failed[b]}), "
+                      "not checkpointed; it is retried on the next run")
+                continue
+            if checkpoint_path:
+                rows.to_csv(checkpoint_path, mode="a", header=write_header, index=False)
+                write_header = False
+            print(f"Batch {b + 1}/{len(batches)} done")
+
+    extracted = pd.concat(results, ignore_index=True).drop_duplicates(subset=id_col, keep="last")
+    extracted = extracted.reindex(columns=[id_col] + columns)
+    return stations.drop(columns=[c for c in columns if c in stations]).merge(extracted, on=id_col, how="left")
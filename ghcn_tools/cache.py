@@ -0,0 +1,233 @@
+"""
+Config-keyed on-disk cache of intermediate results.
+
+Rerunning a notebook recomputes every stage (filtered stations, anomalies,
+bins, ensembles) even if only a plot setting changed. `ResultCache.memo`
+stores the output of a stage under a key hashed from the stage name, the
+parameters that stage depends on and the key of its upstream stage, so a
+changed parameter invalidates exactly that stage and everything below it:
+
+    filtered, k1 = cache.memo('filter', filter_stations, data, params=dict(years=..., max_pct_missing=...),
+                              upstream=source_key)
+    anoms, k2 = cache.memo('anomalies', make_anomalies, filtered, params=dict(baseline=(1951, 1980)),
+                           upstream=k1)
+
+Arrays are saved as ``.npy`` and dicts of arrays as a directory of ``.npy``
+files, both loaded memory-mapped (milliseconds for any size); everything else
+is pickled. The cache is bounded by ``max_bytes`` with least-recently-used
+eviction (an entry's mtime is its last use), and counts hits and misses per
+stage. Entries are written atomically, so several processes may share one
+cache directory.
+
+    cache_dir/<stage>-<key>.npy | .pkl | /
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESULT_DIR = os.path.join('ghcn_cache', 'results')
+DEFAULT_MAX_BYTES = 2 << 30
+
+
+def _canonical(value):
+    """JSON-serializable, order-independent form of a parameter value."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(_canonical(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return {'array': data_digest(value)}
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return {'frame': data_digest(value)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return 'nan'
+    return value
+
+
+def data_digest(data):
+    """Content hash of an array, DataFrame or Series."""
+    h = hashlib.sha1()
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+        h.update(repr(list(getattr(data, 'columns', [data.name]))).encode())
+    else:
+        data = np.ascontiguousarray(data)
+        h.update(repr((data.dtype.str, data.shape)).encode())
+        # object arrays hold pointers; hash their values instead
+        h.update(pd.util.hash_array(data.ravel()).tobytes() if data.dtype == object else data.tobytes())
+    return h.hexdigest()[:20]
+
+
+def make_key(stage, params=None, upstream=None):
+    """Hash of the stage name, its parameters and the upstream key."""
+    payload = json.dumps({'stage': stage, 'params': _canonical(params or {}), 'upstream': upstream},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:24]
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class NullCache:
+    """Stand-in with the `ResultCache` interface that always computes."""
+
+    def memo(self, stage, func, *args, params=None, upstream=None, **kwargs):
+        return func(*args, **kwargs), None
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of stage results in a directory.
+
+    Parameters:
+    cache_dir (str): Directory of the entries. Defaults to 'ghcn_cache/results'.
+    max_bytes (int): Total size above which the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_RESULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _count(self, stage, field, seconds=None):
+        s = self.stats.setdefault(stage, {'hits': 0, 'misses': 0, 'load_s': 0.0, 'compute_s': 0.0})
+        s[field] += 1
+        if seconds is not None:
+            s['load_s' if field == 'hits' else 'compute_s'] += seconds
+
+    def _find(self, stage, key):
+        base = os.path.join(self.cache_dir, f"{stage.replace(os.sep, '_')}-{key}")
+        for path in (base + '.npy', base + '.pkl', base):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get(self, stage, key):
+        """Cached value (or raise KeyError); marks the entry as recently used."""
+        path = self._find(stage, key)
+        if path is None:
+            raise KeyError(key)
+        if path.endswith('.npy'):
+            value = np.load(path, mmap_mode='r')
+        elif path.endswith('.pkl'):
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        else:
+            value = {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r')
+                     for name in sorted(os.listdir(path)) if name.endswith('.npy')}
+        os.utime(path)
+        return value
+
+    def put(self, stage, key, value):
+        """Store ``value`` atomically, then evict down to ``max_bytes``."""
+        base = os.path.join(self.cache_dir, f"{stage.replace(os.sep, '_')}-{key}")
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp, base + '.npy')
+        elif (isinstance(value, dict) and value and all(isinstance(v, np.ndarray) and v.dtype != object
+                                                       for v in value.values())):
+            tmp = tempfile.mkdtemp(dir=self.cache_dir, suffix='.part')
+            for name, arr in value.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), arr)
+            try:
+                os.rename(tmp, base)
+            except OSError:  # written concurrently by another process
+                shutil.rmtree(tmp, ignore_errors=True)
+        else:
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, base + '.pkl')
+        self.evict()
+
+    def memo(self, stage, func, *args, params=None, upstream=None, **kwargs):
+        """
+        Cached ``func(*args, **kwargs)``.
+
+        Parameters:
+        stage (str): Stage name (part of the key and of the file name).
+        func (callable): Computes the stage output on a miss.
+        params (dict): Everything the output depends on apart from the upstream stage,
+            e.g. year range, baseline, filters, ``built_percent_column``, ``nbins``.
+        upstream (str, optional): Key of the stage this one consumes (or a source fingerprint).
+
+        Returns:
+        (object, str): The output and its key, to be passed on as ``upstream``.
+        """
+        key = make_key(stage, params, upstream)
+        t0 = time.perf_counter()
+        try:
+            value = self.get(stage, key)
+        except KeyError:
+            value = func(*args, **kwargs)
+            self._count(stage, 'misses', time.perf_counter() - t0)
+            self.put(stage, key, value)
+            return value, key
+        self._count(stage, 'hits', time.perf_counter() - t0)
+        return value, key
+
+    def entries(self):
+        """Entries as a DataFrame (stage, key, bytes, last_used), most recently used first."""
+        rows = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.part') or '-' not in name:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stage, key = os.path.splitext(name)[0].rsplit('-', 1)
+            try:
+                rows.append((stage, key, _size(path), os.path.getmtime(path), path))
+            except OSError:  # evicted meanwhile
+                continue
+        table = pd.DataFrame(rows, columns=['stage', 'key', 'bytes', 'last_used', 'path'])
+        return table.sort_values('last_used', ascending=False, ignore_index=True)
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used entries until the cache fits in ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        table = self.entries()
+        over = table['bytes'].cumsum() > max_bytes
+        for path in table.loc[over, 'path']:
+            _remove(path)
+        return int(over.sum())
+
+    def clear(self):
+        return self.evict(0)
+
+    def merge_stats(self, stats):
+        """Add hit/miss counters collected elsewhere (e.g. in worker processes)."""
+        for stage, s in stats.items():
+            mine = self.stats.setdefault(stage, {'hits': 0, 'misses': 0, 'load_s': 0.0, 'compute_s': 0.0})
+            for field, value in s.items():
+                mine[field] += value
+
+    def summary(self):
+        """Hit/miss statistics per stage."""
+        table = pd.DataFrame.from_dict(self.stats, orient='index',
+                                       columns=['hits', 'misses', 'load_s', 'compute_s'])
+        table.index.name = 'stage'
+        table['hit_rate'] = table['hits'] / (table['hits'] + table['misses']).clip(lower=1)
+        return table
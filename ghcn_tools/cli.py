@@ -0,0 +1,206 @@
+"""
+Command line interface: ``python -m ghcn_tools <command> [options]``.
+
+    fetch      download the GHCN-Daily CSVs of the station pairs (or --ghcnm: the GHCN-M archive)
+    ingest     build the GHCN-M monthly store (or --daily: aggregate GHCN-Daily to monthly stores)
+    anomalies  stitch the pairs and write their monthly anomalies
+    ensemble   write the strict and inclusive monthly/annual pair ensembles
+    map        write the folium map of the pairs
+    plot       render the ensemble figure headless (PNG/SVG)
+
+Every subcommand imports what it needs when it runs, so ``ensemble`` never
+loads matplotlib or folium and starts in the time it takes to import pandas.
+``--trace FILE`` (or ``GHCN_TRACE=FILE``) records the stage timings, see
+`ghcn_tools.instrument`.
+"""
+import argparse
+import os
+import sys
+
+from ghcn_tools.instrument import enable, enable_from_env, finish
+
+
+def _pairs(args):
+    from ghcn_tools.huscrn import STATION_PAIRS, read_station_pairs
+    return read_station_pairs(args.pairs) if args.pairs else STATION_PAIRS
+
+
+def _process(args):
+    from ghcn_tools.daily import fetch_stations
+    from ghcn_tools.huscrn import pair_station_ids, process_pairs
+
+    pairs = _pairs(args)
+    if not args.offline:
+        fetch_stations(pair_station_ids(pairs), args.station_data)
+    return process_pairs(pairs, args.element, args.station_data, args.baseline[0], args.baseline[1],
+                         args.min_baseline_years, offline=args.offline)
+
+
+def _ensembles(results):
+    from ghcn_tools.huscrn import create_ensemble
+    return {name: create_ensemble(results[name], name.upper()) for name in ('inclusive', 'strict')}
+
+
+def _ensemble_frame(ensembles, which):
+    import pandas as pd
+    columns = {name: pair[which] for name, pair in ensembles.items() if pair[which] is not None}
+    return pd.DataFrame(columns).rename_axis('date')
+
+
+def cmd_fetch(args):
+    if args.ghcnm:
+        from ghcn_tools.fetch import fetch_ghcnm
+        dat_file, inv_file = fetch_ghcnm(offline=args.offline)
+        print(dat_file)
+        print(inv_file)
+        return
+    from ghcn_tools.daily import fetch_stations
+    from ghcn_tools.huscrn import pair_station_ids
+
+    ids = args.station_ids or pair_station_ids(_pairs(args))
+    results = fetch_stations(ids, args.station_data, max_workers=args.workers, refresh=args.refresh)
+    return 1 if any(path is None for path in results.values()) else 0
+
+
+def cmd_ingest(args):
+    if args.daily:
+        from ghcn_tools.dailyagg import aggregate_daily
+        stores = aggregate_daily(args.daily, args.store, elements=tuple(args.elements), min_days=args.min_days)
+        for store in stores.values():
+            print(store)
+        return
+    from ghcn_tools.store import ensure_store
+
+    dat_file = args.dat
+    if dat_file is None:
+        from ghcn_tools.fetch import fetch_ghcnm
+        dat_file, _ = fetch_ghcnm()
+    print(ensure_store(dat_file, args.store, args.elements[0]))
+
+
+def cmd_anomalies(args):
+    import pandas as pd
+    from ghcn_tools.huscrn import anomaly_frame
+
+    results = _process(args)
+    os.makedirs(args.out, exist_ok=True)
+    anomaly_frame(results).to_csv(os.path.join(args.out, 'pair_anomalies.csv'), index=False)
+    pd.DataFrame(results['pair_info']).to_csv(os.path.join(args.out, 'pairs.csv'), index=False)
+    print(f"Wrote pair_anomalies.csv and pairs.csv to {args.out}")
+
+
+def cmd_ensemble(args):
+    ensembles = _ensembles(_process(args))
+    os.makedirs(args.out, exist_ok=True)
+    monthly = _ensemble_frame(ensembles, 0)
+    annual = _ensemble_frame(ensembles, 1)
+    monthly.to_csv(os.path.join(args.out, 'ensemble_monthly.csv'))
+    annual.to_csv(os.path.join(args.out, 'ensemble_annual.csv'))
+    for name in annual:
+        series = annual[name].dropna()
+        if len(series):
+            print(f"{name.upper()}: {series.index.min().year}-{series.index.max().year}, "
+                  f"recent 10yr avg {series.tail(10).mean():+.2f}°C")
+    print(f"Wrote ensemble_monthly.csv and ensemble_annual.csv to {args.out}")
+
+
+def cmd_map(args):
+    from ghcn_tools.huscrn import create_station_map
+
+    results = _process(args)
+    path = args.output or os.path.join(args.out, 'station_pairs_map.html')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    create_station_map(results['pair_info']).save(path)
+    print(f"📍 Interactive map saved as {path}")
+
+
+def cmd_plot(args):
+    from ghcn_tools.huscrn import comparison_panels
+    from ghcn_tools.render import ensemble_panels, render_figure
+
+    results = _process(args)
+    ensembles = _ensembles(results)
+    if all(annual is None for _, annual in ensembles.values()):
+        print("No data available for either approach.")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+    kwargs = comparison_panels(results, ensembles)
+    for path in render_figure(args.name, ensemble_panels, kwargs, args.out, tuple(args.formats), args.dpi):
+        print(f"Wrote {path}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m ghcn_tools', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--trace', metavar='FILE', help="Record stage timings and write the JSON trace to FILE")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def pair_options(p):
+        p.add_argument('--pairs', help="station_pairs JSON/CSV file (default: the built-in USCRN pairs)")
+        p.add_argument('--station-data', default='station_data', help="GHCN-Daily cache directory")
+        p.add_argument('--offline', action='store_true', help="Only use already downloaded files")
+
+    def pipeline_options(p, out='results'):
+        pair_options(p)
+        p.add_argument('--element', default='TMAX', choices=('TMAX', 'TMIN', 'TAVG'))
+        p.add_argument('--baseline', nargs=2, type=int, default=(1960, 1980), metavar=('START', 'END'))
+        p.add_argument('--min-baseline-years', type=int, default=15)
+        p.add_argument('--out', default=out, help="Output directory")
+
+    p = sub.add_parser('fetch', help="Download GHCN-Daily station CSVs or the GHCN-M archive")
+    pair_options(p)
+    p.add_argument('station_ids', nargs='*', help="Station IDs (default: all stations of the pairs)")
+    p.add_argument('--ghcnm', action='store_true', help="Fetch the latest GHCN-M qcu archive instead")
+    p.add_argument('--workers', type=int, default=8)
+    p.add_argument('--refresh', action='store_true', help="Re-download cached files")
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser('ingest', help="Build the GHCN-M monthly store, or monthly stores from GHCN-Daily")
+    p.add_argument('dat', nargs='?', help="GHCN-M .dat file (default: fetch the latest archive)")
+    p.add_argument('--store', default='ghcnm_store', help="Store directory")
+    p.add_argument('--daily', nargs='+', metavar='SOURCE', help=".dly files, ghcnd_all tarballs or by-year CSVs")
+    p.add_argument('--elements', nargs='+', default=None,
+                   help="Element(s), default TAVG (GHCN-M, one only) or TMAX TMIN (daily)")
+    p.add_argument('--min-days', type=int, default=20, help="Days required per month (--daily)")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser('anomalies', help="Monthly anomalies of the stitched pairs")
+    pipeline_options(p)
+    p.set_defaults(func=cmd_anomalies)
+
+    p = sub.add_parser('ensemble', help="Strict and inclusive pair ensembles")
+    pipeline_options(p)
+    p.set_defaults(func=cmd_ensemble)
+
+    p = sub.add_parser('map', help="Folium map of the pairs")
+    pipeline_options(p)
+    p.add_argument('-o', '--output', help="HTML file (default: OUT/station_pairs_map.html)")
+    p.set_defaults(func=cmd_map)
+
+    p = sub.add_parser('plot', help="Render the ensemble figure without a display")
+    pipeline_options(p, out='figures')
+    p.add_argument('--name', default='huscrn_ensembles', help="File name without extension")
+    p.add_argument('--formats', nargs='+', default=['png'])
+    p.add_argument('--dpi', type=int, default=100)
+    p.set_defaults(func=cmd_plot)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'ingest' and args.elements is None:
+        args.elements = ['TMAX', 'TMIN'] if args.daily else ['TAVG']
+    if args.command == 'ingest' and not args.daily and len(args.elements) > 1:
+        parser.error("GHCN-M ingest takes one element (a .dat file holds one); several --elements need --daily")
+    if args.trace:
+        enable()
+    else:
+        enable_from_env()
+    try:
+        return args.func(args) or 0
+    finally:
+        finish(path=args.trace)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Bit-packed station x month coverage index.
+
+Bitmap_coverage.ipynb fills a station x month presence matrix from parsed text,
+the strict-9-month and ``PERCENT_MONTHS_REQUIRED`` filters redo the counting,
+``analyze_station_data`` has its own ``max_pct_missing`` filter and HUSCRN.ipynb
+applies ``min_months`` separately. `CoverageIndex` keeps one bit per
+station-month (``np.packbits`` along the month axis, ~0.5 MB per 1000 stations
+and 300 years), built once from a `MonthlyStore` and saved next to it as
+``coverage.npz``. Per-year month counts are derived from the bits on first use,
+after which every query is a vectorized reduction over a (stations, years)
+uint8 array.
+"""
+import os
+
+import numpy as np
+
+from ghcn_tools.decode import MISSING
+
+COVERAGE_FILE = 'coverage.npz'
+
+
+class CoverageIndex:
+    """
+    Presence bits for every station-month.
+
+    Parameters:
+    station_ids (np.ndarray): Station IDs, one per row.
+    first_year (int): Calendar year of the first column block.
+    bits (np.ndarray): (stations, ceil(years * 12 / 8)) uint8, packed presence bits.
+    n_years (int): Number of years covered.
+    """
+
+    def __init__(self, station_ids, first_year, bits, n_years):
+        self.station_ids = np.asarray(station_ids).astype(str)
+        self.first_year = int(first_year)
+        self.n_years = int(n_years)
+        self.bits = bits
+        self._counts = None
+
+    @classmethod
+    def from_mask(cls, station_ids, years, mask):
+        """Build from a boolean (stations, years, 12) presence array."""
+        mask = np.asarray(mask, dtype=bool)
+        bits = np.packbits(mask.reshape(len(mask), -1), axis=1)
+        return cls(station_ids, int(years[0]), bits, mask.shape[1])
+
+    @classmethod
+    def from_store(cls, store, chunk_rows=4096):
+        """Build from a `MonthlyStore`, streaming over row chunks of the memory map."""
+        n_bytes = (len(store.years) * 12 + 7) // 8
+        bits = np.empty((len(store), n_bytes), dtype=np.uint8)
+        for start in range(0, len(store), chunk_rows):
+            chunk = np.asarray(store.value[start:start + chunk_rows]) != MISSING
+            bits[start:start + chunk_rows] = np.packbits(chunk.reshape(len(chunk), -1), axis=1)
+        return cls(store.station_ids, store.first_year, bits, len(store.years))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['station_ids'], int(data['first_year']), data['bits'], int(data['n_years']))
+
+    def save(self, path):
+        tmp = f"{path}.part.npz"
+        np.savez(tmp, station_ids=self.station_ids, first_year=self.first_year,
+                 bits=self.bits, n_years=self.n_years)
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    @property
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.n_years)
+
+    def _year_range(self, start_year, end_year):
+        start_year = self.first_year if start_year is None else max(start_year, self.first_year)
+        end_year = self.first_year + self.n_years - 1 if end_year is None else end_year
+        end_year = min(end_year, self.first_year + self.n_years - 1)
+        return start_year - self.first_year, max(end_year - self.first_year + 1, start_year - self.first_year)
+
+    def presence(self, start_year=None, end_year=None, rows=None):
+        """Boolean (stations, years, 12) presence for a year window (optionally a subset of rows)."""
+        y0, y1 = self._year_range(start_year, end_year)
+        bits = self.bits if rows is None else self.bits[rows]
+        flat = np.unpackbits(bits, axis=1, count=self.n_years * 12).astype(bool)
+        return flat.reshape(len(bits), self.n_years, 12)[:, y0:y1]
+
+    def months_per_year(self, start_year=None, end_year=None):
+        """(stations, years) number of months with data."""
+        if self._counts is None:
+            self._counts = self.presence().sum(axis=2, dtype=np.uint8)
+        y0, y1 = self._year_range(start_year, end_year)
+        return self._counts[:, y0:y1]
+
+    def completeness(self, start_year=None, end_year=None):
+        """Fraction of months present per station in the window."""
+        counts = self.months_per_year(start_year, end_year)
+        return counts.sum(axis=1) / max(counts.shape[1] * 12, 1)
+
+    def query(self, min_months=1, min_year_fraction=0.0, start_year=None, end_year=None):
+        """
+        Stations with at least ``min_months`` months in at least ``min_year_fraction``
+        of the years between ``start_year`` and ``end_year``.
+
+        Returns:
+        np.ndarray: Matching station IDs.
+        """
+        counts = self.months_per_year(start_year, end_year)
+        good_years = (counts >= min_months).sum(axis=1)
+        needed = max(np.ceil(min_year_fraction * counts.shape[1] - 1e-9), 1)
+        return self.station_ids[good_years >= needed]
+
+    def max_pct_missing(self, max_missing, start_year=None, end_year=None):
+        """
+        Stations with data in the window and at most a ``max_missing`` fraction (0-1) of
+        its months missing, the ``max_pct_missing`` rule of ``analyze_station_data``.
+        """
+        start_year = self.first_year if start_year is None else start_year
+        end_year = self.first_year + self.n_years - 1 if end_year is None else end_year
+        observed = self.months_per_year(start_year, end_year).sum(axis=1)
+        keep = (observed > 0) & (1 - observed / max((end_year - start_year + 1) * 12, 1) <= max_missing)
+        return self.station_ids[keep]
+
+    def longest_run(self, min_months=1, start_year=None, end_year=None):
+        """Per station, the longest run of consecutive years with at least ``min_months`` months."""
+        ok = self.months_per_year(start_year, end_year) >= min_months
+        idx = np.cumsum(ok, axis=1)
+        reset = np.maximum.accumulate(np.where(ok, 0, idx), axis=1)
+        run = idx - reset
+        return run.max(axis=1) if run.shape[1] else np.zeros(len(self), dtype=int)
+
+    def continuous(self, start_year, end_year, min_months=12):
+        """Stations where every year from ``start_year`` to ``end_year`` has at least ``min_months`` months."""
+        counts = self.months_per_year(start_year, end_year)
+        if counts.shape[1] < end_year - start_year + 1:
+            return self.station_ids[:0]
+        return self.station_ids[(counts >= min_months).all(axis=1)]
+
+    def bitmap(self, start_year=None, end_year=None, station_ids=None, sort=True):
+        """
+        Station x month presence matrix for the coverage plots.
+
+        Stations without any data in the window are dropped; with ``sort`` the rows are
+        ordered by number of months with data (most first), as in Bitmap_coverage.ipynb.
+
+        Returns:
+        (np.ndarray, np.ndarray): Row station IDs and the (stations, months) uint8 matrix.
+        """
+        rows = np.arange(len(self)) if station_ids is None else np.flatnonzero(np.isin(self.station_ids, station_ids))
+        matrix = self.presence(start_year, end_year, rows).reshape(len(rows), -1).astype(np.uint8)
+        sums = matrix.sum(axis=1)
+        keep = sums > 0
+        ids, matrix, sums = self.station_ids[rows][keep], matrix[keep], sums[keep]
+        if sort:
+            order = np.argsort(-sums, kind='stable')
+            ids, matrix = ids[order], matrix[order]
+        return ids, matrix
+
+
+def ensure_coverage(store):
+    """Coverage index of a `MonthlyStore`, built and saved as ``coverage.npz`` in the store if missing or stale."""
+    path = os.path.join(store.store_dir, COVERAGE_FILE)
+    meta_path = os.path.join(store.store_dir, 'meta.json')
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(meta_path):
+        return CoverageIndex.load(path)
+    index = CoverageIndex.from_store(store)
+    index.save(path)
+    return index
@@ -0,0 +1,246 @@
+"""
+GHCN-Daily station files: bulk download into the ``station_data/`` cache.
+
+`get_station_data` in huscrn-sep2025.py downloads one ``{station_id}.csv`` at a
+time with a bare ``requests.get`` and writes ``response.text`` in one go, so a
+killed run can leave a truncated CSV behind that later runs trust. `fetch_stations`
+downloads on a bounded thread pool over one pooled session, retries transient
+failures with exponential backoff and only renames a file into the cache once
+it is complete.
+
+Reading the cached CSV with ``parse_dates`` dominates later runs, so
+`build_daily_cache` converts it once into ``{station_id}.npy``: a structured
+array of integer day numbers (days since 1970-01-01) plus int16 tenths for
+TMAX/TMIN/TAVG/PRCP (-9999 = missing) and their M/Q/S flags. `load_daily`
+memory-maps that file and returns any element(s) without reparsing.
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from ghcn_tools.instrument import traced
+
+DAILY_URL = "https://www.ncei.noaa.gov/data/global-historical-climatology-network-daily/access/{station_id}.csv"
+DEFAULT_CACHE_DIR = "station_data"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+ELEMENTS = ("TMAX", "TMIN", "TAVG", "PRCP")
+MISSING = -9999
+DAILY_DTYPE = np.dtype([("day", "<i4")] + [
+    (name, dtype) for element in ELEMENTS
+    for name, dtype in ((element, "<i2"), (f"{element}_mflag", "S1"), (f"{element}_qflag", "S1"), (f"{element}_sflag", "S1"))
+])
+
+
+def station_csv_path(station_id, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{station_id}.csv")
+
+
+def make_session(pool_size=8):
+    """A requests session whose connection pool is large enough for ``pool_size`` threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_station(station_id, cache_dir=DEFAULT_CACHE_DIR, session=None, base_url=DAILY_URL,
+                     retries=3, backoff=1.0, timeout=60, chunk_size=1 << 16):
+    """
+    Download one station CSV into the cache, writing it atomically (temp file + rename).
+
+    Parameters:
+    station_id (str): GHCN-Daily station ID.
+    cache_dir (str): Cache directory. Defaults to 'station_data'.
+    session (requests.Session, optional): Shared session; a new one is used if omitted.
+    base_url (str): URL template with a ``{station_id}`` placeholder.
+    retries (int): Extra attempts after connection errors, timeouts and 429/5xx responses.
+    backoff (float): Base delay in seconds, doubled after every failed attempt.
+    timeout (float): Connect/read timeout in seconds.
+    chunk_size (int): Streaming block size in bytes.
+
+    Returns:
+    int: Number of bytes written.
+    """
+    http = session or requests
+    url = base_url.format(station_id=station_id)
+    os.makedirs(cache_dir, exist_ok=True)
+    for attempt in range(retries + 1):
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=f".{station_id}.", suffix=".part")
+        try:
+            with http.get(url, stream=True, timeout=timeout) as response:
+                if response.status_code in RETRY_STATUS and attempt < retries:
+                    raise requests.exceptions.RetryError(f"HTTP {response.status_code} for {url}")
+                response.raise_for_status()
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    fd = None
+                    for block in response.iter_content(chunk_size=chunk_size):
+                        f.write(block)
+                        size += len(block)
+            os.replace(tmp, station_csv_path(station_id, cache_dir))
+            return size
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError, requests.exceptions.RetryError):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+        finally:
+            if fd is not None:
+                os.close(fd)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+@traced('download', rows=len)
+def fetch_stations(station_ids, cache_dir=DEFAULT_CACHE_DIR, max_workers=8, refresh=False,
+                   session=None, **download_kwargs):
+    """
+    Download the GHCN-Daily CSVs of many stations concurrently.
+
+    Already cached files are skipped unless ``refresh`` is set. Failures are
+    reported and do not stop the remaining downloads.
+
+    Parameters:
+    station_ids (list): Station IDs to fetch; duplicates are ignored.
+    cache_dir (str): Cache directory. Defaults to 'station_data'.
+    max_workers (int): Size of the download thread pool (and connection pool).
+    refresh (bool): Re-download files that are already cached.
+    session (requests.Session, optional): Shared session; defaults to `make_session(max_workers)`.
+    **download_kwargs: Passed on to `download_station` (base_url, retries, backoff, timeout).
+
+    Returns:
+    dict: station_id -> cached CSV path, or None if the download failed.
+    """
+    station_ids = list(dict.fromkeys(station_ids))
+    results = {}
+    todo = []
+    for sid in station_ids:
+        if not refresh and os.path.exists(station_csv_path(sid, cache_dir)):
+            results[sid] = station_csv_path(sid, cache_dir)
+        else:
+            todo.append(sid)
+    print(f"{len(station_ids) - len(todo)} of {len(station_ids)} stations cached, downloading {len(todo)}...")
+    if not todo:
+        return results
+
+    own_session = session is None
+    session = session or make_session(max_workers)
+    total_bytes = 0
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(download_station, sid, cache_dir, session, **download_kwargs): sid
+                       for sid in todo}
+            for future in as_completed(futures):
+                sid = futures[future]
+                try:
+                    size = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"Error downloading {sid}: {e}")
+                    results[sid] = None
+                    continue
+                total_bytes += size
+                results[sid] = station_csv_path(sid, cache_dir)
+    finally:
+        if own_session:
+            session.close()
+
+    elapsed = time.perf_counter() - t0
+    ok = sum(results[sid] is not None for sid in todo)
+    print(f"Downloaded {ok}/{len(todo)} stations, {total_bytes / 1e6:.1f} MB in {elapsed:.1f} s "
+          f"({total_bytes / 1e6 / max(elapsed, 1e-9):.2f} MB/s, {ok / max(elapsed, 1e-9):.1f} files/s)")
+    return results
+
+
+def station_npy_path(station_id, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{station_id}.npy")
+
+
+def _split_attributes(attributes):
+    """Split GHCN-Daily 'M,Q,S,T' attribute strings into three S1 flag arrays."""
+    parts = attributes.fillna("").str.split(",", expand=True).reindex(columns=range(3)).fillna("")
+    return [parts[i].str[:1].to_numpy(dtype="S1") for i in range(3)]
+
+
+def build_daily_cache(station_id, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Convert the cached ``{station_id}.csv`` into the binary ``{station_id}.npy``.
+
+    Elements missing from the CSV are stored as all-missing columns.
+
+    Returns:
+    str: Path of the written ``.npy`` file.
+    """
+    csv_path = station_csv_path(station_id, cache_dir)
+    header = pd.read_csv(csv_path, nrows=0).columns
+    present = [e for e in ELEMENTS if e in header]
+    usecols = ["DATE"] + present + [f"{e}_ATTRIBUTES" for e in present if f"{e}_ATTRIBUTES" in header]
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=str, na_values=[" ", ""], keep_default_na=False)
+
+    out = np.zeros(len(df), dtype=DAILY_DTYPE)
+    out["day"] = pd.to_datetime(df["DATE"], format="%Y-%m-%d").to_numpy("datetime64[D]").astype(np.int64)
+    for element in ELEMENTS:
+        out[element] = MISSING
+        if element not in present:
+            continue
+        values = pd.to_numeric(df[element], errors="coerce")
+        out[element] = values.fillna(MISSING).to_numpy(dtype=np.int16)
+        if f"{element}_ATTRIBUTES" in df:
+            flags = _split_attributes(df[f"{element}_ATTRIBUTES"])
+            for flag, arr in zip(("mflag", "qflag", "sflag"), flags):
+                out[f"{element}_{flag}"] = arr
+
+    path = station_npy_path(station_id, cache_dir)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=f".{station_id}.", suffix=".npy")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, out)
+    os.replace(tmp, path)
+    return path
+
+
+def load_daily_array(station_id, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Memory-mapped structured array of a station (see ``DAILY_DTYPE``).
+
+    The binary file is (re)built from the cached CSV when it is missing or older
+    than the CSV.
+    """
+    npy_path = station_npy_path(station_id, cache_dir)
+    csv_path = station_csv_path(station_id, cache_dir)
+    if not os.path.exists(npy_path) or (
+            os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(npy_path)):
+        build_daily_cache(station_id, cache_dir)
+    return np.load(npy_path, mmap_mode="r")
+
+
+@traced('load daily', rows=len)
+def load_daily(station_id, elements=("TMAX",), cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Daily values of one station as a DataFrame, read from the binary cache.
+
+    Parameters:
+    station_id (str): GHCN-Daily station ID (its CSV must already be cached).
+    elements (str or tuple): Element(s) to return, from TMAX, TMIN, TAVG, PRCP.
+    cache_dir (str): Cache directory. Defaults to 'station_data'.
+
+    Returns:
+    pd.DataFrame: 'DATE' plus one column per element in tenths (°C or mm), like the CSV.
+    Days on which all requested elements are missing are dropped.
+    """
+    if isinstance(elements, str):
+        elements = (elements,)
+    arr = load_daily_array(station_id, cache_dir)
+    values = np.stack([arr[e] for e in elements], axis=1)
+    present = values != MISSING
+    keep = present.any(axis=1)
+    df = pd.DataFrame({"DATE": arr["day"][keep].astype("datetime64[D]").astype("datetime64[ns]")})
+    for i, element in enumerate(elements):
+        df[element] = np.where(present[keep, i], values[keep, i], np.nan)
+    return df
@@ -0,0 +1,305 @@
+"""
+Out-of-core aggregation of GHCN-Daily records into monthly stores.
+
+huscrn-sep2025.py holds one DataFrame per station and calls
+``resample("M").mean()``, which is fine for a dozen pairs but not for the
+network. `aggregate_daily` streams the bulk archives instead:
+
+- ``ghcnd_all.tar.gz`` / ``*.dly`` files (fixed width, one station-month per
+  line: ID, year, month, element, then 31 x value/MFLAG/QFLAG/SFLAG),
+- the by-year files ``YYYY.csv[.gz]`` (ID, YYYYMMDD, element, value, flags),
+
+in bounded-size chunks. Every chunk is reduced to per station-month-element
+sums and day counts (one ``np.unique`` + ``np.bincount`` over integer keys)
+and merged into a `MonthlyAccumulator`, so memory is bounded by the size of
+the monthly result (about 30 times smaller than the daily input), never by the
+archive. Values that failed a quality check (non-blank QFLAG) are dropped.
+A station-month reported by several sources (an updated ``.dly`` listed after
+the archive, say) is taken from the last of them, never summed across sources.
+
+The result is written as one `MonthlyStore` per element (mean in hundredths
+of °C, MISSING where fewer than ``min_days`` days reported, the day counts in
+an extra ``days.npy``), so `select`, `block_anomalies`, the coverage index and
+the sweeps work on daily-derived monthly data unchanged.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.decode import _YEAR_WEIGHTS, _VALUE_WEIGHTS, MISSING, _decode_digits, _record_matrix, iter_chunks
+from ghcn_tools.fetch import iter_tar_members
+from ghcn_tools.instrument import stage, traced
+from ghcn_tools.store import FLAG_NAMES, STORE_FORMAT, MonthlyStore, _write_array
+
+DLY_WIDTH = 269
+TEMPERATURE_ELEMENTS = ('TMAX', 'TMIN', 'TAVG')
+BASE_YEAR = 1700
+YEAR_SPAN = 400
+_MONTH_WEIGHTS = np.array([10, 1], dtype=np.int32)
+_SPACE = ord(' ')
+
+
+class MonthlyAccumulator:
+    """
+    Running per station-month-element sums and day counts of daily values.
+
+    Partial aggregates are buffered and merged once ``flush_rows`` rows have
+    accumulated, so adding a chunk costs a sort of the chunk only. After
+    `next_source`, station-month-elements the new source reports replace those
+    of the earlier sources instead of adding to them.
+    """
+
+    def __init__(self, elements=('TMAX',), flush_rows=1 << 22):
+        unknown = set(elements) - set(TEMPERATURE_ELEMENTS)
+        if unknown:
+            raise ValueError(f"Unsupported element(s) {sorted(unknown)}, expected {TEMPERATURE_ELEMENTS}")
+        self.elements = tuple(elements)
+        self.flush_rows = flush_rows
+        self.station_codes = {}
+        self.keys = np.empty(0, dtype=np.int64)
+        self.sums = np.empty(0, dtype=np.float64)
+        self.counts = np.empty(0, dtype=np.float64)
+        self._pending = []
+        self._pending_rows = 0
+        self._earlier = np.empty(0, dtype=np.int64)
+        self.n_days = 0
+        self.n_replaced = 0
+
+    def _codes(self, station_ids):
+        unique, inverse = np.unique(station_ids, return_inverse=True)
+        codes = np.fromiter((self.station_codes.setdefault(s, len(self.station_codes)) for s in unique.tolist()),
+                            dtype=np.int64, count=len(unique))
+        return codes[inverse]
+
+    def _element_index(self, elements):
+        index = np.full(len(elements), -1, dtype=np.int64)
+        for i, element in enumerate(self.elements):
+            index[elements == element.encode('ascii')] = i
+        return index
+
+    @staticmethod
+    def _reduce(keys, sums, counts):
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return (unique, np.bincount(inverse, weights=sums, minlength=len(unique)),
+                np.bincount(inverse, weights=counts, minlength=len(unique)))
+
+    def add(self, station_ids, elements, years, months, sums, counts):
+        """
+        Add partial sums of daily values.
+
+        Parameters:
+        station_ids (np.ndarray): S11 station IDs.
+        elements (np.ndarray): S4 element codes; elements not accumulated are skipped.
+        years, months (np.ndarray): Year and month (1-12) of every row.
+        sums (np.ndarray): Sum of the valid daily values (tenths of °C).
+        counts (np.ndarray): Number of valid days in that sum.
+        """
+        element = self._element_index(np.asarray(elements))
+        keep = (element >= 0) & (np.asarray(counts) > 0)
+        if not keep.any():
+            return
+        years = np.asarray(years, dtype=np.int64)[keep]
+        if years.min() < BASE_YEAR or years.max() >= BASE_YEAR + YEAR_SPAN:
+            raise ValueError(f"Years outside {BASE_YEAR}-{BASE_YEAR + YEAR_SPAN - 1}")
+        station = self._codes(np.asarray(station_ids)[keep])
+        keys = (((station * len(self.elements) + element[keep]) * YEAR_SPAN + years - BASE_YEAR) * 12
+                + np.asarray(months, dtype=np.int64)[keep] - 1)
+        counts = np.asarray(counts, dtype=np.float64)[keep]
+        part = self._reduce(keys, np.asarray(sums, dtype=np.float64)[keep], counts)
+        self.n_days += int(counts.sum())
+        self._pending.append(part)
+        self._pending_rows += len(part[0])
+        if self._pending_rows >= self.flush_rows:
+            self._merge()
+
+    def add_daily(self, station_ids, elements, years, months, values):
+        """Add single daily values (one row per station-day-element)."""
+        self.add(station_ids, elements, years, months, values, np.ones(len(values)))
+
+    def next_source(self):
+        """Start a new source; what it reports replaces the station-months accumulated so far."""
+        self._merge()
+        self._earlier = self.keys
+
+    def _merge(self):
+        if not self._pending:
+            return
+        keys, sums, counts = self._reduce(*(np.concatenate(col) for col in zip(*self._pending)))
+        if len(self._earlier):
+            old = (np.isin(self.keys, keys, assume_unique=True)
+                   & np.isin(self.keys, self._earlier, assume_unique=True))
+            if old.any():
+                self.n_replaced += int(self.counts[old].sum())
+                self._earlier = np.setdiff1d(self._earlier, self.keys[old], assume_unique=True)
+                self.keys, self.sums, self.counts = self.keys[~old], self.sums[~old], self.counts[~old]
+        self.keys, self.sums, self.counts = self._reduce(np.concatenate([self.keys, keys]),
+                                                         np.concatenate([self.sums, sums]),
+                                                         np.concatenate([self.counts, counts]))
+        self._pending = []
+        self._pending_rows = 0
+
+    def monthly(self, element):
+        """
+        Monthly means of one element, as sparse station-months.
+
+        Returns:
+        dict: 'station_id' (S11, sorted), 'first_year', 'last_year' and per reported
+        station-month 'row', 'year_index', 'month' (0-11), 'mean' (tenths of °C) and 'days'.
+        """
+        self._merge()
+        n_el = len(self.elements)
+        month = self.keys % 12
+        rest = self.keys // 12
+        year = rest % YEAR_SPAN + BASE_YEAR
+        rest //= YEAR_SPAN
+        sel = rest % n_el == self.elements.index(element)
+        if not sel.any():
+            raise ValueError(f"No {element} values accumulated")
+        ids = np.array(list(self.station_codes), dtype='S11')
+        station_ids, row = np.unique(ids[rest[sel] // n_el], return_inverse=True)
+        year = year[sel]
+        first = int(year.min())
+        return {
+            'station_id': station_ids,
+            'first_year': first,
+            'last_year': int(year.max()),
+            'row': row,
+            'year_index': year - first,
+            'month': month[sel],
+            'mean': self.sums[sel] / self.counts[sel],
+            # at most 31 once sources are deduplicated; clipped so duplicate rows cannot wrap uint8
+            'days': np.minimum(self.counts[sel], np.iinfo(np.uint8).max).astype(np.uint8),
+        }
+
+
+def _dly_chunk(buf):
+    """Per station-month sums and day counts of a buffer of ``.dly`` lines."""
+    rec = _record_matrix(buf, DLY_WIDTH)
+    fields = rec[:, 21:21 + 31 * 8].reshape(-1, 31, 8)
+    values = _decode_digits(fields[:, :, :5], _VALUE_WEIGHTS, MISSING)
+    valid = (values != MISSING) & (fields[:, :, 6] == _SPACE)
+    return {
+        'station_id': np.ascontiguousarray(rec[:, 0:11]).view('S11').ravel(),
+        'year': _decode_digits(rec[:, 11:15], _YEAR_WEIGHTS),
+        'month': _decode_digits(rec[:, 15:17], _MONTH_WEIGHTS),
+        'element': np.ascontiguousarray(rec[:, 17:21]).view('S4').ravel(),
+        'sum': np.where(valid, values, 0).sum(axis=1),
+        'count': valid.sum(axis=1),
+    }
+
+
+def _add_dly(acc, stream, chunk_bytes):
+    for buf in iter_chunks(stream, chunk_bytes):
+        part = _dly_chunk(buf)
+        acc.add(part['station_id'], part['element'], part['year'], part['month'], part['sum'], part['count'])
+
+
+def _add_by_year(acc, path, chunk_rows):
+    reader = pd.read_csv(path, header=None, usecols=[0, 1, 2, 3, 5], names=['id', 'date', 'element', 'value', 'qflag'],
+                         dtype={'id': str, 'date': np.int64, 'element': str, 'value': np.int64, 'qflag': str},
+                         chunksize=chunk_rows)
+    wanted = list(acc.elements)
+    for chunk in reader:
+        chunk = chunk[chunk['element'].isin(wanted) & chunk['qflag'].isna() & (chunk['value'] != MISSING)]
+        date = chunk['date'].to_numpy()
+        acc.add_daily(chunk['id'].to_numpy().astype('S11'), chunk['element'].to_numpy().astype('S4'),
+                      date // 10000, date // 100 % 100, chunk['value'].to_numpy())
+
+
+def _add_source(acc, source, chunk_bytes, chunk_rows):
+    name = os.fspath(source)
+    if name.endswith(('.tar.gz', '.tgz')):
+        for _, stream in iter_tar_members(name, ('.dly',)):
+            _add_dly(acc, stream, chunk_bytes)
+    elif name.endswith('.dly'):
+        with open(name, 'rb') as f:
+            _add_dly(acc, f, chunk_bytes)
+    elif name.endswith(('.csv', '.csv.gz')):
+        _add_by_year(acc, name, chunk_rows)
+    else:
+        raise ValueError(f"Unrecognized GHCN-Daily source {name} (expected .dly, .tar.gz or by-year .csv[.gz])")
+
+
+def write_monthly_store(store_dir, element, monthly, min_days=20, source=None):
+    """
+    Write the monthly means of `MonthlyAccumulator.monthly` as a `MonthlyStore`.
+
+    Months with fewer than ``min_days`` reporting days are stored as MISSING;
+    the day counts of all months are kept in ``days.npy``.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    shape = (len(monthly['station_id']), monthly['last_year'] - monthly['first_year'] + 1, 12)
+    at = (monthly['row'], monthly['year_index'], monthly['month'])
+    complete = monthly['days'] >= max(min_days, 1)
+    np.save(os.path.join(store_dir, 'station_ids.npy'), monthly['station_id'])
+    value = _write_array(store_dir, 'value', shape, np.int16, MISSING)
+    # tenths of °C -> hundredths of °C, like GHCN-M
+    value[tuple(i[complete] for i in at)] = np.round(monthly['mean'][complete] * 10).astype(np.int16)
+    value.flush()
+    del value
+    days = _write_array(store_dir, 'days', shape, np.uint8, 0)
+    days[at] = monthly['days']
+    days.flush()
+    del days
+    for name in FLAG_NAMES:
+        _write_array(store_dir, name, shape, np.uint8, _SPACE).flush()
+    station_years = np.unique((monthly['row'][complete].astype(np.int64) * shape[1]) + monthly['year_index'][complete])
+    meta = {
+        'format': STORE_FORMAT,
+        'element': element,
+        'first_year': monthly['first_year'],
+        'last_year': monthly['last_year'],
+        'n_stations': shape[0],
+        'n_records': int(len(station_years)),
+        'min_days': min_days,
+        'source': source or {'name': 'ghcnd'},
+    }
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return MonthlyStore(store_dir)
+
+
+@traced('daily aggregation')
+def aggregate_daily(sources, out_dir, elements=('TMAX', 'TMIN'), min_days=20, chunk_bytes=1 << 26,
+                    chunk_rows=1 << 21, flush_rows=1 << 22):
+    """
+    Stream GHCN-Daily archives into one monthly store per element.
+
+    Parameters:
+    sources (str or list): ``.dly`` files, ``ghcnd_all.tar.gz``-style archives and/or
+        by-year ``YYYY.csv[.gz]`` files.
+    out_dir (str): Output directory; the store of element E is written to ``out_dir/E``.
+    elements (tuple): Temperature elements to aggregate (TMAX, TMIN, TAVG).
+    min_days (int): Minimum reporting days for a monthly mean, otherwise MISSING.
+    chunk_bytes (int): Bytes of ``.dly`` text decoded per chunk.
+    chunk_rows (int): Rows of a by-year CSV read per chunk.
+    flush_rows (int): Buffered partial rows before they are merged.
+
+    A station-month-element reported by more than one source is taken from the last
+    source that reports it.
+
+    Returns:
+    dict: element -> `MonthlyStore`.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    acc = MonthlyAccumulator(elements, flush_rows)
+    for source in sources:
+        with stage('daily source', source=os.path.basename(os.fspath(source))) as s:
+            before = acc.n_days
+            acc.next_source()
+            _add_source(acc, source, chunk_bytes, chunk_rows)
+            s.add(rows=acc.n_days - before)
+    if acc.n_replaced:
+        print(f"{acc.n_replaced} daily values replaced by station-months of later sources")
+    names = [os.path.basename(os.fspath(s)) for s in sources]
+    stores = {}
+    for element in elements:
+        store = write_monthly_store(os.path.join(out_dir, element), element, acc.monthly(element), min_days,
+                                    {'name': names[0] if len(names) == 1 else names, 'kind': 'ghcnd'})
+        print(f"Aggregated {acc.n_days} daily values into {store.meta['n_records']} {element} station-years "
+              f"for {len(store)} stations ({store.first_year}-{store.last_year}) in {store.store_dir}")
+        stores[element] = store
+    return stores
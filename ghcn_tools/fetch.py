@@ -0,0 +1,188 @@
+"""
+Streaming, content-addressed download cache for the GHCN-M tarballs.
+
+The notebooks download ``ghcnm.tavg.latest.qcu.tar.gz`` in every cell and keep
+the whole archive in RAM via ``io.BytesIO(response.content)``. `fetch` streams
+the response to disk in fixed-size blocks while hashing it, stores it under
+its SHA-256 and remembers the ETag/Last-Modified headers, so later runs either
+skip the network entirely (within ``max_age``) or send a conditional request
+that is answered with a bodiless 304.
+
+    cache_dir/
+        index.json           url -> sha256, etag, last_modified, size, fetched
+        objects/<sha256>     downloaded files
+        extracted/<sha256>/  tar members decompressed from that object
+"""
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+import time
+
+import requests
+
+GHCNM_URL = "https://www.ncei.noaa.gov/pub/data/ghcn/v4/ghcnm.tavg.latest.qcu.tar.gz"
+DEFAULT_CACHE_DIR = "ghcn_cache"
+GHCNM_SUFFIXES = ('.dat', '.inv')
+
+
+def _load_index(cache_dir):
+    path = os.path.join(cache_dir, 'index.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_index(cache_dir, index):
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.json.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, os.path.join(cache_dir, 'index.json'))
+
+
+def object_path(cache_dir, sha256):
+    return os.path.join(cache_dir, 'objects', sha256)
+
+
+def fetch(url, cache_dir=DEFAULT_CACHE_DIR, session=None, max_age=12 * 3600, offline=False,
+          chunk_size=1 << 20, timeout=60):
+    """
+    Return the local path of ``url``, downloading it only if the cached copy is stale.
+
+    Parameters:
+    url (str): File to download.
+    cache_dir (str): Cache directory. Defaults to 'ghcn_cache'.
+    session (requests.Session, optional): Session to use, e.g. one with retries or a proxy.
+    max_age (float): Seconds during which a cached copy is used without any request.
+        After that a conditional GET (If-None-Match / If-Modified-Since) revalidates it.
+        None always revalidates.
+    offline (bool): Never touch the network; fail if the URL is not cached.
+    chunk_size (int): Streaming block size in bytes.
+    timeout (float): Connect/read timeout in seconds.
+
+    Returns:
+    str: Path to the cached file (named by its SHA-256).
+    """
+    os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+    index = _load_index(cache_dir)
+    entry = index.get(url)
+    cached = entry is not None and os.path.exists(object_path(cache_dir, entry['sha256']))
+
+    if cached and (offline or (max_age is not None and time.time() - entry['fetched'] < max_age)):
+        return object_path(cache_dir, entry['sha256'])
+    if offline:
+        raise FileNotFoundError(f"{url} is not in the cache {cache_dir} and offline=True")
+
+    headers = {}
+    if cached:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    http = session or requests.Session()
+    try:
+        with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 304 and cached:
+                entry['fetched'] = time.time()
+                _save_index(cache_dir, index)
+                print(f"Not modified, using cached {os.path.basename(url)}")
+                return object_path(cache_dir, entry['sha256'])
+            response.raise_for_status()
+
+            print(f"Downloading {url}...")
+            digest = hashlib.sha256()
+            size = 0
+            fd, tmp = tempfile.mkstemp(dir=os.path.join(cache_dir, 'objects'), suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for block in response.iter_content(chunk_size=chunk_size):
+                        f.write(block)
+                        digest.update(block)
+                        size += len(block)
+                sha256 = digest.hexdigest()
+                os.replace(tmp, object_path(cache_dir, sha256))
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+    finally:
+        if session is None:
+            http.close()
+
+    index[url] = {
+        'sha256': sha256,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'size': size,
+        'fetched': time.time(),
+    }
+    _save_index(cache_dir, index)
+    print(f"Cached {size / 1e6:.1f} MB as {sha256[:12]}")
+    return object_path(cache_dir, sha256)
+
+
+def iter_tar_members(archive_path, suffixes=GHCNM_SUFFIXES):
+    """
+    Stream the members of a ``.tar.gz`` whose names end with one of ``suffixes``.
+
+    The archive is read sequentially ('r|gz'), so neither the compressed nor the
+    decompressed archive is held in memory. Each yielded file object must be
+    consumed before the generator is advanced.
+
+    Yields:
+    (str, file object): Member name and a binary stream of its contents.
+    """
+    with tarfile.open(archive_path, mode='r|gz') as tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith(tuple(suffixes)):
+                yield member.name, tar.extractfile(member)
+
+
+def extract_members(archive_path, dest_dir, suffixes=GHCNM_SUFFIXES, chunk_size=1 << 20):
+    """
+    Decompress the matching members of ``archive_path`` into ``dest_dir`` (flattened names).
+
+    Returns:
+    dict: Suffix -> extracted file path.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    paths = {}
+    for name, stream in iter_tar_members(archive_path, suffixes):
+        path = os.path.join(dest_dir, os.path.basename(name))
+        fd, tmp = tempfile.mkstemp(dir=dest_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                block = stream.read(chunk_size)
+                if not block:
+                    break
+                out.write(block)
+        os.replace(tmp, path)
+        paths[next(s for s in suffixes if name.endswith(s))] = path
+    return paths
+
+
+def fetch_ghcnm(url=GHCNM_URL, cache_dir=DEFAULT_CACHE_DIR, **fetch_kwargs):
+    """
+    Fetch a GHCN-M tarball and return the paths of its decompressed ``.dat``/``.inv`` members.
+
+    The members are decompressed once per downloaded archive version; reruns
+    only stat the cache (or revalidate it, see `fetch`).
+
+    Returns:
+    (str, str): Paths of the ``.dat`` and ``.inv`` files.
+    """
+    archive = fetch(url, cache_dir, **fetch_kwargs)
+    dest = os.path.join(cache_dir, 'extracted', os.path.basename(archive))
+    done = os.path.join(dest, '.complete')
+    if os.path.exists(done):
+        with open(done) as f:
+            paths = json.load(f)
+    else:
+        print(f"Extracting {', '.join(GHCNM_SUFFIXES)} from {os.path.basename(url)}...")
+        paths = extract_members(archive, dest)
+        with open(done, 'w') as f:
+            json.dump(paths, f)
+    return paths['.dat'], paths['.inv']
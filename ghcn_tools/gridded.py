@@ -0,0 +1,215 @@
+"""
+Gridded, area-weighted regional and global means.
+
+`plot_anomaly_timeseries` and the per-bin series average all stations of a
+region with ``groupby('year')['anomaly'].mean()``, so dense clusters (most of
+the US network) dominate. `GriddedAggregator` assigns every station to a
+lat/lon cell once, then averages stations within cells and cells weighted by
+their area (``Δsin(lat) · Δlon``, the integral of cos(lat) over the cell).
+All time steps of all regions come out of one sorted ``np.add.reduceat``
+pass over the stations grouped by integer (cell, region membership) codes:
+
+    cell mean[g, t]   = Σ values[s, t] / n[g, t]          stations s of group g
+    region mean[r, t] = Σ area[c] · cell mean[c, t] / Σ area[c]   cells with data
+
+Regions are arbitrary station masks (country codes, latitude bands,
+urbanization bins, ...) and may overlap. The equal-area option uses
+latitude bands of equal area with a cos(lat)-scaled number of cells per band,
+like the GISS 8000-box grid.
+"""
+import numpy as np
+import pandas as pd
+
+LATITUDE_BANDS = (-90, -60, -30, 0, 30, 60, 90)
+
+
+class Grid:
+    """
+    Regular or equal-area lat/lon grid with integer cell codes.
+
+    Parameters:
+    cell_deg (float): Cell size in degrees (latitude band height at the equator for
+        the equal-area grid).
+    equal_area (bool): Use equal-area latitude bands with cos(lat)-scaled cells per band.
+    """
+
+    def __init__(self, cell_deg=5.0, equal_area=False):
+        self.cell_deg = cell_deg
+        self.equal_area = equal_area
+        n_lon = int(np.ceil(360 / cell_deg))
+        if equal_area:
+            self.n_bands = max(int(round(180 / cell_deg)), 1)
+            self.sin_edges = np.linspace(-1, 1, self.n_bands + 1)
+            centers = np.degrees(np.arcsin((self.sin_edges[:-1] + self.sin_edges[1:]) / 2))
+            self.band_cells = np.maximum(np.round(n_lon * np.cos(np.radians(centers))), 1).astype(np.int64)
+        else:
+            self.n_bands = int(np.ceil(180 / cell_deg))
+            lat_edges = np.minimum(-90 + cell_deg * np.arange(self.n_bands + 1), 90)
+            self.sin_edges = np.sin(np.radians(lat_edges))
+            self.band_cells = np.full(self.n_bands, n_lon, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.band_cells)])
+        self.n_cells = int(self.offsets[-1])
+
+    def cells(self, lat, lon):
+        """Cell code of every (lat, lon); -1 where a coordinate is missing."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        ok = ~np.isnan(lat) & ~np.isnan(lon)
+        s = np.sin(np.radians(np.where(ok, lat, 0)))
+        band = np.clip(np.searchsorted(self.sin_edges, s, side='right') - 1, 0, self.n_bands - 1)
+        n = self.band_cells[band]
+        col = np.floor((np.where(ok, lon, 0) + 180) / 360 * n).astype(np.int64) % n
+        return np.where(ok, self.offsets[band] + col, -1)
+
+    def _band(self, codes):
+        return np.searchsorted(self.offsets, codes, side='right') - 1
+
+    def area(self, codes):
+        """Area of the cells as a fraction of the sphere."""
+        band = self._band(np.asarray(codes))
+        return (self.sin_edges[band + 1] - self.sin_edges[band]) / 2 / self.band_cells[band]
+
+    def centers(self, codes):
+        """(lat, lon) of the cell centers."""
+        codes = np.asarray(codes)
+        band = self._band(codes)
+        lat = np.degrees(np.arcsin((self.sin_edges[band] + self.sin_edges[band + 1]) / 2))
+        lon = -180 + (codes - self.offsets[band] + 0.5) * 360 / self.band_cells[band]
+        return lat, lon
+
+
+def station_coordinates(stations, station_ids, lat='latitude', lon='longitude', id_col='station_id'):
+    """Latitude and longitude aligned with ``station_ids`` (NaN for unknown stations)."""
+    table = stations.drop_duplicates(id_col).set_index(id_col)
+    ids = pd.Index(np.asarray(station_ids).astype(str))
+    return (table[lat].reindex(ids).to_numpy(dtype=np.float64),
+            table[lon].reindex(ids).to_numpy(dtype=np.float64))
+
+
+def region_masks(labels, names=None):
+    """{label: station mask} for every distinct label of a per-station array (NaN/None skipped)."""
+    labels = pd.Series(np.asarray(labels, dtype=object))
+    keep = labels.notna()
+    names = names if names is not None else sorted(labels[keep].unique(), key=str)
+    return {name: (labels == name).to_numpy() & keep.to_numpy() for name in names}
+
+
+def latitude_bands(lat, edges=LATITUDE_BANDS):
+    """Per-station latitude band labels such as '30N-60N'."""
+    def fmt(v):
+        return f"{abs(v):g}{'S' if v < 0 else 'N' if v > 0 else ''}"
+    names = [f"{fmt(lo)}-{fmt(hi)}" for lo, hi in zip(edges[:-1], edges[1:])]
+    idx = np.searchsorted(edges, np.asarray(lat, dtype=np.float64), side='right') - 1
+    idx = np.where(np.asarray(lat) == edges[-1], len(names) - 1, idx)
+    ok = (idx >= 0) & (idx < len(names))
+    return np.where(ok, np.array(names, dtype=object)[np.clip(idx, 0, len(names) - 1)], None)
+
+
+class GriddedAggregator:
+    """
+    Area-weighted aggregation of station values over a `Grid`.
+
+    Parameters:
+    lat, lon (array-like): Station coordinates, aligned with the rows of the values
+        passed to the methods (see `station_coordinates`).
+    cell_deg (float): Cell size in degrees.
+    equal_area (bool): Use the equal-area grid.
+    """
+
+    def __init__(self, lat, lon, cell_deg=5.0, equal_area=False):
+        self.grid = Grid(cell_deg, equal_area)
+        self.codes = self.grid.cells(lat, lon)
+
+    def _group_sums(self, values, group, n_groups):
+        """Sums and counts of the valid values per (group, time); rows with group -1 are ignored."""
+        rows = np.flatnonzero(group >= 0)
+        rows = rows[np.argsort(group[rows], kind='stable')]
+        present, starts = np.unique(group[rows], return_index=True)
+        sub = values[rows]
+        valid = ~np.isnan(sub)
+        sums = np.zeros((n_groups, values.shape[1]))
+        counts = np.zeros((n_groups, values.shape[1]), dtype=np.int32)
+        if len(rows):
+            sums[present] = np.add.reduceat(np.where(valid, sub, 0), starts, axis=0, dtype=np.float64)
+            counts[present] = np.add.reduceat(valid.view(np.uint8), starts, axis=0, dtype=np.int32)
+        return sums, counts
+
+    def cell_means(self, values, min_stations=1):
+        """
+        Mean of the stations in every occupied cell.
+
+        Parameters:
+        values (np.ndarray): (stations, ...) values, NaN for missing (e.g. anomalies of
+            `block_anomalies` for the stations passed to the constructor).
+        min_stations (int): Minimum reporting stations per cell and time step.
+
+        Returns:
+        (np.ndarray, np.ndarray): Occupied cell codes and their (cells, ...) means.
+        """
+        values = np.asarray(values)
+        shape = values.shape[1:]
+        cells, group = np.unique(self.codes, return_inverse=True)
+        group = group.ravel()
+        if len(cells) and cells[0] == -1:
+            cells, group = cells[1:], group - 1
+        sums, counts = self._group_sums(values.reshape(len(values), -1), group, len(cells))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts >= max(min_stations, 1), sums / counts, np.nan)
+        return cells, means.reshape((len(cells),) + shape)
+
+    def region_means(self, values, regions=None, min_stations=1):
+        """
+        Area-weighted means of one or more regions for all time steps.
+
+        Parameters:
+        values (np.ndarray): (stations, ...) values, NaN for missing.
+        regions (dict or array-like, optional): {name: station mask}, or a per-station label
+            array (see `region_masks`); None gives one 'global' region of all stations.
+        min_stations (int): Minimum reporting stations per cell and time step.
+
+        Returns:
+        (list, np.ndarray): Region names and their (regions, ...) means.
+        """
+        values = np.asarray(values)
+        shape = values.shape[1:]
+        flat = values.reshape(len(values), -1)
+        if regions is None:
+            regions = {'global': np.ones(len(values), dtype=bool)}
+        elif not isinstance(regions, dict):
+            regions = region_masks(regions)
+        names = list(regions)
+        masks = np.array([np.asarray(regions[n], dtype=bool) for n in names]).reshape(len(names), -1)
+
+        # One reduction over the finest partition: stations with the same cell and the
+        # same region membership; regions are then unions of these groups.
+        located = (self.codes >= 0) & masks.any(axis=0)
+        signature = np.packbits(masks, axis=0).T
+        keys = np.column_stack([self.codes, signature.astype(np.int64)])
+        uniq, group = np.unique(keys[located], axis=0, return_inverse=True)
+        station_group = np.full(len(values), -1)
+        station_group[located] = group.ravel()
+        sums, counts = self._group_sums(flat, station_group, len(uniq))
+        member = np.unpackbits(uniq[:, 1:].astype(np.uint8), axis=1, count=len(names)).astype(bool)
+
+        out = np.full((len(names), flat.shape[1]), np.nan)
+        for r in range(len(names)):
+            g = np.flatnonzero(member[:, r])
+            if not len(g):
+                continue
+            order = np.argsort(uniq[g, 0], kind='stable')
+            g = g[order]
+            cells, starts = np.unique(uniq[g, 0], return_index=True)
+            cell_sums = np.add.reduceat(sums[g], starts, axis=0)
+            cell_counts = np.add.reduceat(counts[g], starts, axis=0)
+            ok = cell_counts >= max(min_stations, 1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cell_mean = np.where(ok, cell_sums / np.where(ok, cell_counts, 1), 0)
+            w = self.grid.area(cells)[:, None] * ok
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[r] = (w * cell_mean).sum(axis=0) / w.sum(axis=0)
+        return names, out.reshape((len(names),) + shape)
+
+    def region_frame(self, values, times, regions=None, min_stations=1):
+        """`region_means` of (stations, time) values as a DataFrame (index ``times``, one column per region)."""
+        names, means = self.region_means(values, regions, min_stations)
+        return pd.DataFrame(means.reshape(len(names), -1).T, index=times, columns=names)
@@ -0,0 +1,482 @@
+"""
+Legacy/USCRN pair pipeline of huscrn-sep2025.py as importable functions.
+
+The script ran download -> stitch -> baseline -> ensemble -> map -> plot as
+import-time side effects. The stages live here, so the script, the notebooks
+and the ``python -m ghcn_tools`` CLI call the same code:
+
+    fetch_stations(pair_station_ids(STATION_PAIRS))
+    results = process_pairs(STATION_PAIRS, element="TMAX")
+    monthly, annual = create_ensemble(results["strict"], "STRICT")
+
+Only pandas/NumPy are imported at module level; folium is imported inside
+`create_station_map`.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import requests
+
+from ghcn_tools.anomaly import ensemble_from_series
+from ghcn_tools.daily import DEFAULT_CACHE_DIR, download_station, load_daily
+from ghcn_tools.instrument import stage, traced
+from ghcn_tools.loess import lowess_batch
+
+STATION_PAIRS = [
+    {
+        "legacy_name": "MULESHOE_NTL_WR",
+        "legacy_id": "USC00416137",
+        "uscrn_name": "MULESHOE_19_S",
+        "uscrn_id": "USW00003054",
+        "lat": 34.2267, "lon": -102.7233,  # Muleshoe, TX
+        "state": "TX"
+    },
+    {
+        "legacy_name": "MAUNA_LOA_SLOPE_OBS_39",
+        "legacy_id": "USC00516198",
+        "uscrn_name": "MAUNA_LOA_5_NNE",
+        "uscrn_id": "USW00021514",
+        "lat": 19.5361, "lon": -155.5783,  # Mauna Loa, HI
+        "state": "HI"
+    },
+    {
+        "legacy_name": "BLACK_CANYON_COLORADO",
+        "legacy_id": "USR0000CBLA",
+        "uscrn_name": "MONTROSE_11_ENE",
+        "uscrn_id": "USW00003060",
+        "lat": 38.4583, "lon": -107.6333,  # Montrose, CO
+        "state": "CO"
+    },
+    {
+        "legacy_name": "CRANE_FLAT_LOOKOUT_CALIFORNIA",
+        "legacy_id": "USR0000CCRA",
+        "uscrn_name": "YOSEMITE_VILLAGE_12_W",
+        "uscrn_id": "USW00053150",
+        "lat": 37.7167, "lon": -119.7833,  # Yosemite, CA
+        "state": "CA"
+    },
+    {
+        "legacy_name": "DUKE_FOREST_NORTH_CAROLINA",
+        "legacy_id": "USR0000NDUK",
+        "uscrn_name": "DURHAM_11_W",
+        "uscrn_id": "USW00003758",
+        "lat": 35.9783, "lon": -79.1000,  # Durham, NC
+        "state": "NC"
+    },
+    {
+        "legacy_name": "NIWOT",
+        "legacy_id": "USS0005J42S",
+        "uscrn_name": "BOULDER_14_W",
+        "uscrn_id": "USW00094075",
+        "lat": 40.0333, "lon": -105.5833,  # Boulder, CO
+        "state": "CO"
+    },
+    {
+        "legacy_name": "MERCURY_DESERT_ROCK_AP",
+        "legacy_id": "USW00003160",
+        "uscrn_name": "MERCURY_3_SSW",
+        "uscrn_id": "USW00053136",
+        "lat": 36.6233, "lon": -116.0167,  # Mercury, NV
+        "state": "NV"
+    },
+    {
+        "legacy_name": "CRAIG_AFB",
+        "legacy_id": "USW00013850",
+        "uscrn_name": "SELMA_6_SSE",
+        "uscrn_id": "USW00063897",
+        "lat": 32.3433, "lon": -87.0067,  # Selma, AL
+        "state": "AL"
+    },
+    {
+        "legacy_name": "LIMESTONE_LORING_AFB",
+        "legacy_id": "USW00014623",
+        "uscrn_name": "LIMESTONE_4_NNW",
+        "uscrn_id": "USW00094645",
+        "lat": 46.9500, "lon": -67.8833,  # Limestone, ME
+        "state": "ME"
+    },
+    {
+        "legacy_name": "BLACKVILLE_3_W",
+        "legacy_id": "USC00380764",
+        "uscrn_name": "BLACKVILLE_3_W",
+        "uscrn_id": "USW00063826",
+        "lat": 33.3583, "lon": -81.3000,  # Blackville, SC
+        "state": "SC"
+    },
+    {
+        "legacy_name": "HOLLY_SPRINGS_4_N",
+        "legacy_id": "USC00224173",
+        "uscrn_name": "HOLLY_SPRINGS_4_N",
+        "uscrn_id": "USW00023803",
+        "lat": 35.6667, "lon": -78.8333,  # Holly Springs, NC
+        "state": "NC"
+    },
+    {
+        "legacy_name": "STILLWATER_2_W",
+        "legacy_id": "USC00348501",
+        "uscrn_name": "STILLWATER_2_W",
+        "uscrn_id": "USW00053926",
+        "lat": 36.1167, "lon": -97.0833,  # Stillwater, OK
+        "state": "OK"
+    },
+]
+
+BASELINE_START = 1960
+BASELINE_END = 1980
+MIN_BASELINE_YEARS = 15
+ELEMENT = "TMAX"  # any of TMAX, TMIN, TAVG (tenths of °C in GHCN-Daily)
+ALTERNATIVE_BASELINES = [
+    (1971, 1990),  # WMO alternative
+    (1981, 2010),  # Current WMO standard
+    (1951, 1980),  # GISS standard
+    (1961, 1990),  # Another common period
+]
+
+
+def pair_station_ids(station_pairs):
+    """Legacy and USCRN station IDs of all pairs, in pair order."""
+    return [pair[key] for pair in station_pairs for key in ("legacy_id", "uscrn_id")]
+
+
+def read_station_pairs(path):
+    """Read a ``station_pairs`` list from a JSON file or a CSV with the same columns."""
+    if path.endswith(".json"):
+        return pd.read_json(path).to_dict("records")
+    return pd.read_csv(path).to_dict("records")
+
+
+def get_station_data(station_id, element=ELEMENT, cache_dir=DEFAULT_CACHE_DIR, offline=False):
+    """
+    Downloads and caches GHCN-Daily data for a given station ID (binary cache after first read).
+
+    With ``offline`` a station that is not cached is skipped (None) instead of downloaded.
+    """
+    filepath = os.path.join(cache_dir, f"{station_id}.csv")
+    if not os.path.exists(filepath):
+        if offline:
+            print(f"No cached data for {station_id} (offline).")
+            return None
+        print(f"Downloading data for {station_id}...")
+        try:
+            download_station(station_id, cache_dir)
+        except requests.exceptions.RequestException as e:
+            print(f"Error downloading {station_id}: {e}")
+            return None
+    else:
+        print(f"Using cached data for {station_id}.")
+
+    try:
+        return load_daily(station_id, element, cache_dir)
+    except Exception as e:
+        print(f"Error reading {filepath}: {e}")
+        return None
+
+
+def calculate_alternative_baseline(stitched_df, element=ELEMENT, periods=ALTERNATIVE_BASELINES):
+    """Calculate alternative baseline when standard period isn't available."""
+    for alt_start, alt_end in periods:
+        alt_period = stitched_df.loc[str(alt_start):str(alt_end)]
+        if not alt_period.empty and len(alt_period) >= 60:
+            return alt_period[element].mean(), f"{alt_start}-{alt_end}"
+
+    # Use longest available period that's at least 10 years long
+    years_available = stitched_df.index.year.unique()
+    if len(years_available) >= 10:
+        if len(years_available) >= 20:
+            start_year = years_available[len(years_available)//2 - 10]
+            end_year = years_available[len(years_available)//2 + 9]
+            custom_period = stitched_df.loc[str(start_year):str(end_year)]
+            return custom_period[element].mean(), f"{start_year}-{end_year}"
+        else:
+            return stitched_df[element].mean(), f"{years_available.min()}-{years_available.max()}"
+
+    return None, None
+
+
+def stitch_station_data(legacy_df, uscrn_df, element=ELEMENT):
+    """
+    Daily °C series of a pair: legacy data before the first USCRN day, USCRN from then on.
+
+    Returns:
+    pd.DataFrame: Indexed by 'DATE'; the legacy data alone if ``uscrn_df`` is empty.
+    """
+    legacy_df = legacy_df.copy()
+    legacy_df[element] = legacy_df[element] / 10
+    if uscrn_df is None or uscrn_df.empty:
+        stitched_df = legacy_df
+    else:
+        uscrn_df = uscrn_df.copy()
+        uscrn_df[element] = uscrn_df[element] / 10
+        uscrn_start_date = uscrn_df["DATE"].min()
+        legacy_chopped = legacy_df[legacy_df["DATE"] < uscrn_start_date]
+        stitched_df = pd.concat([legacy_chopped, uscrn_df], ignore_index=True)
+        stitched_df = stitched_df.drop_duplicates(subset="DATE", keep="last")
+    return stitched_df.set_index("DATE")
+
+
+def monthly_means(daily):
+    """
+    Month-end indexed means of a daily Series (``resample("M").mean()`` on any pandas version).
+
+    Like ``resample``, months without data inside the range are kept as NaN.
+    """
+    monthly = daily.groupby(daily.index.to_period("M")).mean()
+    if len(monthly):
+        monthly = monthly.reindex(pd.period_range(monthly.index.min(), monthly.index.max(), freq="M",
+                                                 name=monthly.index.name))
+    monthly.index = monthly.index.to_timestamp(how="end").normalize()
+    return monthly
+
+
+@traced("pairs", rows=lambda result: len(result["pair_info"]))
+def process_pairs(station_pairs=STATION_PAIRS, element=ELEMENT, cache_dir=DEFAULT_CACHE_DIR,
+                  baseline_start=BASELINE_START, baseline_end=BASELINE_END,
+                  min_baseline_years=MIN_BASELINE_YEARS, offline=False):
+    """
+    Stitch every pair and compute its monthly anomalies for the strict and inclusive approaches.
+
+    Strict pairs need ``min_baseline_years`` years in [baseline_start, baseline_end];
+    inclusive pairs fall back to `calculate_alternative_baseline`.
+
+    Parameters:
+    station_pairs (list): ``station_pairs`` dicts (see `STATION_PAIRS`, `to_station_pairs`).
+    element (str): TMAX, TMIN or TAVG.
+    cache_dir (str): GHCN-Daily cache directory. Defaults to 'station_data'.
+    offline (bool): Only use cached station files; stations that are missing are skipped.
+
+    Returns:
+    dict: 'inclusive' and 'strict' lists of pair dicts (pair_name, anomalies, baseline_temp,
+    baseline_period, data_start, data_end), 'dropped' messages and per-pair 'pair_info'
+    for the map.
+    """
+    inclusive_pairs = []
+    strict_pairs = []
+    dropped_pairs = []
+    all_pair_info = []
+
+    for pair in station_pairs:
+        print(f"\n--- Processing Pair: {pair['legacy_name']} / {pair['uscrn_name']} ---")
+
+        legacy_df = get_station_data(pair["legacy_id"], element, cache_dir, offline)
+        uscrn_df = get_station_data(pair["uscrn_id"], element, cache_dir, offline)
+
+        if legacy_df is None or legacy_df.empty:
+            print(f"No valid legacy data for {pair['legacy_id']}. Skipping.")
+            dropped_pairs.append(f"{pair['legacy_name']} / {pair['uscrn_name']} - No legacy data")
+            continue
+        if uscrn_df is None or uscrn_df.empty:
+            print(f"No valid USCRN data for {pair['uscrn_id']}. Using legacy data only.")
+
+        stitched_df = stitch_station_data(legacy_df, uscrn_df, element)
+        with stage("resample", rows=len(stitched_df)):
+            monthly_mean = monthly_means(stitched_df[element])
+
+        pair_info = {
+            'name': f"{pair['legacy_name']} / {pair['uscrn_name']}",
+            'lat': pair['lat'],
+            'lon': pair['lon'],
+            'state': pair['state'],
+            'data_start': stitched_df.index.min().year,
+            'data_end': stitched_df.index.max().year,
+            'strict_qualified': False,
+            'inclusive_qualified': False
+        }
+
+        baseline_period = stitched_df.loc[str(baseline_start):str(baseline_end)]
+        baseline_years = baseline_period.index.year.nunique() if not baseline_period.empty else 0
+        has_baseline = not baseline_period.empty and baseline_years >= min_baseline_years
+
+        if has_baseline:
+            pair_baseline_avg = baseline_period[element].mean()
+            baseline_period_used = f"{baseline_start}-{baseline_end}"
+            strict_pairs.append({
+                'pair_name': pair_info['name'],
+                'anomalies': monthly_mean - pair_baseline_avg,
+                'baseline_temp': pair_baseline_avg,
+                'baseline_period': baseline_period_used,
+                'baseline_years': baseline_years,
+                'data_start': stitched_df.index.min(),
+                'data_end': stitched_df.index.max()
+            })
+            pair_info['strict_qualified'] = True
+            pair_info['strict_baseline'] = f"{baseline_period_used} ({baseline_years}yr)"
+            print(f"✅ STRICT: Using {baseline_period_used} baseline ({baseline_years} years)")
+
+            inclusive_baseline_avg = pair_baseline_avg
+            inclusive_baseline_period = baseline_period_used
+        else:
+            dropped_pairs.append(f"{pair_info['name']} - Only {baseline_years} baseline years")
+            print(f"❌ STRICT: Only {baseline_years} years in baseline period")
+            inclusive_baseline_avg, inclusive_baseline_period = calculate_alternative_baseline(stitched_df, element)
+
+        if inclusive_baseline_avg is not None:
+            inclusive_pairs.append({
+                'pair_name': pair_info['name'],
+                'anomalies': monthly_mean - inclusive_baseline_avg,
+                'baseline_temp': inclusive_baseline_avg,
+                'baseline_period': inclusive_baseline_period,
+                'data_start': stitched_df.index.min(),
+                'data_end': stitched_df.index.max()
+            })
+            pair_info['inclusive_qualified'] = True
+            pair_info['inclusive_baseline'] = inclusive_baseline_period
+            print(f"✅ INCLUSIVE: Using {inclusive_baseline_period} baseline")
+        else:
+            print("❌ INCLUSIVE: Cannot establish any baseline")
+
+        all_pair_info.append(pair_info)
+
+    return {'inclusive': inclusive_pairs, 'strict': strict_pairs, 'dropped': dropped_pairs,
+            'pair_info': all_pair_info}
+
+
+def create_ensemble(pair_list, approach_name):
+    """Monthly and annual ensemble of the pair anomalies, or (None, None) without pairs."""
+    if not pair_list:
+        print(f"\nNo valid pairs for {approach_name} approach.")
+        return None, None
+
+    print(f"\nCreating {approach_name} ensemble from {len(pair_list)} station pairs...")
+
+    # Align all pairs on one month axis and average them in a single vectorized pass
+    earliest_start = min(pair_data['data_start'] for pair_data in pair_list)
+    latest_end = max(pair_data['data_end'] for pair_data in pair_list)
+    return ensemble_from_series([pair_data['anomalies'] for pair_data in pair_list], earliest_start, latest_end)
+
+
+def comparison_panels(results, ensembles, window=10):
+    """
+    Everything the comparison figure of huscrn-sep2025.py draws, computed up front.
+
+    The ``window``-year rolling means of the annual ensembles, the LOESS of the strict
+    monthly ensemble (one `lowess_batch` call, with the script's adaptive ``frac`` of
+    about ten years of months), the stats boxes and the footnote listing the
+    qualifying pairs.
+
+    Parameters:
+    results (dict): Output of `process_pairs`.
+    ensembles (dict): 'inclusive'/'strict' -> (monthly, annual) of `create_ensemble`.
+
+    Returns:
+    dict: Keyword arguments of `ghcn_tools.render.ensemble_panels`.
+    """
+    subtitles = {'inclusive': "Mixed baselines: 1960-1980 + alternatives",
+                 'strict': "Uniform 1960-1980 baseline only"}
+    annual, annual_mean, stats = {}, {}, {}
+    for name in ('inclusive', 'strict'):
+        series = ensembles[name][1]
+        title = f"{name.upper()} Approach: {len(results[name])} Station Pairs (Annual)\n{subtitles[name]}"
+        annual[title] = series
+        if series is not None:
+            annual_mean[title] = series.rolling(window=window, center=True, min_periods=window // 2).mean()
+            stats[title] = f"Recent {window}yr: {series.tail(window).mean():+.2f}°C"
+
+    monthly, smooth = ensembles['strict'][0], None
+    monthly_title = (f"STRICT Approach: Monthly Anomalies with LOESS Smoothing\n"
+                     f"{len(results['strict'])} Station Pairs, Uniform 1960-1980 baseline")
+    if monthly is not None:
+        monthly = monthly.dropna()
+        if len(monthly):
+            frac = min(0.1, max(0.02, 12 * window / len(monthly)))
+            smooth = pd.Series(lowess_batch(monthly.to_numpy(), np.arange(len(monthly)), frac=frac, it=3),
+                               index=monthly.index)
+            stats[monthly_title] = (f"Recent {window}yr monthly avg: {monthly.tail(12 * window).mean():+.2f}°C\n"
+                                    f"LOESS fraction: {frac:.3f}")
+
+    strict = [info['state'] for info in results['pair_info'] if info['strict_qualified']]
+    inclusive = [info['state'] for info in results['pair_info'] if info['inclusive_qualified']]
+    footnote = "\n".join([
+        f"Strict Approach ({len(strict)} pairs): {', '.join(strict)}",
+        f"Inclusive Approach ({len(inclusive)} pairs): {', '.join(inclusive)}",
+        "LOESS: Locally Weighted Scatterplot Smoothing - adaptive bandwidth for optimal trend detection",
+        "Data: NOAA GHCN-Daily & USCRN | Map: station_pairs_map.html",
+    ])
+    return dict(annual=annual, annual_mean=annual_mean, annual_mean_label=f"{window}-Year Average",
+                monthly=monthly, monthly_loess=smooth, monthly_title=monthly_title, stats=stats,
+                title="US Temperature Anomaly Ensemble Analysis\nInclusive vs. Strict Approaches + Monthly LOESS",
+                footnote=footnote)
+
+
+def anomaly_frame(results):
+    """Long frame (approach, pair_name, baseline_period, date, anomaly) of `process_pairs` output."""
+    frames = []
+    for approach in ('inclusive', 'strict'):
+        for pair in results[approach]:
+            series = pair['anomalies'].dropna()
+            frames.append(pd.DataFrame({
+                'approach': approach,
+                'pair_name': pair['pair_name'],
+                'baseline_period': pair['baseline_period'],
+                'date': series.index,
+                'anomaly': series.to_numpy(),
+            }))
+    columns = ['approach', 'pair_name', 'baseline_period', 'date', 'anomaly']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+@traced("station map")
+def create_station_map(all_pair_info):
+    """Folium map of the pairs, colored by strict/inclusive qualification."""
+    import folium
+
+    # Center map on continental US
+    m = folium.Map(location=[39.8283, -98.5795], zoom_start=4,
+                   tiles='OpenStreetMap')
+
+    title_html = '''
+                 <h3 align="center" style="font-size:20px"><b>US Temperature Station Pairs</b></h3>
+                 <p align="center" style="font-size:14px">
+                 🟢 Strict Baseline (1960-1980) | 🔵 Inclusive Baseline | 🔴 Insufficient Data
+                 </p>
+                 '''
+    m.get_root().html.add_child(folium.Element(title_html))
+
+    for pair_info in all_pair_info:
+        header = f"""
+            <b>{pair_info['name']}</b><br>
+            State: {pair_info['state']}<br>
+            Data: {pair_info['data_start']}-{pair_info['data_end']}<br>"""
+        if pair_info['strict_qualified']:
+            color = 'green'
+            icon = 'star'
+            popup_text = header + f"""
+            <b>✅ STRICT:</b> {pair_info['strict_baseline']}<br>
+            <b>✅ INCLUSIVE:</b> {pair_info['inclusive_baseline']}
+            """
+        elif pair_info['inclusive_qualified']:
+            color = 'blue'
+            icon = 'info-sign'
+            popup_text = header + f"""
+            <b>❌ STRICT:</b> Insufficient baseline data<br>
+            <b>✅ INCLUSIVE:</b> {pair_info['inclusive_baseline']}
+            """
+        else:
+            color = 'red'
+            icon = 'remove'
+            popup_text = header + """
+            <b>❌ STRICT:</b> Insufficient baseline data<br>
+            <b>❌ INCLUSIVE:</b> Cannot establish baseline
+            """
+
+        folium.Marker(
+            location=[pair_info['lat'], pair_info['lon']],
+            popup=folium.Popup(popup_text, max_width=300),
+            tooltip=pair_info['name'].replace('_', ' ').title(),
+            icon=folium.Icon(color=color, icon=icon)
+        ).add_to(m)
+
+    legend_html = '''
+    <div style="position: fixed;
+                bottom: 50px; left: 50px; width: 200px; height: 90px;
+                background-color: white; border:2px solid grey; z-index:9999;
+                font-size:14px; padding: 10px">
+    <p><b>Station Qualification</b></p>
+    <p><i class="fa fa-star" style="color:green"></i> Strict (1960-1980)</p>
+    <p><i class="fa fa-info" style="color:blue"></i> Inclusive (Alt. baseline)</p>
+    <p><i class="fa fa-remove" style="color:red"></i> Insufficient data</p>
+    </div>
+    '''
+    m.get_root().html.add_child(folium.Element(legend_html))
+
+    return m
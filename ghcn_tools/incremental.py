@@ -0,0 +1,288 @@
+"""
+Incremental update of a `MonthlyStore` from a new GHCN-M v4 release.
+
+NOAA publishes a new dated release (``ghcnm.tavg.v4.0.1.YYYYMMDD``) almost
+daily, and only a small fraction of the station-years change between two of
+them. `update_store` decodes the new ``.dat`` file (one vectorized pass),
+compares it with the store at station-year granularity and writes only the
+added, changed and removed records into the memory-mapped arrays. The
+comparison reads the stored value and flags of every station-year the release
+contains (a gather of those rows, no decode of the old release); which
+station-years existed before comes from the coverage index. The changes come
+back as a report frame, which `refresh_anomalies` and `refresh_ensemble` use to
+recompute only the affected baselines, anomaly rows and ensemble months.
+
+A release that extends the year range (the new calendar year every January)
+grows the year axis of the arrays once and is then applied like any other;
+`pad_years` grows anomaly and ensemble state to match. Releases that add
+stations would shift the sorted station rows and fall back to a full
+re-ingest; the report says so.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.anomaly import anomalies, ensemble_mean, monthly_climatology
+from ghcn_tools.coverage import COVERAGE_FILE, CoverageIndex, ensure_coverage
+from ghcn_tools.decode import MISSING, decode_records
+from ghcn_tools.store import FLAG_NAMES, MonthlyStore, file_fingerprint, ingest_qcu
+
+CHANGE_KINDS = ('added', 'changed', 'removed')
+
+
+def diff_release(store, records, coverage=None):
+    """
+    Compare decoded records of a new release with a store, station-year by station-year.
+
+    Parameters:
+    store (MonthlyStore): The previously ingested release.
+    records (dict): Output of `decode_records` for the new release.
+    coverage (CoverageIndex, optional): Coverage index of ``store``; built if omitted.
+
+    Returns:
+    (pd.DataFrame, np.ndarray): Change report (station_id, year, change, months_changed,
+    row, year_index, record) for records inside the store's shape, and a boolean mask of the
+    records that fall outside it (new stations or years).
+    """
+    coverage = coverage or ensure_coverage(store)
+    n_years = len(store.years)
+    sids = records['station_id']
+    record = np.arange(len(sids))
+    row = np.clip(np.searchsorted(store.station_ids, sids), 0, len(store) - 1)
+    yi = records['year'].astype(np.int64) - store.first_year
+    inside = (store.station_ids[row] == sids) & (yi >= 0) & (yi < n_years)
+    row, yi, record = row[inside], yi[inside], record[inside]
+
+    existing = coverage.months_per_year() > 0
+    old_value = store.value[row, yi]
+    new_value = records['value'][inside]
+    differs = old_value != new_value
+    for name in FLAG_NAMES:
+        differs |= getattr(store, name)[row, yi] != records[name][inside]
+    months_changed = differs.sum(axis=1)
+    was_there = existing[row, yi]
+
+    seen = np.zeros(existing.size, dtype=bool)
+    seen[row * n_years + yi] = True
+    removed = np.flatnonzero(existing.ravel() & ~seen)
+    kind = np.where(~was_there, 'added', 'changed')
+    keep = ~was_there | (months_changed > 0)
+    report = pd.DataFrame({
+        'row': np.concatenate([row[keep], removed // n_years]),
+        'year_index': np.concatenate([yi[keep], removed % n_years]),
+        'change': np.concatenate([kind[keep], np.full(len(removed), 'removed')]),
+        'months_changed': np.concatenate([months_changed[keep],
+                                          coverage.months_per_year()[removed // n_years, removed % n_years]]),
+        'record': np.concatenate([record[keep], np.full(len(removed), -1)]),
+    })
+    report.insert(0, 'station_id', store.station_ids[report['row']].astype(str))
+    report.insert(1, 'year', report['year_index'] + store.first_year)
+    report = report.sort_values(['station_id', 'year'], kind='stable').reset_index(drop=True)
+    return report, ~inside
+
+
+def update_store(store_dir, source, element=None, report_dir=None):
+    """
+    Bring an existing store up to date with a new release, touching only what changed.
+
+    Parameters:
+    store_dir (str): Directory of the store written by `ingest_qcu`.
+    source (str): Path to the new release's ``.qcu.dat`` file.
+    element (str, optional): Element to ingest. Defaults to the store's element.
+    report_dir (str, optional): Write the change report as ``<release>.changes.csv`` here.
+
+    Returns:
+    (MonthlyStore, pd.DataFrame): The updated store and the change report
+    (station_id, year, change, months_changed, row, year_index, record). The report's
+    ``attrs['rebuilt']`` is True when the store had to be re-ingested in full, and
+    ``attrs['years_added']`` holds the number of years added before and after the
+    old year range (see `pad_years`).
+    """
+    store = MonthlyStore(store_dir)
+    element = element or store.element
+    records = decode_records(source, element)
+    coverage = ensure_coverage(store)
+    report, outside = diff_release(store, records, coverage)
+    years_added = (0, 0)
+
+    known = np.isin(records['station_id'][outside], store.station_ids)
+    if outside.any() and known.all():
+        years = records['year'][outside]
+        years_added = (max(store.first_year - int(years.min()), 0), max(int(years.max()) - store.last_year, 0))
+        store = _grow_years(store, *years_added)
+        coverage = CoverageIndex.load(os.path.join(store_dir, COVERAGE_FILE))
+        report, outside = diff_release(store, records, coverage)
+
+    if outside.any():
+        print(f"{int(outside.sum())} records of new stations, re-ingesting {source} in full")
+        new_sids = np.unique(records['station_id'][outside]).astype(str)
+        store = ingest_qcu(source, store_dir, element)
+        ensure_coverage(store)
+        added = pd.DataFrame({'station_id': records['station_id'][outside].astype(str),
+                              'year': records['year'][outside].astype(int), 'change': 'added',
+                              'months_changed': (records['value'][outside] != MISSING).sum(axis=1)})
+        report = pd.concat([report.drop(columns=['row', 'year_index', 'record']), added], ignore_index=True)
+        report.attrs['new_stations'] = list(new_sids)
+        report.attrs['rebuilt'] = True
+    else:
+        _apply(store, records, report, source)
+        report.attrs['rebuilt'] = False
+        report.attrs['years_added'] = years_added
+
+    summary = report['change'].value_counts().reindex(CHANGE_KINDS, fill_value=0)
+    print(f"Release {os.path.basename(source)}: " + ', '.join(f"{n} {k}" for k, n in summary.items())
+          + f" station-years ({report['station_id'].nunique()} stations)")
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+        report.to_csv(os.path.join(report_dir, f"{os.path.basename(source)}.changes.csv"), index=False)
+    return MonthlyStore(store_dir), report
+
+
+def _grow_years(store, before, after):
+    """Extend the year axis of the store arrays and coverage index by ``before``/``after`` empty years."""
+    store_dir = store.store_dir
+    n_stations, n_years = len(store), len(store.years)
+    shape = (n_stations, before + n_years + after, 12)
+    coverage = ensure_coverage(store)
+    print(f"Extending {store_dir} to {store.first_year - before}-{store.last_year + after}")
+    for name, blank in (('value', MISSING),) + tuple((n, ord(' ')) for n in FLAG_NAMES):
+        path = os.path.join(store_dir, f'{name}.npy')
+        old = np.load(path, mmap_mode='r')
+        new = np.lib.format.open_memmap(f'{path}.part', mode='w+', dtype=old.dtype, shape=shape)
+        new[:, :before] = blank
+        new[:, before + n_years:] = blank
+        new[:, before:before + n_years] = old
+        new.flush()
+        del new, old
+        os.replace(f'{path}.part', path)
+
+    presence = np.zeros(shape, dtype=bool)
+    presence[:, before:before + n_years] = coverage.presence()
+    meta = dict(store.meta)
+    meta['first_year'] = store.first_year - before
+    meta['last_year'] = store.last_year + after
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    CoverageIndex.from_mask(store.station_ids, np.arange(meta['first_year'], meta['last_year'] + 1),
+                            presence).save(os.path.join(store_dir, COVERAGE_FILE))
+    return MonthlyStore(store_dir)
+
+
+def pad_years(state, report, axis=1, fill=np.nan):
+    """
+    Grow anomaly or ensemble state to the year axis that `update_store` extended.
+
+    Parameters:
+    state (np.ndarray): `full_anomalies` output (years on axis 1) or `ensemble_mean`
+        output (years on axis 0).
+    report (pd.DataFrame): Change report of `update_store`.
+    axis (int): Year axis of ``state``.
+    fill: Value of the added years (NaN for anomalies and means, 0 for counts).
+
+    Returns:
+    np.ndarray: ``state`` itself when no years were added, else a padded copy.
+    """
+    before, after = report.attrs.get('years_added', (0, 0))
+    if not before and not after:
+        return state
+    pad = [(0, 0)] * state.ndim
+    pad[axis] = (before, after)
+    return np.pad(state, pad, constant_values=fill)
+
+
+def _apply(store, records, report, source):
+    """Write the reported station-years into the store arrays in place."""
+    store_dir = store.store_dir
+    if report.empty:
+        _write_meta(store, report, source)
+        return
+    n_years = len(store.years)
+    upd = report[report['change'] != 'removed']
+    src = upd['record'].to_numpy()
+    rem = report[report['change'] == 'removed']
+
+    for name, blank in (('value', MISSING),) + tuple((n, ord(' ')) for n in FLAG_NAMES):
+        arr = np.load(os.path.join(store_dir, f'{name}.npy'), mmap_mode='r+')
+        arr[upd['row'].to_numpy(), upd['year_index'].to_numpy()] = records[name][src]
+        arr[rem['row'].to_numpy(), rem['year_index'].to_numpy()] = blank
+        arr.flush()
+        del arr
+
+    rows = np.unique(report['row'].to_numpy())
+    coverage_path = os.path.join(store_dir, COVERAGE_FILE)
+    coverage = CoverageIndex.load(coverage_path)
+    value = np.load(os.path.join(store_dir, 'value.npy'), mmap_mode='r')
+    coverage.bits[rows] = np.packbits((value[rows] != MISSING).reshape(len(rows), n_years * 12), axis=1)
+    _write_meta(store, report, source)
+    coverage.save(coverage_path)
+
+
+def _write_meta(store, report, source):
+    meta = dict(store.meta)
+    counts = report['change'].value_counts()
+    meta['n_records'] = int(meta['n_records'] + counts.get('added', 0) - counts.get('removed', 0))
+    meta['source'] = file_fingerprint(source)
+    with open(os.path.join(store.store_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def full_anomalies(store, baseline_start, baseline_end, min_baseline_years=1):
+    """
+    Anomalies of every station of a store in store order (stations without a baseline stay NaN).
+
+    Returns:
+    (np.ndarray, np.ndarray): (stations, years, 12) anomalies in °C and the (stations, 12)
+    climatology, the state that `refresh_anomalies` updates.
+    """
+    data = store.select().celsius()
+    clim = monthly_climatology(data, store.years, baseline_start, baseline_end, min_baseline_years)
+    return anomalies(data, clim), clim
+
+
+def refresh_anomalies(store, anoms, clim, report, baseline_start, baseline_end, min_baseline_years=1):
+    """
+    Update `full_anomalies` output in place for the station-years of a change report.
+
+    Stations with a change inside the baseline window get a new climatology and a
+    full anomaly row; all other changes only recompute the changed years.
+
+    Returns:
+    (np.ndarray, np.ndarray): Rows whose baseline was recomputed, and the year indices
+    whose anomalies changed (the ensemble months to refresh).
+    """
+    if report.attrs.get('rebuilt'):
+        raise ValueError("The store was re-ingested with a new shape; rebuild with full_anomalies")
+    if anoms.shape[1] != len(store.years):
+        raise ValueError(f"Anomalies cover {anoms.shape[1]} years, the store {len(store.years)}; "
+                         f"grow them with pad_years first")
+    if report.empty:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    years = store.years
+    in_baseline = report['year'].between(baseline_start, baseline_end)
+    rebaseline = np.unique(report.loc[in_baseline, 'row'].to_numpy())
+    if len(rebaseline):
+        data = np.asarray(store.value[rebaseline], dtype=np.float32) / 100
+        data[np.asarray(store.value[rebaseline]) == MISSING] = np.nan
+        clim[rebaseline] = monthly_climatology(data, years, baseline_start, baseline_end, min_baseline_years)
+        anoms[rebaseline] = anomalies(data, clim[rebaseline])
+
+    rest = report[~report['row'].isin(rebaseline)]
+    r, y = rest['row'].to_numpy(), rest['year_index'].to_numpy()
+    raw = np.asarray(store.value[r, y], dtype=np.float32) / 100
+    raw[np.asarray(store.value[r, y]) == MISSING] = np.nan
+    anoms[r, y] = raw - clim[r]
+
+    changed_years = np.unique(y)
+    if len(rebaseline):
+        changed_years = np.union1d(changed_years, np.arange(len(years)))
+    return rebaseline, changed_years
+
+
+def refresh_ensemble(anoms, mean, count, year_index, weights=None, min_stations=1):
+    """Recompute an `ensemble_mean` result (years, 12) in place for the given year indices only."""
+    year_index = np.asarray(year_index, dtype=int)
+    if len(year_index):
+        mean[year_index], count[year_index] = ensemble_mean(anoms[:, year_index], weights, min_stations)
+    return mean, count
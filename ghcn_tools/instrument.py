@@ -0,0 +1,249 @@
+"""
+Stage-level timing and memory instrumentation.
+
+Pipeline stages are wrapped in ``with stage("parse", rows=n):`` blocks or
+decorated with ``@traced("parse")``. While no tracer is enabled, `stage`
+returns a shared no-op context and `traced` wrappers do a single global check,
+so the instrumentation stays in the code at practically no cost. After
+`enable()` every stage records wall time, CPU time (process-wide, all
+threads), RSS at start and end, peak RSS (sampled by a background thread
+while any stage is open) and the rows/bytes it processed; nested stages keep
+their parent. `Tracer.save` writes the JSON trace and `Tracer.summary` the
+table per stage name.
+
+Set ``GHCN_TRACE=trace.json`` to enable tracing in scripts that call
+`enable_from_env` and `finish`.
+"""
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+
+_ACTIVE = None
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes():
+    """Current resident set size of this process in bytes (peak RSS where /proc is missing, else NaN)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, AttributeError):
+        return float('nan')
+
+
+class _NullStage:
+    """Returned by `stage` while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, rows=0, nbytes=0):
+        pass
+
+
+_NULL = _NullStage()
+
+
+class Stage:
+    """One timed stage; ``add`` counts the rows/bytes it processed."""
+
+    def __init__(self, tracer, name, rows=None, nbytes=None, attrs=None):
+        self.tracer = tracer
+        self.name = name
+        self.rows = rows
+        self.nbytes = nbytes
+        self.attrs = attrs or {}
+        self.parent = None
+        self.depth = 0
+
+    def add(self, rows=0, nbytes=0):
+        self.rows = (self.rows or 0) + rows
+        self.nbytes = (self.nbytes or 0) + nbytes
+
+    def __enter__(self):
+        tracer = self.tracer
+        if tracer.stack:
+            self.parent = tracer.stack[-1].name
+            self.depth = len(tracer.stack)
+        self.rss_start = rss_bytes()
+        self.peak = self.rss_start
+        tracer.stack.append(self)
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        tracer = self.tracer
+        tracer.stack.remove(self)
+        rss_end = rss_bytes()
+        self.peak = max(self.peak, rss_end)
+        tracer.records.append({
+            'stage': self.name,
+            'parent': self.parent,
+            'depth': self.depth,
+            'start_s': self.start - tracer.t0,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'rss_start_mb': self.rss_start / 1e6,
+            'rss_end_mb': rss_end / 1e6,
+            'peak_rss_mb': self.peak / 1e6,
+            'rows': self.rows,
+            'bytes': self.nbytes,
+            'error': None if exc_type is None else exc_type.__name__,
+            **self.attrs,
+        })
+        return False
+
+
+class Tracer:
+    """Collects the `Stage` records of one run."""
+
+    def __init__(self, sample_interval=0.02):
+        self.records = []
+        self.stack = []
+        self.t0 = time.perf_counter()
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.sample_interval = sample_interval
+        self._stop = threading.Event()
+        self._sampler = None
+        if sample_interval:
+            self._sampler = threading.Thread(target=self._sample, name='ghcn-trace-rss', daemon=True)
+            self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            stack = list(self.stack)
+            if stack:
+                rss = rss_bytes()
+                for s in stack:
+                    if rss > s.peak:
+                        s.peak = rss
+
+    def close(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def stage(self, name, rows=None, nbytes=None, **attrs):
+        return Stage(self, name, rows, nbytes, attrs)
+
+    def to_dict(self):
+        return {'started': self.started, 'pid': os.getpid(), 'stages': self.records}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+    def totals(self):
+        """Per stage name (in first-seen order): calls, wall, CPU, peak RSS, rows, bytes."""
+        out = {}
+        for r in sorted(self.records, key=lambda r: r['start_s']):
+            t = out.setdefault(r['stage'], {'stage': r['stage'], 'depth': r['depth'], 'calls': 0, 'wall_s': 0.0,
+                                            'cpu_s': 0.0, 'peak_rss_mb': 0.0, 'rows': None, 'bytes': None})
+            t['calls'] += 1
+            t['wall_s'] += r['wall_s']
+            t['cpu_s'] += r['cpu_s']
+            t['peak_rss_mb'] = max(t['peak_rss_mb'], r['peak_rss_mb'])
+            for key in ('rows', 'bytes'):
+                if r[key] is not None:
+                    t[key] = (t[key] or 0) + r[key]
+        return list(out.values())
+
+    def summary(self):
+        """Summary table as text; nested stages are indented under their parent."""
+        lines = [f"{'stage':<32} {'calls':>5} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'rows':>12} {'MB':>9}"]
+        for t in self.totals():
+            name = '  ' * t['depth'] + t['stage']
+            rows = '' if t['rows'] is None else f"{t['rows']:,}"
+            mb = '' if t['bytes'] is None else f"{t['bytes'] / 1e6:.1f}"
+            lines.append(f"{name[:32]:<32} {t['calls']:>5} {t['wall_s']:>9.3f} {t['cpu_s']:>9.3f} "
+                         f"{t['peak_rss_mb']:>9.1f} {rows:>12} {mb:>9}")
+        return '\n'.join(lines)
+
+
+def enable(sample_interval=0.02):
+    """Start tracing (replacing an active tracer) and return the new `Tracer`."""
+    global _ACTIVE
+    if _ACTIVE is not None:
+        _ACTIVE.close()
+    _ACTIVE = Tracer(sample_interval)
+    return _ACTIVE
+
+
+def disable():
+    """Stop tracing and return the tracer that was active (or None)."""
+    global _ACTIVE
+    tracer, _ACTIVE = _ACTIVE, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def active():
+    return _ACTIVE
+
+
+def stage(name, rows=None, nbytes=None, **attrs):
+    """Context manager timing one stage; a shared no-op while tracing is disabled."""
+    if _ACTIVE is None:
+        return _NULL
+    return _ACTIVE.stage(name, rows, nbytes, **attrs)
+
+
+def traced(name=None, rows=None, nbytes=None):
+    """
+    Decorator running a function as a stage.
+
+    Parameters:
+    name (str, optional): Stage name; defaults to the function name.
+    rows, nbytes (callable, optional): Computed from the return value, e.g. ``rows=len``.
+    """
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _ACTIVE is None:
+                return func(*args, **kwargs)
+            with _ACTIVE.stage(label) as s:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    s.rows = rows(result)
+                if nbytes is not None:
+                    s.nbytes = nbytes(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def enable_from_env(var='GHCN_TRACE'):
+    """Enable tracing if the environment variable ``var`` names a trace file."""
+    return enable() if os.environ.get(var) else None
+
+
+def finish(var='GHCN_TRACE', path=None):
+    """Disable tracing, print the summary and write the trace to ``path`` (default: ``$GHCN_TRACE``)."""
+    tracer = disable()
+    if tracer is None:
+        return None
+    print(tracer.summary())
+    path = path or os.environ.get(var)
+    if path:
+        tracer.save(path)
+        print(f"Trace written to {path}")
+    return tracer
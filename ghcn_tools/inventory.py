@@ -0,0 +1,61 @@
+"""
+Station inventories: GHCN-M ``.inv`` files and the GHCN-Daily station lists.
+"""
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.decode import MISSING
+
+
+# Function to read station inventory
+def read_station_inventory(station_file_path):
+    colspecs = [
+        (0, 11),    # Station ID
+        (12, 20),   # Latitude
+        (21, 30),   # Longitude
+        (31, 37),   # Elevation
+        (38, None)  # Station Name
+    ]
+    columns = ['station_id', 'latitude', 'longitude', 'elevation', 'name']
+    stations = pd.read_fwf(station_file_path, colspecs=colspecs, header=None, names=columns)
+    stations['station_id'] = stations['station_id'].str.strip()
+    stations['name'] = stations['name'].str.strip()
+    stations['latitude'] = pd.to_numeric(stations['latitude'], errors='coerce')
+    stations['longitude'] = pd.to_numeric(stations['longitude'], errors='coerce')
+    stations['elevation'] = pd.to_numeric(stations['elevation'], errors='coerce')
+    stations['country_code'] = stations['station_id'].str[:2]
+    return stations
+
+
+def read_ghcnd_inventory(inventory_path, element='TMAX'):
+    """
+    Read ``ghcnd-inventory.txt`` (ID, LAT, LON, ELEMENT, FIRSTYEAR, LASTYEAR) for one element.
+
+    Returns:
+    pd.DataFrame: station_id, first_year, last_year.
+    """
+    colspecs = [(0, 11), (31, 35), (36, 40), (41, 45)]
+    inv = pd.read_fwf(inventory_path, colspecs=colspecs, header=None,
+                      names=['station_id', 'element', 'first_year', 'last_year'])
+    inv = inv[inv['element'] == element]
+    return inv[['station_id', 'first_year', 'last_year']].reset_index(drop=True)
+
+
+def record_periods(store):
+    """
+    First and last year with any data for every station of a `MonthlyStore`.
+
+    Returns:
+    pd.DataFrame: station_id, first_year, last_year, n_years (years with any month).
+    """
+    has_year = np.any(np.asarray(store.value) != MISSING, axis=2)
+    years = store.years
+    n_years = has_year.sum(axis=1)
+    first = np.where(n_years > 0, years[np.argmax(has_year, axis=1)], -1)
+    last = np.where(n_years > 0, years[len(years) - 1 - np.argmax(has_year[:, ::-1], axis=1)], -1)
+    return pd.DataFrame({
+        'station_id': store.station_ids.astype(str),
+        'first_year': first,
+        'last_year': last,
+        'n_years': n_years,
+    })
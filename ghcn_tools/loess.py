@@ -0,0 +1,199 @@
+"""
+Batched LOESS for many series on a shared x-grid, with result memoization.
+
+The notebooks call ``statsmodels`` `lowess` once per series (per region, per
+urbanization bin, per frac), and a sweep re-smooths the same data many times.
+`lowess_batch` smooths a (series, points) block in one pass: the k-nearest
+neighbourhoods and tricube weights depend only on x, so they are built once
+and every local regression of every series becomes a weighted sum over a
+(series, points, k) window array. The algorithm is the one of
+``statsmodels.nonparametric.lowess`` with ``delta=0`` (same neighbourhood
+rule, tricube/bisquare weights and robustifying iterations), so results agree
+with it to floating-point precision.
+
+Results are memoized by (hash of x and y, frac, it) in an in-memory LRU and,
+optionally, as ``.npy`` files in a cache directory.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ghcn_tools.instrument import traced
+
+_MEMO = OrderedDict()
+MEMO_SIZE = 256
+WINDOW_ELEMENTS = 1 << 22  # max. series * points * k values materialized per chunk
+
+
+def _neighbourhoods(x, k):
+    """Left index of the k-point neighbourhood of every x[i] (statsmodels' update_neighborhood)."""
+    n = len(x)
+    left = np.empty(n, dtype=np.intp)
+    lo = 0
+    for i in range(n):
+        while lo + k < n and x[i] > (x[lo] + x[lo + k]) / 2.0:
+            lo += 1
+        left[i] = lo
+    return left
+
+
+def _tricube_windows(x, frac):
+    n = len(x)
+    k = min(max(int(frac * n + 1e-10), 2), n)
+    left = _neighbourhoods(x, k)
+    idx = left[:, None] + np.arange(k)
+    xw = x[idx]
+    radius = np.maximum(x - x[left], x[left + k - 1] - x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dist = np.abs(xw - x[:, None]) / radius[:, None]
+    weights = (1.0 - dist ** 3) ** 3
+    return idx, xw, weights
+
+
+def _fit(y, x, idx, xw, base_weights, resid_weights):
+    """One local-linear pass for a (series, n) block; mirrors statsmodels' calculate_y_fit."""
+    # The gathered windows are made C-ordered: fancy indexing returns them with the
+    # series axis innermost, and the summation order over k (so the last bits of the
+    # fit) would then depend on how many series are fitted together.
+    w = base_weights[None, :, :] * np.ascontiguousarray(resid_weights[:, idx])
+    ok = np.count_nonzero(w > 1e-12, axis=2) >= 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = w / w.sum(axis=2, keepdims=True)
+    wx = np.einsum('snk,nk->sn', w, xw)
+    dev = xw[None, :, :] - wx[:, :, None]
+    sqdev = np.maximum(np.einsum('snk,snk->sn', w, dev * dev), 1e-12)
+    p = w * (1.0 + (x[None, :] - wx)[:, :, None] * dev / sqdev[:, :, None])
+    fit = np.einsum('snk,snk->sn', p, np.ascontiguousarray(y[:, idx]))
+    return np.where(ok, fit, y)
+
+
+def _residual_weights(y, fit):
+    resid = np.abs(y - fit)
+    median = np.median(resid, axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scaled = np.where(median == 0, (resid > 0).astype(float), resid / (6.0 * median))
+    scaled = np.minimum(scaled, 1.0)
+    return (1.0 - scaled ** 2) ** 2
+
+
+def _lowess_dense(y, x, frac, it):
+    """LOESS of a (series, n) block without missing values on a sorted x."""
+    idx, xw, base_weights = _tricube_windows(x, frac)
+    n, k = idx.shape
+    chunk = max(1, WINDOW_ELEMENTS // (n * k))
+    out = np.empty_like(y)
+    for start in range(0, len(y), chunk):
+        yc = y[start:start + chunk]
+        rw = np.ones_like(yc)
+        for _ in range(it + 1):
+            fit = _fit(yc, x, idx, xw, base_weights, rw)
+            rw = _residual_weights(yc, fit)
+        out[start:start + chunk] = fit
+    return out
+
+
+def _lowess_block(Y, x, frac, it):
+    """LOESS of every row of Y (NaN = missing); rows sharing a gap pattern are fitted together."""
+    out = np.full(Y.shape, np.nan)
+    valid = ~np.isnan(Y)
+    patterns, inverse = np.unique(valid, axis=0, return_inverse=True)
+    for p, pattern in enumerate(patterns):
+        rows = np.flatnonzero(inverse.ravel() == p)
+        if pattern.sum() < 2:
+            out[np.ix_(rows, pattern)] = Y[np.ix_(rows, pattern)]
+            continue
+        out[np.ix_(rows, pattern)] = _lowess_dense(Y[np.ix_(rows, pattern)], x[pattern], frac, it)
+    return out
+
+
+def _key(Y, x, frac, it):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(x, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(Y, dtype=np.float64).tobytes())
+    h.update(repr(Y.shape).encode())
+    return f"{h.hexdigest()}_f{frac!r}_it{it}"
+
+
+def clear_cache():
+    """Forget all in-memory LOESS results."""
+    _MEMO.clear()
+
+
+@traced('LOESS', rows=lambda smoothed: len(np.atleast_2d(smoothed)))
+def lowess_batch(Y, x, frac=2.0 / 3.0, it=3, workers=None, cache=True, cache_dir=None):
+    """
+    Smooth many series on a shared x-grid in one call.
+
+    Parameters:
+    Y (array-like): (series, points) values, or a single 1-D series; NaN marks missing points.
+    x (array-like): (points,) x-values shared by all series (need not be sorted).
+    frac (float): Fraction of the points used for each local regression, as in statsmodels.
+    it (int): Number of robustifying iterations, as in statsmodels.
+    workers (int, optional): Split the series over this many processes (useful for
+        thousands of long series); the default fits everything in this process.
+    cache (bool): Memoize results by (data hash, frac, it) in memory.
+    cache_dir (str, optional): Also persist memoized results as .npy files here.
+
+    Returns:
+    np.ndarray: Smoothed values with the shape of ``Y``, NaN where ``Y`` is NaN.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    single = Y.ndim == 1
+    Y = np.atleast_2d(Y)
+    if Y.shape[1] != len(x):
+        raise ValueError(f"Y has {Y.shape[1]} points per series but x has {len(x)}")
+    if not 0 <= frac <= 1:
+        raise ValueError("Lowess `frac` must be in the range [0,1]!")
+
+    key = _key(Y, x, frac, it) if (cache or cache_dir) else None
+    disk_path = os.path.join(cache_dir, f"{key}.npy") if cache_dir else None
+    if cache and key in _MEMO:
+        _MEMO.move_to_end(key)
+        out = _MEMO[key]
+    elif disk_path and os.path.exists(disk_path):
+        out = np.load(disk_path)
+    else:
+        order = np.argsort(x, kind='stable')
+        xs, Ys = x[order], Y[:, order]
+        if workers and workers > 1 and len(Ys) > 1:
+            parts = np.array_split(Ys, min(workers, len(Ys)))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                fitted = np.vstack(list(pool.map(_lowess_block, parts, [xs] * len(parts),
+                                                 [frac] * len(parts), [it] * len(parts))))
+        else:
+            fitted = _lowess_block(Ys, xs, frac, it)
+        out = np.empty_like(fitted)
+        out[:, order] = fitted
+    if disk_path and not os.path.exists(disk_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(disk_path, out)
+
+    if cache:
+        out.setflags(write=False)
+        _MEMO[key] = out
+        while len(_MEMO) > MEMO_SIZE:
+            _MEMO.popitem(last=False)
+    return out[0] if single else out
+
+
+def lowess(endog, exog, frac=2.0 / 3.0, it=3, return_sorted=True, **kwargs):
+    """
+    Drop-in for the ``statsmodels`` `lowess` calls in the notebooks (``delta=0``,
+    ``missing='drop'``), served through the memoized batch implementation.
+
+    Returns:
+    np.ndarray: (n, 2) array of sorted x and smoothed y for the non-missing points,
+    or the smoothed y in input order if ``return_sorted`` is False.
+    """
+    y = np.asarray(endog, dtype=np.float64)
+    x = np.asarray(exog, dtype=np.float64)
+    fitted = lowess_batch(y, x, frac, it, **kwargs)
+    if not return_sorted:
+        return fitted
+    keep = ~np.isnan(y) & np.isfinite(x)
+    order = np.argsort(x[keep], kind='stable')
+    return np.column_stack([x[keep][order], fitted[keep][order]])
@@ -0,0 +1,181 @@
+"""
+Compact station maps: one GeoJSON data layer with client-side clustering and styling.
+
+`create_station_map` in huscrn-sep2025.py and `plot_station_map_folium` in
+the notebooks add one ``folium.Marker``/``CircleMarker`` with its own popup
+HTML per station, so every station costs a few hundred bytes of generated
+JavaScript (the 1.3 MB GHCNv4_stations_BI_above6_BU_below1_BI2020_below1_map.html)
+and the browser builds thousands of layers up front. `export_station_map`
+instead embeds the stations once as a compact GeoJSON FeatureCollection
+(coordinates rounded, only the attributes that are shown, categories as small
+integer codes) and lets Leaflet create the circle markers, colors and popups
+in the browser from that data, inside a marker-cluster group.
+"""
+import html
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import Element, MacroElement, Template
+from folium.elements import JSCSSMixin
+from folium.plugins import MarkerCluster
+
+from ghcn_tools.instrument import traced
+
+DEFAULT_COLORS = ['#3b4cc0', '#6788ee', '#9abbff', '#c9d7f0', '#edd1c2',
+                  '#f7a889', '#e26952', '#b40426', '#7f0000', '#4d0000']
+
+
+def simplify_attributes(df, category=None, columns=(), lat='latitude', lon='longitude', decimals=4):
+    """
+    Pre-simplified attribute table for the map: rounded coordinates, the shown columns
+    only and ``category`` as integer codes.
+
+    Returns:
+    (pd.DataFrame, list): Table with lat, lon, cat and ``columns``, and the category labels
+    (index = code); stations without a category get the last code, labelled 'unknown'.
+    Without ``category`` every station gets code 0.
+    """
+    out = pd.DataFrame({'lat': df[lat].round(decimals).to_numpy(), 'lon': df[lon].round(decimals).to_numpy()})
+    if category is not None:
+        codes, labels = pd.factorize(df[category], sort=True, use_na_sentinel=False)
+        out['cat'] = codes
+        labels = ['unknown' if pd.isna(label) else str(label) for label in labels]
+    else:
+        out['cat'] = 0
+        labels = ['stations']
+    for col in columns:
+        values = df[col].to_numpy()
+        if np.issubdtype(values.dtype, np.floating):
+            values = np.round(values, 2)
+        out[col] = values
+    keep = out['lat'].notna() & out['lon'].notna()
+    return out[keep].reset_index(drop=True), labels
+
+
+def station_geojson(table, columns=()):
+    """FeatureCollection of a `simplify_attributes` table (properties: cat + ``columns``)."""
+    props = table[['cat', *columns]].astype(object).where(table[['cat', *columns]].notna(), None)
+    records = props.to_dict('records')
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lo, la]}, 'properties': p}
+            for la, lo, p in zip(table['lat'].tolist(), table['lon'].tolist(), records)
+        ],
+    }
+
+
+class StationLayer(JSCSSMixin, MacroElement):
+    """GeoJSON point layer styled by category, optionally clustered, with popups built in the browser."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data }};
+            var colors = {{ this.colors|tojson }};
+            var labels = {{ this.labels|tojson }};
+            var fields = {{ this.fields|tojson }};
+            var layer = L.geoJSON(data, {
+                pointToLayer: function(feature, latlng) {
+                    var c = colors[feature.properties.cat % colors.length];
+                    return L.circleMarker(latlng, {radius: {{ this.radius }}, color: c, fillColor: c,
+                                                   weight: 1, fillOpacity: 0.8});
+                },
+                onEachFeature: function(feature, marker) {
+                    marker.bindPopup(function() {
+                        var p = feature.properties;
+                        var popup = document.createElement('div');
+                        var header = document.createElement('b');
+                        header.textContent = labels[p.cat];
+                        popup.appendChild(header);
+                        for (var i = 0; i < fields.length; i++) {
+                            popup.appendChild(document.createElement('br'));
+                            popup.appendChild(document.createTextNode(fields[i] + ': ' + p[fields[i]]));
+                        }
+                        return popup;
+                    });
+                }
+            });
+            {% if this.cluster %}
+            var group = L.markerClusterGroup({disableClusteringAtZoom: {{ this.uncluster_zoom }},
+                                              chunkedLoading: true});
+            group.addLayer(layer);
+            group.addTo({{ this._parent.get_name() }});
+            return group;
+            {% else %}
+            layer.addTo({{ this._parent.get_name() }});
+            return layer;
+            {% endif %}
+        })();
+        {% endmacro %}
+    """)
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self, geojson, labels, colors, fields, cluster=True, radius=4, uncluster_zoom=9):
+        super().__init__()
+        self._name = 'StationLayer'
+        # Escaped like the tojson filter, so attribute values cannot close the <script> tag.
+        self.data = (json.dumps(geojson, separators=(',', ':'))
+                     .replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026'))
+        self.labels = list(labels)
+        self.colors = list(colors)
+        self.fields = list(fields)
+        self.cluster = cluster
+        self.radius = radius
+        self.uncluster_zoom = uncluster_zoom
+
+
+def _legend(labels, colors, title):
+    rows = ''.join(f'<div><span style="background:{colors[i % len(colors)]};width:10px;height:10px;'
+                   f'display:inline-block;margin-right:4px"></span>{html.escape(label)}</div>'
+                   for i, label in enumerate(labels))
+    return Element(f'<div style="position:fixed;bottom:20px;left:20px;z-index:9999;background:white;'
+                   f'padding:6px;font-size:12px;border:1px solid #999">'
+                   f'{f"<b>{html.escape(title)}</b>" if title else ""}{rows}</div>')
+
+
+@traced('map export')
+def export_station_map(df, path, category=None, colors=None, popup_columns=('station_id',),
+                       title=None, cluster=True, location=(20, 0), zoom_start=2,
+                       lat='latitude', lon='longitude', geojson_path=None):
+    """
+    Write an HTML station map with one embedded GeoJSON layer.
+
+    Parameters:
+    df (pd.DataFrame): One row per station with coordinates and the attributes to show.
+    path (str): Output HTML file.
+    category (str, optional): Column that drives the marker colour, e.g. a qualification
+        flag or 'urbanization_bin'.
+    colors (list or dict, optional): Colours per category (list in label order, or
+        {label: colour}); defaults to a blue-to-red ramp.
+    popup_columns (tuple): Columns shown in the popups.
+    title (str, optional): HTML title shown above the map and as legend header.
+    cluster (bool): Cluster markers client-side (they separate from zoom 9 on).
+    location, zoom_start: Initial view.
+    lat, lon (str): Coordinate column names.
+    geojson_path (str, optional): Also write the FeatureCollection as a standalone .geojson file.
+
+    Returns:
+    folium.Map: The map (already saved).
+    """
+    table, labels = simplify_attributes(df, category, popup_columns, lat, lon)
+    if isinstance(colors, dict):
+        colors = [colors.get(label, '#777777') for label in labels]
+    colors = colors or DEFAULT_COLORS
+    geojson = station_geojson(table, popup_columns)
+    if geojson_path:
+        with open(geojson_path, 'w') as f:
+            json.dump(geojson, f, separators=(',', ':'))
+
+    m = folium.Map(location=list(location), zoom_start=zoom_start, prefer_canvas=True)
+    if title:
+        m.get_root().html.add_child(
+            Element(f'<h3 align="center" style="font-size:18px"><b>{html.escape(title)}</b></h3>'))
+    StationLayer(geojson, labels, colors, popup_columns, cluster=cluster).add_to(m)
+    if category is not None:
+        m.get_root().html.add_child(_legend(labels, colors, title or category))
+    m.save(path)
+    return m
@@ -0,0 +1,133 @@
+"""
+Derived trend columns for the station metadata CSV.
+
+The post-processing cell of Extract_BI_for_GHCN.ipynb loops over the stations
+with ``iterrows()`` and calls ``scipy.stats.linregress`` once per row, and
+``BI_change_decade`` is a row-wise ``apply``. Here a family of year-suffixed
+columns (``BI_2012`` ... ``BI_2023``, ``Built_1975_10km_percent`` /
+``Built_2020_10km_percent``) becomes one (rows, years) array and the per-row
+least-squares line is the closed-form masked solution
+
+    slope = (n Σxy - Σx Σy) / (n Σx² - (Σx)²),   intercept = (Σy - slope Σx) / n
+
+summed over the years a row actually has, so missing years only shrink that
+row's fit instead of dropping it.
+"""
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+METADATA_CSV = "GHCNv4_stations_with_BI_BU_orwell2022.csv"
+
+# (output name, column prefix, column suffix) of the year-suffixed column families
+TREND_SPECS = [
+    ("BI", "BI_", ""),
+    ("Built_2km", "Built_", "_2km_percent"),
+    ("Built_10km", "Built_", "_10km_percent"),
+    ("Built_50km", "Built_", "_50km_percent"),
+]
+
+
+def year_columns(df, prefix, suffix=""):
+    """{year: column} of the columns named ``<prefix><YYYY><suffix>``, sorted by year."""
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d{{4}}){re.escape(suffix)}$")
+    found = {int(m.group(1)): col for col in df.columns if (m := pattern.match(col))}
+    return dict(sorted(found.items()))
+
+
+def lsq_lines(values, years, min_points=2):
+    """
+    Least-squares line of every row of ``values`` against ``years``, ignoring NaN.
+
+    Parameters:
+    values (np.ndarray): (rows, years) values with NaN for missing years.
+    years (array-like): The x value of every column.
+    min_points (int): Minimum number of years a row needs; otherwise NaN.
+
+    Returns:
+    (np.ndarray, np.ndarray, np.ndarray): Slope, intercept and number of points per row.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(y)
+    x = np.where(valid, np.asarray(years, dtype=np.float64)[None, :], 0.0)
+    y = np.where(valid, y, 0.0)
+    n = valid.sum(axis=1)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+    bad = n < max(min_points, 2)
+    slope[bad] = np.nan
+    intercept[bad] = np.nan
+    return slope, intercept, n
+
+
+def endpoint_change(values, years, per=10):
+    """Change between each row's first and last available year, scaled to ``per`` years."""
+    y = np.asarray(values, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    valid = ~np.isnan(y)
+    rows = np.arange(len(y))
+    first = np.argmax(valid, axis=1)
+    last = y.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    span = years[last] - years[first]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = (y[rows, last] - y[rows, first]) / span * per
+    change[(span <= 0) | ~valid.any(axis=1)] = np.nan
+    return change
+
+
+def derive_trends(df, name, prefix, suffix="", at_year=2020, min_points=2, decimals=2):
+    """
+    Add ``<name>_<at_year>_lsq``, ``<name>_trend_lsq`` (per year) and ``<name>_change_decade``.
+
+    For BI this reproduces the notebook's ``BI_2020_lsq``, ``BI_trend_lsq`` and
+    ``BI_change_decade`` columns for complete rows; rows with missing years are fitted
+    on the years they have (at least ``min_points``).
+
+    Returns:
+    pd.DataFrame: ``df`` with the derived columns set (modified in place).
+    """
+    cols = year_columns(df, prefix, suffix)
+    if len(cols) < 2:
+        raise ValueError(f"Need at least two '{prefix}<year>{suffix}' columns, found {list(cols.values())}")
+    years = np.array(list(cols))
+    values = df[list(cols.values())].to_numpy(dtype=np.float64)
+    slope, intercept, _ = lsq_lines(values, years, min_points)
+    df[f"{name}_{at_year}_lsq"] = np.round(intercept + slope * at_year, decimals)
+    df[f"{name}_trend_lsq"] = np.round(slope, decimals)
+    df[f"{name}_change_decade"] = np.round(endpoint_change(values, years), decimals)
+    return df
+
+
+def derive_metadata(df, specs=TREND_SPECS, at_year=2020, min_points=2, decimals=2):
+    """Apply `derive_trends` for every (name, prefix, suffix) in ``specs`` whose columns exist."""
+    for name, prefix, suffix in specs:
+        if len(year_columns(df, prefix, suffix)) >= 2:
+            derive_trends(df, name, prefix, suffix, at_year, min_points, decimals)
+    return df
+
+
+def update_metadata_csv(path=METADATA_CSV, specs=TREND_SPECS, at_year=2020, min_points=2, decimals=2):
+    """
+    Recompute the derived trend columns of the metadata CSV and write it back atomically.
+
+    Duplicate station IDs are dropped (last row wins), as in the notebook.
+
+    Returns:
+    pd.DataFrame: The updated metadata.
+    """
+    df = pd.read_csv(path)
+    if "ID" in df:
+        df = df.drop_duplicates(subset="ID", keep="last")
+    derive_metadata(df, specs, at_year, min_points, decimals)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metadata.", suffix=".csv")
+    with os.fdopen(fd, "w", newline="") as f:
+        df.to_csv(f, index=False)
+    os.replace(tmp, path)
+    return df
@@ -0,0 +1,321 @@
+"""
+Headless figure rendering from precomputed results.
+
+The plotting functions of huscrn-sep2025.py and the notebooks aggregate and
+smooth inside the plot and end in ``plt.show()``. The renderers here only
+draw: they take the frames produced by `run_sweep`/`ensemble_from_series`
+(yearly ensembles with a 'loess' column, trend tables with bin edges, station
+tables), build a `matplotlib.figure.Figure` without pyplot (so no GUI backend
+is ever touched), and `render_jobs` fans many figure variants out over a
+process pool, writing PNG/SVG files.
+
+Basemap construction (reading and projecting the coastline/country
+geometries) dominates every map figure. `get_basemap` memoizes the Basemap
+per (projection, bounds, resolution) in the process and pickles it to a cache
+directory, so workers and later runs reuse it. Without Basemap installed the
+maps fall back to plain lon/lat axes.
+"""
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+
+from ghcn_tools.instrument import traced
+
+DEFAULT_BASEMAP_CACHE = os.path.join('ghcn_cache', 'basemap')
+_BASEMAPS = {}
+
+
+def get_basemap(projection='merc', llcrnrlon=-180, llcrnrlat=-80, urcrnrlon=180, urcrnrlat=80,
+                resolution='l', cache_dir=DEFAULT_BASEMAP_CACHE, **kwargs):
+    """
+    Memoized Basemap instance (None if Basemap is not installed).
+
+    The instance is not bound to an axes; pass ``ax=`` to its draw methods.
+    """
+    try:
+        from mpl_toolkits.basemap import Basemap
+    except ImportError:
+        return None
+    if projection in ('robin', 'moll', 'kav7'):
+        params = dict(projection=projection, resolution=resolution, lon_0=kwargs.pop('lon_0', 0), **kwargs)
+    else:
+        params = dict(projection=projection, llcrnrlon=llcrnrlon, llcrnrlat=llcrnrlat,
+                      urcrnrlon=urcrnrlon, urcrnrlat=urcrnrlat, resolution=resolution, **kwargs)
+    key = hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()[:16]
+    if key in _BASEMAPS:
+        return _BASEMAPS[key]
+    path = os.path.join(cache_dir, f"{key}.pickle") if cache_dir else None
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            m = pickle.load(f)
+    else:
+        m = Basemap(**params)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.part"
+            with open(tmp, 'wb') as f:
+                pickle.dump(m, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+    _BASEMAPS[key] = m
+    return m
+
+
+def _draw_background(m, ax):
+    m.drawmapboundary(fill_color='lightblue', zorder=1, ax=ax)
+    m.fillcontinents(color='lightgray', lake_color='lightblue', zorder=2, ax=ax)
+    m.drawcoastlines(linewidth=1.0, zorder=3, ax=ax)
+    m.drawcountries(linewidth=1.0, zorder=3, ax=ax)
+    m.drawparallels(np.arange(-80., 81., 10.), labels=[1, 0, 0, 0], linewidth=0.5, dashes=[1, 3],
+                    fontsize=10, zorder=4, ax=ax)
+    m.drawmeridians(np.arange(-180., 181., 20.), labels=[0, 0, 0, 1], linewidth=0.5, dashes=[1, 3],
+                    fontsize=10, zorder=4, ax=ax)
+
+
+def _bin_label(row):
+    if row['group'] == 'all' or np.isnan(row['bin_low']):
+        return str(row['group'])
+    return f"BU {row['bin_low']:.2f}-{row['bin_high']:.2f}"
+
+
+def loess_by_bins(ensemble, trends=None, title=None, column_label='Urbanization bin', show_trend=True,
+                  figsize=(10, 5)):
+    """
+    LOESS curves per urbanization bin (replaces `plot_loess_by_urbanization_bins`).
+
+    Parameters:
+    ensemble (pd.DataFrame): group, year, anomaly, loess (one configuration of `run_sweep`).
+    trends (pd.DataFrame, optional): group, bin_low, bin_high, trend_per_decade for labels.
+    """
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    groups = [g for g in ensemble['group'].unique() if g != 'all']
+    cmap = colormaps['coolwarm']
+    norm = Normalize(vmin=0, vmax=max(len(groups) - 1, 1))
+    labels = {}
+    if trends is not None:
+        labels = {row['group']: _bin_label(row) for _, row in trends.iterrows()}
+        slopes = dict(zip(trends['group'], trends['trend_per_decade']))
+    for i, group in enumerate(groups):
+        data = ensemble[ensemble['group'] == group]
+        label = labels.get(group, f"bin {group}")
+        if show_trend and trends is not None and np.isfinite(slopes.get(group, np.nan)):
+            label += f" ({slopes[group]:+.2f} °C/dec)"
+        ax.plot(data['year'], data['loess'], color=cmap(norm(i)), linewidth=2, label=label)
+    ax.set_title(title or 'LOESS Smoothed T Anomalies by Urbanization Bin')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Anomaly (°C)')
+    ax.legend(title=column_label, fontsize=8, loc='upper left')
+    fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax, label=column_label)
+    ax.grid(True)
+    fig.tight_layout()
+    return fig
+
+
+def stripes_by_bins(ensemble, trends=None, title='Climate Stripes by Urbanization Bin', footer=None,
+                    skip_first=True):
+    """
+    Climate stripes of the LOESS curve of every bin (replaces `plot_stripes_by_urbanization_bins`).
+
+    Bins without any LOESS value keep an empty row; without any bin the figure only says so.
+    """
+    groups = [g for g in ensemble['group'].unique() if g != 'all']
+    if skip_first:
+        groups = groups[1:]
+    labels = {} if trends is None else {row['group']: _bin_label(row) for _, row in trends.iterrows()}
+    wide = ensemble[ensemble['group'].isin(groups)].pivot(index='group', columns='year', values='loess')
+    wide = wide.reindex(groups[::-1])
+    years = wide.columns.to_numpy()
+    values = wide.to_numpy(dtype=np.float64)
+    fig = Figure(figsize=(13, max(len(groups), 1) * 0.6 + 1))
+    ax = fig.add_subplot()
+    cmap = colormaps['coolwarm']
+    finite = values[np.isfinite(values)]
+    norm = Normalize(vmin=finite.min(), vmax=finite.max()) if finite.size else Normalize(vmin=-1, vmax=1)
+    gap = 0.1
+    if len(years):
+        for i, stripe in enumerate(values):
+            ax.imshow(cmap(norm(stripe))[None], aspect='auto',
+                      extent=[years[0], years[-1], i * (1 + gap), i * (1 + gap) + 1])
+    else:
+        ax.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax.transAxes, fontsize=16)
+    ax.set_ylim(0, max(len(values), 1) * (1 + gap))
+    ax.set_yticks(np.arange(len(values)) * (1 + gap) + 0.5)
+    ax.set_yticklabels([labels.get(g, f"bin {g}") for g in groups[::-1]])
+    ax.set_title(title)
+    ax.set_xlabel('Year')
+    fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax, label='Temperature Anomaly (°C)', pad=0.1)
+    if footer:
+        fig.text(0.5, 0.01, footer, ha='center', fontsize=9)
+    fig.tight_layout()
+    return fig
+
+
+def station_map(stations, group_column=None, title=None, projection='merc', bounds=None,
+                resolution='l', cache_dir=DEFAULT_BASEMAP_CACHE, figsize=(18, 12), marker_size=50):
+    """
+    Stations on a map, coloured by ``group_column`` (replaces `plot_station_maps_with_bins`).
+
+    Parameters:
+    stations (pd.DataFrame): longitude, latitude (and ``group_column``).
+    bounds (tuple, optional): (min_lon, min_lat, max_lon, max_lat); defaults to the
+        station extent plus 10 degrees, as in the notebook.
+    """
+    stations = stations.dropna(subset=['longitude', 'latitude']).drop_duplicates(subset=['longitude', 'latitude'])
+    if bounds is None:
+        bounds = (max(-180, stations['longitude'].min() - 10), max(-80, stations['latitude'].min() - 10),
+                  min(180, stations['longitude'].max() + 10), min(80, stations['latitude'].max() + 10))
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    m = get_basemap(projection, *bounds, resolution=resolution, cache_dir=cache_dir)
+    if m is not None:
+        _draw_background(m, ax)
+        project = m
+    else:
+        ax.set_xlim(bounds[0], bounds[2])
+        ax.set_ylim(bounds[1], bounds[3])
+        ax.set_facecolor('lightblue')
+        ax.grid(True, linestyle=':')
+        project = lambda lon, lat: (lon, lat)  # noqa: E731
+
+    cmap = colormaps['coolwarm']
+    groups = sorted(stations[group_column].dropna().unique()) if group_column else [None]
+    norm = Normalize(vmin=0, vmax=max(len(groups) - 1, 1))
+    for i, group in enumerate(groups):
+        part = stations if group is None else stations[stations[group_column] == group]
+        x, y = project(part['longitude'].to_numpy(), part['latitude'].to_numpy())
+        ax.scatter(x, y, marker='o', color=cmap(norm(i)) if group is not None else 'black', s=marker_size,
+                   edgecolor='k', alpha=0.7, zorder=5, label=None if group is None else str(group))
+    if group_column:
+        ax.legend(title=group_column, bbox_to_anchor=(1.02, 1), loc='upper left', fontsize=12)
+    ax.set_title(title or f"{len(stations)} stations", fontsize=16, pad=20)
+    fig.tight_layout()
+    return fig
+
+
+def _stats_box(ax, text, color):
+    ax.text(0.02, 0.95, text, transform=ax.transAxes, verticalalignment='top', fontsize=10,
+            bbox=dict(boxstyle='round', facecolor=color, alpha=0.8))
+
+
+def _no_data(ax, title):
+    ax.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax.transAxes, fontsize=16)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+
+
+def ensemble_panels(annual, monthly=None, monthly_loess=None, title=None, footnote=None, annual_mean=None,
+                    annual_mean_label='10-Year Average', stats=None,
+                    monthly_title='Monthly Anomalies with LOESS Smoothing'):
+    """
+    Stacked annual-ensemble panels plus an optional monthly/LOESS panel (the huscrn-sep2025.py figure).
+
+    Parameters:
+    annual (dict): Panel title -> annual ensemble Series (DatetimeIndex), or None for a
+        "No data" panel.
+    monthly (pd.Series, optional): Monthly ensemble for the bottom panel.
+    monthly_loess (pd.Series, optional): Its LOESS curve on the same index.
+    annual_mean (dict, optional): Panel title -> smoothed annual Series (e.g. the 10-year
+        rolling mean) drawn over the bars.
+    stats (dict, optional): Panel title (``monthly_title`` for the monthly panel) -> text
+        of the box in the panel's upper left corner.
+    footnote (str, optional): Boxed text below the panels (e.g. the qualifying pairs).
+    """
+    annual_mean = annual_mean or {}
+    stats = stats or {}
+    n = len(annual) + (monthly is not None)
+    fig = Figure(figsize=(16, 6 * n))
+    axes = fig.subplots(n, 1, squeeze=False)[:, 0]
+    colors = iter(['lightblue', 'lightgreen', 'lavender', 'mistyrose'])
+    for ax, (name, series) in zip(axes, annual.items()):
+        color = next(colors, 'lightblue')
+        if series is None or not series.notna().any():
+            _no_data(ax, name)
+            continue
+        series = series.dropna()
+        bar_colors = ['#d62728' if v > 0 else '#1f77b4' for v in series.to_numpy()]
+        ax.bar(series.index.year, series.to_numpy(), color=bar_colors, alpha=0.8, width=0.8)
+        if annual_mean.get(name) is not None:
+            mean = annual_mean[name]
+            ax.plot(mean.index.year, mean.to_numpy(), color='black', linewidth=3, label=annual_mean_label,
+                    zorder=10)
+            ax.legend(loc='upper right', fontsize=10)
+        ax.axhline(0, color='black', linestyle='--', alpha=0.5, linewidth=1)
+        ax.set_title(name, fontsize=14, fontweight='bold')
+        ax.set_xlabel('Year')
+        ax.set_ylabel('Temperature Anomaly (°C)')
+        ax.grid(axis='y', linestyle='--', alpha=0.3)
+        if name in stats:
+            _stats_box(ax, stats[name], color)
+    if monthly is not None:
+        ax = axes[-1]
+        if not monthly.notna().any():
+            _no_data(ax, monthly_title)
+        else:
+            x = monthly.index.year + monthly.index.month / 12
+            ax.scatter(x, monthly.to_numpy(), alpha=0.3, s=8, color='gray', label='Monthly Anomalies')
+            if monthly_loess is not None:
+                ax.plot(x, monthly_loess.to_numpy(), color='red', linewidth=3, label='LOESS Smooth', zorder=10)
+            ax.axhline(0, color='black', linestyle='--', alpha=0.5, linewidth=1)
+            ax.set_title(monthly_title, fontsize=14, fontweight='bold')
+            ax.set_xlabel('Year')
+            ax.set_ylabel('Temperature Anomaly (°C)')
+            ax.legend(loc='upper right')
+            ax.grid(axis='y', linestyle='--', alpha=0.3)
+            if monthly_title in stats:
+                _stats_box(ax, stats[monthly_title], 'lightyellow')
+    if title:
+        fig.suptitle(title, fontsize=16, fontweight='bold')
+    if footnote:
+        fig.text(0.02, 0.01, footnote, fontsize=9, va='bottom', wrap=True,
+                 bbox=dict(boxstyle='round,pad=0.5', facecolor='lightgray', alpha=0.8))
+    fig.tight_layout(rect=(0, 0.03 * (footnote.count('\n') + 1) / n if footnote else 0, 1, 1))
+    return fig
+
+
+RENDERERS = {
+    'loess_by_bins': loess_by_bins,
+    'stripes_by_bins': stripes_by_bins,
+    'station_map': station_map,
+    'ensemble_panels': ensemble_panels,
+}
+
+
+def render_figure(name, renderer, kwargs, out_dir, formats=('png',), dpi=100):
+    """Render one figure and save it in every format. Returns the written paths."""
+    func = RENDERERS[renderer] if isinstance(renderer, str) else renderer
+    fig = func(**kwargs)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+        paths.append(path)
+    return paths
+
+
+@traced('render', rows=len)
+def render_jobs(jobs, out_dir, formats=('png',), workers=None, dpi=100):
+    """
+    Render many figure variants in parallel.
+
+    Parameters:
+    jobs (list): (name, renderer, kwargs) tuples; ``renderer`` is a key of ``RENDERERS``
+        or a module-level function returning a Figure; ``name`` becomes the file name.
+    out_dir (str): Output directory.
+    formats (tuple): File formats, e.g. ('png', 'svg').
+    workers (int, optional): Process count; 1 renders in this process.
+
+    Returns:
+    dict: name -> list of written paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if workers == 1 or len(jobs) <= 1:
+        return {name: render_figure(name, r, kw, out_dir, formats, dpi) for name, r, kw in jobs}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(render_figure, name, r, kw, out_dir, formats, dpi) for name, r, kw in jobs}
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,208 @@
+"""
+Spatial index over station inventories and automatic legacy/reference pair discovery.
+
+Stations are placed on the unit sphere and indexed with a KD-tree; the
+straight-line (chord) distance between unit vectors is monotonic in the
+great-circle distance, so radius and k-nearest queries are exact after
+converting km to chord length. This replaces the hand-coded ``station_pairs``
+/ ``STATION_PAIRS_H9`` lists and the external "kdtree_11km" matching.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def km_to_chord(km):
+    return 2.0 * np.sin(np.minimum(np.asarray(km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class StationIndex:
+    """
+    KD-tree over the stations of an inventory frame (as returned by `read_station_inventory`).
+
+    Stations without coordinates are left out of the index.
+    """
+
+    def __init__(self, stations):
+        stations = stations.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+        self.stations = stations
+        self.station_ids = stations['station_id'].to_numpy()
+        self.xyz = to_unit_vectors(stations['latitude'], stations['longitude'])
+        self.tree = cKDTree(self.xyz)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def query_radius(self, lat, lon, radius_km):
+        """
+        Stations within ``radius_km`` of a point, nearest first.
+
+        Returns:
+        pd.DataFrame: Inventory rows of the matches plus a 'distance_km' column.
+        """
+        point = to_unit_vectors([lat], [lon])[0]
+        idx = np.asarray(self.tree.query_ball_point(point, km_to_chord(radius_km)), dtype=int)
+        dist = chord_to_km(np.linalg.norm(self.xyz[idx] - point, axis=1))
+        order = np.argsort(dist)
+        out = self.stations.iloc[idx[order]].copy()
+        out['distance_km'] = dist[order]
+        return out
+
+    def query_knn(self, lat, lon, k=1, max_km=None):
+        """
+        k nearest stations of one or many points.
+
+        Parameters:
+        lat, lon (float or array-like): Query point(s) in degrees.
+        k (int): Number of neighbours.
+        max_km (float, optional): Ignore neighbours farther than this.
+
+        Returns:
+        (np.ndarray, np.ndarray): Station indices (len(self) where no neighbour exists)
+        and distances in km (inf where no neighbour exists), shape (points, k).
+        """
+        points = to_unit_vectors(np.atleast_1d(lat), np.atleast_1d(lon))
+        bound = np.inf if max_km is None else km_to_chord(max_km)
+        dist, idx = self.tree.query(points, k=k, distance_upper_bound=bound)
+        dist = np.asarray(dist).reshape(len(points), k)
+        idx = np.asarray(idx).reshape(len(points), k)
+        km = np.where(np.isfinite(dist), chord_to_km(np.where(np.isfinite(dist), dist, 0)), np.inf)
+        return idx, km
+
+    def neighbours(self, station_id, radius_km):
+        """Other stations within ``radius_km`` of ``station_id``."""
+        row = self.stations.loc[self.stations['station_id'] == station_id].iloc[0]
+        out = self.query_radius(row['latitude'], row['longitude'], radius_km)
+        return out[out['station_id'] != station_id]
+
+
+def discover_pairs(stations, reference_ids, candidate_ids=None, max_km=50.0, max_elev_diff=None,
+                   periods=None, min_overlap_years=None, min_candidate_years=0, k=8, unique=True):
+    """
+    Propose legacy <-> reference (USCRN / rural reference) station pairs.
+
+    Every reference station is matched with the nearest candidate stations
+    within ``max_km`` that pass the elevation and record filters; the best
+    candidate is the closest one, ties broken by the smaller elevation difference
+    and then the longer candidate record. Pairs are assigned greedily in that
+    order over all references, so a reference whose best candidate is already
+    taken gets its next free one.
+
+    Parameters:
+    stations (pd.DataFrame): Inventory with station_id, latitude, longitude, elevation (and name).
+    reference_ids (list): IDs of the reference stations (e.g. USCRN stations).
+    candidate_ids (list, optional): IDs allowed as legacy partner. Defaults to all
+        non-reference stations.
+    max_km (float): Maximum pair distance in km.
+    max_elev_diff (float, optional): Maximum absolute elevation difference in m.
+    periods (pd.DataFrame, optional): station_id, first_year, last_year (e.g. from
+        `record_periods` or `read_ghcnd_inventory`), used for the record filters.
+    min_overlap_years (int, optional): Minimum years both records share (None: no check;
+        legacy records often end before the USCRN station starts).
+    min_candidate_years (int): Minimum length of the legacy record in years.
+    k (int): Number of nearest candidates examined per reference station.
+    unique (bool): Use every legacy station in at most one pair.
+
+    Returns:
+    pd.DataFrame: One row per proposed pair with legacy_id, reference_id, distance_km,
+    elev_diff_m, the record periods (if given) and overlap_years.
+    """
+    reference_ids = pd.Index(pd.unique(np.asarray(reference_ids)))
+    refs = stations[stations['station_id'].isin(reference_ids)].dropna(subset=['latitude', 'longitude'])
+    if candidate_ids is None:
+        cands = stations[~stations['station_id'].isin(reference_ids)]
+    else:
+        cands = stations[stations['station_id'].isin(candidate_ids) & ~stations['station_id'].isin(reference_ids)]
+    index = StationIndex(cands)
+    if len(index) == 0 or refs.empty:
+        return pd.DataFrame(columns=['legacy_id', 'reference_id', 'distance_km', 'elev_diff_m'])
+
+    idx, km = index.query_knn(refs['latitude'].to_numpy(), refs['longitude'].to_numpy(),
+                              k=min(k, len(index)), max_km=max_km)
+    ref_pos, slot = np.nonzero(np.isfinite(km))
+    cand_pos = idx[ref_pos, slot]
+    pairs = pd.DataFrame({
+        'legacy_id': index.station_ids[cand_pos],
+        'reference_id': refs['station_id'].to_numpy()[ref_pos],
+        'distance_km': km[ref_pos, slot],
+        'elev_diff_m': (index.stations['elevation'].to_numpy()[cand_pos]
+                        - refs['elevation'].to_numpy()[ref_pos]),
+    })
+    if 'name' in stations:
+        pairs.insert(1, 'legacy_name', index.stations['name'].to_numpy()[cand_pos])
+        pairs.insert(3, 'reference_name', refs['name'].to_numpy()[ref_pos])
+    pairs['latitude'] = refs['latitude'].to_numpy()[ref_pos]
+    pairs['longitude'] = refs['longitude'].to_numpy()[ref_pos]
+    if max_elev_diff is not None:
+        pairs = pairs[pairs['elev_diff_m'].abs() <= max_elev_diff]
+
+    sort_cols, ascending = ['distance_km', 'abs_elev_diff'], [True, True]
+    pairs = pairs.assign(abs_elev_diff=pairs['elev_diff_m'].abs())
+    if periods is not None:
+        p = periods.set_index('station_id')[['first_year', 'last_year']]
+        pairs = pairs.join(p.add_prefix('legacy_'), on='legacy_id').join(p.add_prefix('reference_'), on='reference_id')
+        pairs['legacy_years'] = pairs['legacy_last_year'] - pairs['legacy_first_year'] + 1
+        pairs['overlap_years'] = (np.minimum(pairs['legacy_last_year'], pairs['reference_last_year'])
+                                  - np.maximum(pairs['legacy_first_year'], pairs['reference_first_year']) + 1).clip(lower=0)
+        pairs = pairs[pairs['legacy_years'].fillna(0) >= min_candidate_years]
+        if min_overlap_years is not None:
+            pairs = pairs[pairs['overlap_years'].fillna(0) >= min_overlap_years]
+        sort_cols.append('legacy_years')
+        ascending.append(False)
+
+    pairs = pairs.sort_values(sort_cols, ascending=ascending)
+    keep = _greedy_assign(pairs['legacy_id'].to_numpy(), pairs['reference_id'].to_numpy(), unique)
+    pairs = pairs[keep].drop(columns='abs_elev_diff')
+    return pairs.sort_values('distance_km').reset_index(drop=True)
+
+
+def _greedy_assign(legacy_ids, reference_ids, unique=True):
+    """
+    Walk candidate pairs in preference order and accept a pair only if its reference
+    (and, with ``unique``, its legacy station) is still free.
+
+    Returns:
+    np.ndarray: Boolean mask of the accepted pairs.
+    """
+    keep = np.zeros(len(legacy_ids), dtype=bool)
+    used_legacy, used_reference = set(), set()
+    for i, (legacy, reference) in enumerate(zip(legacy_ids, reference_ids)):
+        if reference in used_reference or (unique and legacy in used_legacy):
+            continue
+        keep[i] = True
+        used_reference.add(reference)
+        used_legacy.add(legacy)
+    return keep
+
+
+def to_station_pairs(pairs):
+    """Convert `discover_pairs` output to the ``station_pairs`` dict list used by huscrn-sep2025.py."""
+    return [
+        {
+            "legacy_name": row.get('legacy_name', row['legacy_id']),
+            "legacy_id": row['legacy_id'],
+            "uscrn_name": row.get('reference_name', row['reference_id']),
+            "uscrn_id": row['reference_id'],
+            "lat": row['latitude'], "lon": row['longitude'],
+            "state": row.get('state', ''),
+        }
+        for row in pairs.to_dict('records')
+    ]
@@ -0,0 +1,136 @@
+"""
+Vectorized stitching of legacy/USCRN station pairs.
+
+huscrn-sep2025.py stitches every pair on its own (filter the legacy frame by
+the USCRN start date, ``pd.concat``, ``drop_duplicates``, ``set_index``) and
+HUSCRN.ipynb averages the two stations year by year with ``df.loc[y, "tavg"]``.
+`stitch_pairs` does it for all pairs at once on a (stations, time) array,
+e.g. a `MonthlyBlock` flattened to months or `series_to_array` output:
+
+    L = values[legacy_rows], U = values[uscrn_rows]        (pairs, time)
+
+with one of three policies:
+
+- 'cutover': legacy before the USCRN start, USCRN from then on (huscrn-sep2025.py),
+- 'average': mean of whatever both stations report (HUSCRN.ipynb),
+- 'offset':  like 'cutover', but the legacy part is shifted by the mean
+  USCRN - legacy difference over their overlap, so the splice has no step.
+
+Pairs without USCRN data keep the legacy series, as in the script.
+"""
+import numpy as np
+import pandas as pd
+
+STITCH_METHODS = ('cutover', 'average', 'offset')
+
+
+def pair_rows(pairs, station_ids, legacy_col='legacy_id', uscrn_col='uscrn_id'):
+    """
+    Row indices of the legacy and USCRN station of every pair.
+
+    Parameters:
+    pairs (pd.DataFrame or list): Pair table or the ``station_pairs`` dict list.
+    station_ids (array-like): Row labels of the value array (e.g. ``block.station_ids``).
+
+    Returns:
+    (np.ndarray, np.ndarray): Legacy and USCRN rows, -1 where a station is not in ``station_ids``.
+    """
+    pairs = pd.DataFrame(pairs)
+    index = pd.Index(np.asarray(station_ids).astype(str))
+    return (index.get_indexer(pairs[legacy_col].astype(str)),
+            index.get_indexer(pairs[uscrn_col].astype(str)))
+
+
+def _first_valid(valid):
+    """Index of the first True of every row, -1 for rows without any."""
+    return np.where(valid.any(axis=1), valid.argmax(axis=1), -1)
+
+
+def overlap_stats(legacy, uscrn):
+    """
+    Overlap statistics of (pairs, time) legacy and USCRN arrays.
+
+    Returns:
+    pd.DataFrame: n_overlap, mean_diff and std_diff of USCRN - legacy, and their correlation.
+    """
+    both = ~np.isnan(legacy) & ~np.isnan(uscrn)
+    n = both.sum(axis=1).astype(np.float64)
+    x = np.where(both, legacy, 0.0)
+    y = np.where(both, uscrn, 0.0)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, syy, sxy = np.einsum('ij,ij->i', x, x), np.einsum('ij,ij->i', y, y), np.einsum('ij,ij->i', x, y)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_diff = (sy - sx) / n
+        cxx, cyy, cxy = sxx - sx * sx / n, syy - sy * sy / n, sxy - sx * sy / n
+        std_diff = np.sqrt(np.maximum(cxx + cyy - 2 * cxy, 0) / (n - 1))
+        corr = cxy / np.sqrt(cxx * cyy)
+    std_diff[n < 2] = np.nan
+    corr[n < 3] = np.nan
+    return pd.DataFrame({'n_overlap': n.astype(int), 'mean_diff': mean_diff, 'std_diff': std_diff,
+                         'correlation': corr})
+
+
+def _rows(values, rows):
+    """values[rows] with all-NaN rows where ``rows`` is -1."""
+    rows = np.asarray(rows)
+    out = values[np.maximum(rows, 0)]
+    out[rows < 0] = np.nan
+    return out
+
+
+def stitch_pairs(values, legacy_rows, uscrn_rows, method='cutover', cutover=None, min_overlap=1):
+    """
+    Stitch all legacy/USCRN pairs in one pass.
+
+    Parameters:
+    values (np.ndarray): (stations, time) values, NaN for missing.
+    legacy_rows, uscrn_rows (array-like): Rows of the two stations of every pair (-1: no data).
+    method (str): 'cutover', 'average' or 'offset' (see module docstring).
+    cutover (int or array-like, optional): Time index where USCRN takes over, per pair or
+        for all; defaults to the first USCRN value of every pair.
+    min_overlap (int): 'offset' only: pairs with fewer overlapping values are not shifted.
+
+    Returns:
+    (np.ndarray, pd.DataFrame): (pairs, time) stitched values, and per pair the cut-over
+    index, the overlap statistics and the applied offset.
+    """
+    if method not in STITCH_METHODS:
+        raise ValueError(f"Unknown stitch method {method!r}, expected one of {STITCH_METHODS}")
+    values = np.asarray(values, dtype=np.float64)
+    legacy = _rows(values, legacy_rows)
+    uscrn = _rows(values, uscrn_rows)
+    stats = overlap_stats(legacy, uscrn)
+
+    start = _first_valid(~np.isnan(uscrn))
+    if cutover is not None:
+        start = np.where(start >= 0, np.broadcast_to(np.asarray(cutover), start.shape), -1)
+    stats.insert(0, 'cutover', start)
+    no_uscrn = start < 0
+    after = np.arange(values.shape[1])[None, :] >= np.where(no_uscrn, values.shape[1], start)[:, None]
+
+    offset = np.zeros(len(start))
+    if method == 'average':
+        out = np.where(np.isnan(legacy), uscrn, np.where(np.isnan(uscrn), legacy, (legacy + uscrn) / 2))
+    else:
+        if method == 'offset':
+            use = (stats['n_overlap'].to_numpy() >= max(min_overlap, 1))
+            offset = np.where(use, stats['mean_diff'].to_numpy(), 0.0)
+        out = np.where(after, uscrn, legacy + offset[:, None])
+    stats['offset'] = offset
+    return out, stats
+
+
+def stitch_block(block, pairs, method='cutover', **kwargs):
+    """
+    Stitch pairs of a `MonthlyBlock` on its month axis.
+
+    Returns:
+    (np.ndarray, pd.DataFrame): (pairs, years, 12) stitched °C values, and the pair
+    table with legacy/USCRN rows and the `stitch_pairs` statistics.
+    """
+    pairs = pd.DataFrame(pairs).reset_index(drop=True)
+    legacy_rows, uscrn_rows = pair_rows(pairs, block.station_ids)
+    data = block.celsius(np.float64).reshape(len(block), -1)
+    out, stats = stitch_pairs(data, legacy_rows, uscrn_rows, method, **kwargs)
+    table = pd.concat([pairs, pd.DataFrame({'legacy_row': legacy_rows, 'uscrn_row': uscrn_rows}), stats], axis=1)
+    return out.reshape(len(out), len(block.years), 12), table
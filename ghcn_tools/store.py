@@ -0,0 +1,285 @@
+"""
+Columnar on-disk store for GHCN-M v4 monthly data (``ghcnm.tavg.*.qcu.dat``).
+
+`analyze_station_data` in the notebooks reparses the whole fixed-width file
+on every run. `ingest_qcu` does that once and writes a dense
+station x year x month layout that later runs open with ``np.load(mmap_mode='r')``:
+
+    store_dir/
+        meta.json        first/last year, element, source file fingerprint
+        station_ids.npy  sorted station IDs (S11), row index of every array below
+        value.npy        int16 (stations, years, 12), hundredths of °C, -9999 = missing
+        mflag.npy        uint8 (stations, years, 12), ASCII measurement flag
+        qflag.npy        uint8 (stations, years, 12), ASCII quality flag
+        sflag.npy        uint8 (stations, years, 12), ASCII source flag
+
+Because the station IDs are sorted, all stations of one country code form a
+contiguous block of rows, so country and year slices are plain array views.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.coverage import ensure_coverage
+from ghcn_tools.decode import MISSING, decode_records
+from ghcn_tools.instrument import traced
+from ghcn_tools.inventory import read_station_inventory
+
+STORE_FORMAT = 1
+FLAG_NAMES = ('mflag', 'qflag', 'sflag')
+
+
+def file_fingerprint(path):
+    """Return a cheap fingerprint (name, size, mtime) used to detect a changed source file."""
+    st = os.stat(path)
+    return {'name': os.path.basename(path), 'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def _write_array(store_dir, name, shape, dtype, fill):
+    arr = np.lib.format.open_memmap(os.path.join(store_dir, f'{name}.npy'), mode='w+', dtype=dtype, shape=shape)
+    arr[...] = fill
+    return arr
+
+
+@traced('ingest', rows=lambda store: store.meta['n_records'])
+def ingest_qcu(source, store_dir, element='TAVG', chunk_bytes=1 << 26):
+    """
+    One-time ingest of a GHCN-M ``.dat`` file into a memory-mappable store.
+
+    Parameters:
+    source (str or binary file object): Path to the ``.qcu.dat`` file or an open binary stream.
+    store_dir (str): Output directory; created if needed, existing arrays are overwritten.
+    element (str): Element to ingest. Defaults to 'TAVG'.
+    chunk_bytes (int): Approximate number of bytes decoded per chunk.
+
+    Returns:
+    MonthlyStore: The freshly written store, opened read-only.
+    """
+    records = decode_records(source, element, chunk_bytes=chunk_bytes)
+    if len(records['station_id']) == 0:
+        raise ValueError(f"No {element} records found in {getattr(source, 'name', source)}")
+
+    station_ids, station_idx = np.unique(records['station_id'], return_inverse=True)
+    first_year = int(records['year'].min())
+    last_year = int(records['year'].max())
+    year_idx = records['year'].astype(np.int32) - first_year
+    shape = (len(station_ids), last_year - first_year + 1, 12)
+
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, 'station_ids.npy'), station_ids)
+    value = _write_array(store_dir, 'value', shape, np.int16, MISSING)
+    value[station_idx, year_idx] = records['value']
+    value.flush()
+    del value
+    for name in FLAG_NAMES:
+        arr = _write_array(store_dir, name, shape, np.uint8, ord(' '))
+        arr[station_idx, year_idx] = records[name]
+        arr.flush()
+        del arr
+
+    meta = {
+        'format': STORE_FORMAT,
+        'element': element,
+        'first_year': first_year,
+        'last_year': last_year,
+        'n_stations': len(station_ids),
+        'n_records': int(len(station_idx)),
+    }
+    if isinstance(source, (str, os.PathLike)):
+        meta['source'] = file_fingerprint(source)
+    else:
+        meta['source'] = {'name': os.path.basename(str(getattr(source, 'name', '')))}
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"Ingested {meta['n_records']} {element} records for {meta['n_stations']} stations "
+          f"({first_year}-{last_year}) into {store_dir}")
+    return MonthlyStore(store_dir)
+
+
+def open_store(store_dir):
+    """Open an existing store read-only (memory-mapped)."""
+    return MonthlyStore(store_dir)
+
+
+def ensure_store(dat_path, store_dir, element='TAVG'):
+    """Open the store for ``dat_path``, ingesting it first if missing or built from another file."""
+    meta_path = os.path.join(store_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('source') == file_fingerprint(dat_path) and meta.get('element') == element:
+            return MonthlyStore(store_dir)
+        print(f"Store in {store_dir} was built from another file, re-ingesting...")
+    return ingest_qcu(dat_path, store_dir, element)
+
+
+def analyze_station_data(file_path, station_file_path, start_year, end_year, lat_min=None, lat_max=None,
+                         country_codes=None, max_pct_missing=0, all_years=False, store_dir='ghcnm_store'):
+    """
+    Store-backed `analyze_station_data` of the notebooks (same filters and output frame).
+
+    Parameters:
+    file_path (str): Path to the GHCN data file (ingested into ``store_dir`` once).
+    station_file_path (str): Path to the station inventory file.
+    start_year (int): Start year for filtering.
+    end_year (int): End year for filtering.
+    lat_min, lat_max (float, optional): Latitude limits.
+    country_codes (list, optional): Country codes to keep.
+    max_pct_missing (float): Maximum fraction of missing months allowed for a station.
+    all_years (bool): Instead keep stations reporting in every year of the range, the
+        rule of GHCN_US-vs-global.ipynb.
+    store_dir (str): Store directory. Defaults to 'ghcnm_store'.
+
+    Returns:
+    pd.DataFrame: One row per observed station-month (station_id, year, month, tavg in
+    hundredths of °C) merged with latitude, longitude, elevation, name and country_code.
+    """
+    stations = read_station_inventory(station_file_path)
+    if lat_min is not None:
+        stations = stations[stations['latitude'] >= lat_min]
+    if lat_max is not None:
+        stations = stations[stations['latitude'] <= lat_max]
+    if country_codes is not None:
+        stations = stations[stations['country_code'].isin(country_codes)]
+
+    store = ensure_store(file_path, store_dir)
+    coverage = ensure_coverage(store)
+    if all_years:
+        complete = coverage.continuous(start_year, end_year, min_months=1)
+    else:
+        complete = coverage.max_pct_missing(max_pct_missing, start_year, end_year)
+    ids = stations['station_id']
+    block = store.select(station_ids=ids[ids.isin(complete)], start_year=start_year, end_year=end_year)
+
+    columns = ['station_id', 'latitude', 'longitude', 'elevation', 'name', 'country_code']
+    return block.to_long().merge(stations[columns], on='station_id', how='left')
+
+
+class MonthlyStore:
+    """Read-only, memory-mapped view of a store written by `ingest_qcu`."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported store format {self.meta.get('format')} in {store_dir}")
+        self.element = self.meta['element']
+        self.first_year = self.meta['first_year']
+        self.last_year = self.meta['last_year']
+        self.station_ids = np.load(os.path.join(store_dir, 'station_ids.npy'))
+        self.value = np.load(os.path.join(store_dir, 'value.npy'), mmap_mode='r')
+        self.mflag = np.load(os.path.join(store_dir, 'mflag.npy'), mmap_mode='r')
+        self.qflag = np.load(os.path.join(store_dir, 'qflag.npy'), mmap_mode='r')
+        self.sflag = np.load(os.path.join(store_dir, 'sflag.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def __repr__(self):
+        return (f"MonthlyStore({self.store_dir!r}, element={self.element}, stations={len(self)}, "
+                f"years={self.first_year}-{self.last_year})")
+
+    @property
+    def years(self):
+        return np.arange(self.first_year, self.last_year + 1)
+
+    def station_index(self, station_ids):
+        """Row indices of ``station_ids``; IDs that are not in the store are dropped."""
+        wanted = np.asarray(station_ids, dtype='S11')
+        idx = np.searchsorted(self.station_ids, wanted)
+        idx = np.clip(idx, 0, len(self.station_ids) - 1)
+        return idx[self.station_ids[idx] == wanted]
+
+    def country_slice(self, country_code):
+        """Contiguous row slice holding all stations of a two-letter country code."""
+        code = country_code.encode('ascii')
+        return slice(np.searchsorted(self.station_ids, code, side='left'),
+                     np.searchsorted(self.station_ids, code + b'\xff', side='left'))
+
+    def _year_slice(self, start_year, end_year):
+        start_year = self.first_year if start_year is None else max(start_year, self.first_year)
+        end_year = self.last_year if end_year is None else min(end_year, self.last_year)
+        return slice(start_year - self.first_year, max(end_year - self.first_year + 1, 0))
+
+    def select(self, station_ids=None, country_codes=None, start_year=None, end_year=None, flags=False):
+        """
+        Slice the store by stations, country codes and year range without reparsing text.
+
+        Parameters:
+        station_ids (list, optional): Station IDs to keep.
+        country_codes (list, optional): Two-letter country code prefixes to keep.
+        start_year (int, optional): First year to keep. Defaults to the first year in the store.
+        end_year (int, optional): Last year to keep. Defaults to the last year in the store.
+        flags (bool): Also copy the M/Q/S flag arrays. Defaults to False.
+
+        Returns:
+        MonthlyBlock: In-memory copy of the selected rows.
+        """
+        if country_codes is not None:
+            rows = np.concatenate([np.arange(len(self))[self.country_slice(cc)] for cc in country_codes]
+                                  or [np.array([], dtype=int)])
+        else:
+            rows = np.arange(len(self))
+        if station_ids is not None:
+            rows = np.intersect1d(rows, self.station_index(station_ids))
+
+        ys = self._year_slice(start_year, end_year)
+        years = self.years[ys]
+        if len(rows) == len(self):
+            take = lambda arr: np.array(arr[:, ys])
+        else:
+            take = lambda arr: arr[rows][:, ys]
+        block = MonthlyBlock(
+            station_ids=self.station_ids[rows].astype(str),
+            years=years,
+            value=take(self.value),
+            element=self.element,
+        )
+        if flags:
+            block.mflag = take(self.mflag)
+            block.qflag = take(self.qflag)
+            block.sflag = take(self.sflag)
+        return block
+
+
+class MonthlyBlock:
+    """An in-memory station x year x month slice of a `MonthlyStore`."""
+
+    def __init__(self, station_ids, years, value, element='TAVG', mflag=None, qflag=None, sflag=None):
+        self.station_ids = np.asarray(station_ids)
+        self.years = np.asarray(years)
+        self.value = value
+        self.element = element
+        self.mflag = mflag
+        self.qflag = qflag
+        self.sflag = sflag
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    @property
+    def mask(self):
+        """Boolean (stations, years, 12) array, True where a value is present."""
+        return self.value != MISSING
+
+    def celsius(self, dtype=np.float32):
+        """Values in °C as floats with NaN for missing months."""
+        out = self.value.astype(dtype) / 100
+        out[~self.mask] = np.nan
+        return out
+
+    def to_long(self):
+        """
+        Long-format frame matching the output of `analyze_station_data` before the
+        metadata merge: one row per observed station-month, 'tavg' in hundredths of °C.
+        """
+        s, y, m = np.nonzero(self.mask)
+        return pd.DataFrame({
+            'station_id': self.station_ids[s],
+            'year': self.years[y].astype(int),
+            'month': m + 1,
+            'tavg': self.value[s, y, m].astype(float),
+        })
@@ -0,0 +1,267 @@
+"""
+Parallel scenario sweeps over baselines, station filters and urbanization binning.
+
+Exploring a parameter today means editing globals (``baseline_start``/``end``,
+``lat_min``/``lat_max``/``country_codes``, ``max_pct_missing``, ``nbins``,
+``built_percent_column``, ``frac``) and rerunning cells that reload and
+reparse the data. `run_sweep` loads the store once, converts it to a float32
+°C array in shared memory, and runs every configuration of a grid on a process
+pool whose workers attach to that array read-only. Each configuration yields
+the yearly ensemble (and its LOESS) of every urbanization bin plus a trend
+table; all of them are collected into two result frames. With a
+`ResultCache` the stages of every configuration are memoized on disk, so a
+rerun only recomputes the stages whose parameters changed.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.anomaly import anomalies, monthly_climatology
+from ghcn_tools.cache import NullCache, ResultCache, data_digest, make_key
+from ghcn_tools.coverage import CoverageIndex, ensure_coverage
+from ghcn_tools.instrument import traced
+from ghcn_tools.loess import lowess_batch
+from ghcn_tools.metadata import lsq_lines
+
+DEFAULTS = {
+    'baseline_start': 1923,
+    'baseline_end': 1943,
+    'min_baseline_years': 1,
+    'start_year': 1923,
+    'end_year': 2023,
+    'lat_min': None,
+    'lat_max': None,
+    'country_codes': None,
+    'max_pct_missing': 0.1,
+    'built_percent_column': None,
+    'nbins': 10,
+    'frac': 0.1,
+    'trend_start': 1980,
+}
+
+_SHARED = {}
+
+
+def scenario_grid(**params):
+    """
+    All combinations of the given parameter lists, on top of ``DEFAULTS``.
+
+    Example:
+    scenario_grid(baseline_start=[1923, 1951], frac=[0.1, 0.15], country_codes=[None, ["US"]])
+    """
+    names = list(params)
+    return [dict(DEFAULTS, **dict(zip(names, values))) for values in itertools.product(*params.values())]
+
+
+def _attach(shm_name, shape, years, columns, coverage, cache_args=None, source_key=None):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    data.setflags(write=False)
+    cache = ResultCache(*cache_args) if cache_args else None
+    _SHARED.update(shm=shm, data=data, years=years, columns=columns, coverage=coverage, cache=cache,
+                   source_key=source_key)
+
+
+def _station_mask(config, years, columns, coverage):
+    keep = np.ones(len(coverage), dtype=bool)
+    lat = columns.get('latitude')
+    if lat is None and (config['lat_min'] is not None or config['lat_max'] is not None):
+        raise ValueError("Latitude filters need station latitudes (pass stations= or metadata=)")
+    if config['lat_min'] is not None:
+        keep &= lat >= config['lat_min']
+    if config['lat_max'] is not None:
+        keep &= lat <= config['lat_max']
+    if config['country_codes'] is not None:
+        keep &= np.isin(columns['country_code'], list(config['country_codes']))
+    window = (years >= config['start_year']) & (years <= config['end_year'])
+    complete = coverage.max_pct_missing(config['max_pct_missing'], config['start_year'], config['end_year'])
+    keep &= np.isin(coverage.station_ids, complete)
+    return keep, window
+
+
+FILTER_PARAMS = ('lat_min', 'lat_max', 'country_codes', 'start_year', 'end_year', 'max_pct_missing')
+BASELINE_PARAMS = ('baseline_start', 'baseline_end', 'min_baseline_years')
+BIN_PARAMS = ('built_percent_column', 'nbins')
+
+
+def _filter_stage(config, years, columns, coverage):
+    keep, window = _station_mask(config, years, columns, coverage)
+    return {'rows': np.flatnonzero(keep), 'window': window}
+
+
+def _anomaly_stage(config, data, years, selected):
+    rows, window = selected['rows'], selected['window']
+    sub = data[rows][:, window]
+    clim = monthly_climatology(sub, years[window], config['baseline_start'], config['baseline_end'],
+                               config['min_baseline_years'])
+    has_baseline = ~np.all(np.isnan(clim), axis=1)
+    return {'rows': rows[has_baseline], 'anomalies': anomalies(sub[has_baseline], clim[has_baseline])}
+
+
+def _bin_stage(config, columns, rows):
+    groups = [('all', np.nan, np.nan, np.ones(len(rows), dtype=bool))]
+    column = config['built_percent_column']
+    if column:
+        built = columns[column][rows]
+        ok = ~np.isnan(built)
+        bins, edges = pd.qcut(built[ok], config['nbins'], labels=False, retbins=True, duplicates='drop')
+        labels = np.full(len(rows), -1)
+        labels[ok] = bins
+        for b in range(len(edges) - 1):
+            groups.append((b, edges[b], edges[b + 1], labels == b))
+    return groups
+
+
+def _ensemble_stage(anoms, groups):
+    valid = ~np.isnan(anoms)
+    sums = np.where(valid, anoms, 0).sum(axis=2, dtype=np.float64)
+    counts = valid.sum(axis=2)
+    yearly = []
+    for _, _, _, member in groups:
+        n = counts[member].sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            yearly.append(np.where(n > 0, sums[member].sum(axis=0) / n, np.nan))
+    return np.array(yearly)
+
+
+def run_config(config, data, years, columns, cache=None, source_key=None, coverage=None):
+    """
+    Ensembles and trends of one configuration.
+
+    The ``max_pct_missing`` filter is answered by ``coverage``, the `CoverageIndex` of the
+    rows of ``data`` (built from its NaNs if omitted), with the rule of ``analyze_station_data``.
+
+    With a `ResultCache` every stage (station filter, anomalies, bins, ensemble,
+    LOESS) is memoized under the parameters it depends on plus the key of its
+    upstream stage (``source_key`` for the first one), so changing e.g. only
+    ``frac`` recomputes only the LOESS.
+
+    Returns:
+    (pd.DataFrame, pd.DataFrame): Yearly ensemble per group (group, year, anomaly, loess,
+    n_stations) and the trend table (group, bin_low, bin_high, n_stations, trend_per_decade).
+    """
+    config = dict(DEFAULTS, **config)
+    cache = cache or NullCache()
+    if coverage is None:
+        coverage = CoverageIndex.from_mask(np.arange(len(data)), years, ~np.isnan(data))
+
+    def params(names):
+        return {name: config[name] for name in names}
+
+    selected, key = cache.memo('filter', _filter_stage, config, years, columns, coverage,
+                               params=params(FILTER_PARAMS), upstream=source_key)
+    anoms, key = cache.memo('anomalies', _anomaly_stage, config, data, years, selected,
+                            params=params(BASELINE_PARAMS), upstream=key)
+    rows = anoms['rows']
+    yrs = years[selected['window']]
+    groups, key = cache.memo('bins', _bin_stage, config, columns, rows, params=params(BIN_PARAMS), upstream=key)
+    yearly, key = cache.memo('ensemble', _ensemble_stage, anoms['anomalies'], groups, upstream=key)
+    smoothed, _ = cache.memo('loess', lowess_batch, yearly, yrs.astype(float), frac=config['frac'],
+                             params={'frac': config['frac']}, upstream=key)
+    trend_years = yrs >= config['trend_start']
+    slope, _, _ = lsq_lines(yearly[:, trend_years], yrs[trend_years])
+    trends = [(name, low, high, int(member.sum())) for name, low, high, member in groups]
+
+    ensemble = pd.DataFrame({
+        'group': np.repeat([g[0] for g in groups], len(yrs)).astype(str),
+        'year': np.tile(yrs, len(groups)),
+        'anomaly': yearly.ravel(),
+        'loess': smoothed.ravel(),
+        'n_stations': np.repeat([t[3] for t in trends], len(yrs)),
+    }).dropna(subset=['anomaly'])
+    table = pd.DataFrame(trends, columns=['group', 'bin_low', 'bin_high', 'n_stations'])
+    table['group'] = table['group'].astype(str)
+    table['trend_per_decade'] = slope * 10
+    return ensemble, table
+
+
+def _run_shared(item):
+    config_id, config = item
+    cache = _SHARED['cache']
+    if cache is not None:
+        cache.stats = {}
+    ensemble, table = run_config(config, _SHARED['data'], _SHARED['years'], _SHARED['columns'],
+                                 cache, _SHARED['source_key'], _SHARED['coverage'])
+    return config_id, ensemble, table, None if cache is None else cache.stats
+
+
+def _station_columns(station_ids, stations=None, metadata=None):
+    """Per-station arrays (aligned with ``station_ids``) that the filters and binning need."""
+    ids = pd.Index(np.asarray(station_ids).astype(str))
+    columns = {'country_code': np.asarray(ids.str[:2])}
+    if stations is not None:
+        lat = stations.set_index('station_id')['latitude']
+        columns['latitude'] = lat[~lat.index.duplicated()].reindex(ids).to_numpy(dtype=np.float64)
+    if metadata is not None:
+        meta = metadata.drop_duplicates('ID').set_index('ID')
+        if 'latitude' not in columns and 'Lat' in meta:
+            columns['latitude'] = meta['Lat'].reindex(ids).to_numpy(dtype=np.float64)
+        for col in meta.columns:
+            if pd.api.types.is_numeric_dtype(meta[col]):
+                columns[col] = meta[col].reindex(ids).to_numpy(dtype=np.float64)
+    return columns
+
+
+@traced('sweep', rows=lambda result: len(result[1]))
+def run_sweep(store, grid, stations=None, metadata=None, workers=None, cache=None):
+    """
+    Run every configuration of ``grid`` against one load of ``store``.
+
+    Parameters:
+    store (MonthlyStore): Monthly data.
+    grid (list): Configuration dicts (see `scenario_grid` and ``DEFAULTS``).
+    stations (pd.DataFrame, optional): Inventory from `read_station_inventory` (latitudes).
+    metadata (pd.DataFrame, optional): GHCNv4_stations_with_BI_BU_orwell2022.csv (ID, Lat,
+        Built_* and BI_* columns), needed for ``built_percent_column`` binning.
+    workers (int, optional): Process count; 1 runs everything in this process.
+    cache (ResultCache, optional): Memoize the stages of every configuration (see `run_config`);
+        its ``stats`` include the hits and misses of the worker processes.
+
+    Returns:
+    (pd.DataFrame, pd.DataFrame): Ensembles and trend tables of all configurations, with a
+    ``config_id`` column and the configuration parameters joined on.
+    """
+    block = store.select()
+    years = block.years
+    columns = _station_columns(block.station_ids, stations, metadata)
+    coverage = ensure_coverage(store)
+    celsius = block.celsius()
+    del block
+    items = list(enumerate(grid))
+    source_key = None
+    if cache is not None:
+        source_key = make_key('source', {'store': store.meta,
+                                         'columns': {name: data_digest(arr) for name, arr in columns.items()}})
+
+    if workers == 1:
+        results = [(i, *run_config(config, celsius, years, columns, cache, source_key, coverage), None)
+                   for i, config in items]
+    else:
+        cache_args = None if cache is None else (cache.cache_dir, cache.max_bytes)
+        shm = shared_memory.SharedMemory(create=True, size=celsius.nbytes)
+        try:
+            shared = np.ndarray(celsius.shape, dtype=np.float32, buffer=shm.buf)
+            shared[...] = celsius
+            shape = celsius.shape
+            del celsius
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                     initargs=(shm.name, shape, years, columns, coverage, cache_args,
+                                               source_key)) as pool:
+                results = list(pool.map(_run_shared, items))
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+
+    for *_, stats in results:
+        if stats:
+            cache.merge_stats(stats)
+    params = pd.DataFrame([dict(DEFAULTS, **config) for _, config in items])
+    params['country_codes'] = params['country_codes'].map(lambda c: None if c is None else ','.join(c))
+    params.insert(0, 'config_id', range(len(items)))
+    ensembles = pd.concat([e.assign(config_id=i) for i, e, _, _ in results], ignore_index=True)
+    trends = pd.concat([t.assign(config_id=i) for i, _, t, _ in results], ignore_index=True)
+    return ensembles.merge(params, on='config_id'), trends.merge(params, on='config_id')
@@ -0,0 +1,223 @@
+"""
+Synthetic GHCN data at configurable scale, for offline runs and benchmarks.
+
+Writes files in the real formats so every reader of the package can be used
+unchanged:
+
+- GHCN-M v4 ``.dat`` (115-column TAVG records) and ``.inv`` inventory,
+- GHCN-Daily access CSVs (``{station_id}.csv`` with DATE, TMAX/TMIN/TAVG/PRCP
+  and their ``_ATTRIBUTES``),
+- the BI/BU metadata CSV (columns of GHCNv4_stations_with_BI_BU_orwell2022.csv).
+
+Records have realistic gaps: every station has its own start and end year,
+a few missing years and scattered missing months. Temperatures follow a
+latitude-dependent climatology and seasonal cycle with a warming trend, an
+urbanization term and noise, so the anomaly, binning and trend stages see
+data shaped like the real network.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.decode import MISSING, RECORD_WIDTH
+from ghcn_tools.metadata import derive_metadata
+
+COUNTRY_WEIGHTS = {'US': 0.45, 'CA': 0.08, 'AS': 0.05, 'GM': 0.04, 'RS': 0.06, 'CH': 0.05, 'BR': 0.03,
+                   'IN': 0.02, 'JA': 0.03, 'SF': 0.02, 'MX': 0.02, 'AR': 0.02, 'UK': 0.02, 'FR': 0.02}
+BI_YEARS = (2012, 2017, 2020, 2023)
+BUILT_RADII = (50, 10, 2)
+
+
+def synthetic_stations(n_stations, seed=0):
+    """
+    Station table with GHCN-M style IDs, coordinates, elevation, name and a built-up fraction.
+
+    Returns:
+    pd.DataFrame: station_id, latitude, longitude, elevation, name, country_code, built.
+    """
+    rng = np.random.default_rng(seed)
+    codes = np.array(list(COUNTRY_WEIGHTS))
+    p = np.array(list(COUNTRY_WEIGHTS.values()))
+    country = rng.choice(codes, size=n_stations, p=p / p.sum())
+    kind = rng.choice(np.array(['C', 'W', 'M']), size=n_stations, p=[0.6, 0.3, 0.1])
+    number = rng.choice(10 ** 8, size=n_stations, replace=False)
+    ids = np.char.add(np.char.add(country, kind), np.char.zfill(number.astype(str), 8))
+    lat = np.clip(rng.normal(38, 20, n_stations), -89, 89)
+    us = country == 'US'
+    lat[us] = rng.uniform(25, 49, us.sum())
+    lon = rng.uniform(-180, 180, n_stations)
+    lon[us] = rng.uniform(-124, -67, us.sum())
+    return pd.DataFrame({
+        'station_id': ids,
+        'latitude': np.round(lat, 4),
+        'longitude': np.round(lon, 4),
+        'elevation': np.round(rng.gamma(1.5, 250, n_stations), 1),
+        'name': np.char.add('SYNTH_', np.arange(n_stations).astype(str)),
+        'country_code': country,
+        'built': np.round(rng.gamma(0.6, 6, n_stations).clip(0, 90), 2),
+    }).sort_values('station_id').reset_index(drop=True)
+
+
+def _format_ints(values, width):
+    """Right-aligned decimal text of integers as an (n, width) uint8 matrix (like f'{v:{width}d}')."""
+    values = np.asarray(values, dtype=np.int64)
+    mag = np.abs(values)
+    out = np.full(values.shape + (width,), ord(' '), dtype=np.uint8)
+    n_digits = np.maximum(np.floor(np.log10(np.maximum(mag, 1))).astype(int) + 1, 1)
+    for pos in range(width):
+        place = width - 1 - pos
+        digit = (mag // 10 ** place) % 10
+        show = place < n_digits
+        out[..., pos] = np.where(show, ord('0') + digit, out[..., pos])
+    sign_pos = width - 1 - n_digits
+    neg = values < 0
+    idx = np.nonzero(neg)
+    out[idx + (sign_pos[neg],)] = ord('-')
+    return out
+
+
+def _monthly_values(stations, first_year, last_year, rng):
+    """(stations, years, 12) int16 hundredths of °C with MISSING gaps."""
+    n, years = len(stations), np.arange(first_year, last_year + 1)
+    lat = stations['latitude'].to_numpy()[:, None, None]
+    base = 28 - 0.45 * np.abs(lat) - 0.0065 * stations['elevation'].to_numpy()[:, None, None]
+    season = (0.25 * np.abs(lat)) * np.sign(lat) * -np.cos(2 * np.pi * (np.arange(12) + 0.5) / 12)[None, None, :]
+    trend = np.clip(years - 1970, 0, None)[None, :, None] * 0.018
+    urban = stations['built'].to_numpy()[:, None, None] / 100 * np.clip(years - 1950, 0, None)[None, :, None] * 0.02
+    temp = base + season + trend + urban + rng.normal(0, 1.2, (n, len(years), 12))
+    values = np.round(temp * 100).astype(np.int16)
+
+    start = np.clip(np.round(rng.triangular(first_year, first_year + 0.4 * (last_year - first_year), last_year - 5, n)), first_year, last_year).astype(int)
+    end = np.where(rng.random(n) < 0.6, last_year, rng.integers(start + 5, last_year + 1))
+    yrs = years[None, :]
+    present = (yrs >= start[:, None]) & (yrs <= np.minimum(end, last_year)[:, None])
+    present &= rng.random((n, len(years))) > 0.04
+    months = present[:, :, None] & (rng.random((n, len(years), 12)) > 0.03)
+    values[~months] = MISSING
+    return values, present
+
+
+def write_ghcnm(dat_path, inv_path, stations, first_year=1850, last_year=2025, seed=0, chunk_stations=2000):
+    """
+    Write a GHCN-M v4 TAVG ``.dat`` file and matching ``.inv`` inventory.
+
+    Returns:
+    int: Number of records written.
+    """
+    rng = np.random.default_rng(seed)
+    n_records = 0
+    with open(dat_path, 'wb') as f:
+        for start in range(0, len(stations), chunk_stations):
+            part = stations.iloc[start:start + chunk_stations]
+            values, present = _monthly_values(part, first_year, last_year, rng)
+            s, y = np.nonzero(present)
+            rec = np.full((len(s), RECORD_WIDTH + 1), ord(' '), dtype=np.uint8)
+            rec[:, -1] = ord('\n')
+            rec[:, 0:11] = part['station_id'].to_numpy().astype('S11').view(np.uint8).reshape(-1, 11)[s]
+            rec[:, 11:15] = _format_ints(first_year + y, 4)
+            rec[:, 15:19] = np.frombuffer(b'TAVG', dtype=np.uint8)
+            vals = values[s, y]
+            digits = _format_ints(vals, 5)
+            for m in range(12):
+                col = 19 + 8 * m
+                rec[:, col:col + 5] = digits[:, m]
+                rec[:, col + 7] = np.where(vals[:, m] != MISSING, ord('G'), ord(' '))
+            f.write(rec.tobytes())
+            n_records += len(s)
+
+    with open(inv_path, 'w') as f:
+        for row in stations.itertuples(index=False):
+            f.write(f"{row.station_id} {row.latitude:8.4f} {row.longitude:9.4f} {row.elevation:6.1f} {row.name}\n")
+    return n_records
+
+
+def write_metadata_csv(path, stations, seed=0):
+    """Write a BI/BU metadata CSV with the columns of GHCNv4_stations_with_BI_BU_orwell2022.csv."""
+    rng = np.random.default_rng(seed)
+    n = len(stations)
+    built = stations['built'].to_numpy()
+    df = pd.DataFrame({
+        'ID': stations['station_id'],
+        'Station': stations['name'],
+        'USCRN_Y_N': np.where(rng.random(n) < 0.005, 'Y', 'N'),
+        'Lat': stations['latitude'],
+        'Lon': stations['longitude'],
+        'Elev-m': stations['elevation'],
+        'BI': np.round(np.clip(built * 4 + rng.normal(0, 15, n), 0, 186)),
+    })
+    for radius in BUILT_RADII:
+        scale = {50: 0.4, 10: 0.8, 2: 1.0}[radius]
+        b2020 = np.round(np.clip(built * scale * rng.lognormal(0, 0.3, n), 0, 100), 2)
+        b1975 = np.round(b2020 * rng.uniform(0.3, 0.9, n), 2)
+        df[f'Built_1975_{radius}km_percent'] = b1975
+        df[f'Built_2020_{radius}km_percent'] = b2020
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df[f'Percentage_Change_{radius}km'] = np.round(np.where(b1975 > 0, (b2020 - b1975) / b1975 * 100, 0), 2)
+    df['USCRN_Station'] = np.where(df['USCRN_Y_N'] == 'Y', df['Station'], None)
+    for year in BI_YEARS:
+        df[f'BI_{year}'] = np.round(np.clip(built * 1.5 * (1 + 0.02 * (year - 2012)) + rng.gamma(0.5, 1, n), 0, None), 2)
+    derive_metadata(df, specs=[("BI", "BI_", "")])
+    df.to_csv(path, index=False)
+    return path
+
+
+def write_daily_csvs(cache_dir, stations, first_year=1950, last_year=2025, seed=0):
+    """
+    Write GHCN-Daily access CSVs (``{station_id}.csv``) for ``stations``.
+
+    Returns:
+    list: Paths of the written files.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    dates = pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31", freq='D')
+    doy = dates.dayofyear.to_numpy()
+    paths = []
+    for row in stations.itertuples(index=False):
+        start = rng.integers(0, len(dates) // 2)
+        d = dates[start:]
+        season = -np.cos(2 * np.pi * doy[start:] / 365.25) * 0.25 * abs(row.latitude) * np.sign(row.latitude)
+        tavg = 28 - 0.45 * abs(row.latitude) + season + rng.normal(0, 3, len(d))
+        tmax = np.round((tavg + rng.uniform(4, 8, len(d))) * 10)
+        tmin = np.round((tavg - rng.uniform(4, 8, len(d))) * 10)
+        prcp = np.round(rng.exponential(30, len(d)) * (rng.random(len(d)) < 0.3))
+        gap = rng.random(len(d)) < 0.05
+        df = pd.DataFrame({
+            'STATION': row.station_id, 'DATE': d.strftime('%Y-%m-%d'),
+            'LATITUDE': row.latitude, 'LONGITUDE': row.longitude, 'ELEVATION': row.elevation,
+            'NAME': row.name,
+            'PRCP': prcp, 'PRCP_ATTRIBUTES': ',,7,0700',
+            'TMAX': np.where(gap, np.nan, tmax), 'TMAX_ATTRIBUTES': np.where(gap, '', ',,7,0700'),
+            'TMIN': tmin, 'TMIN_ATTRIBUTES': ',,7,0700',
+        })
+        for col in ('PRCP', 'TMAX', 'TMIN'):
+            df[col] = df[col].astype('Int64')
+        path = os.path.join(cache_dir, f"{row.station_id}.csv")
+        df.to_csv(path, index=False, quoting=1)
+        paths.append(path)
+    return paths
+
+
+def generate(out_dir, n_stations=1000, first_year=1850, last_year=2025, daily_stations=0, seed=0):
+    """
+    Write a complete synthetic data set into ``out_dir``.
+
+    Returns:
+    dict: Paths ('dat', 'inv', 'metadata', 'daily_dir') and the station table ('stations').
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stations = synthetic_stations(n_stations, seed)
+    tag = f"synthetic{n_stations}"
+    paths = {
+        'dat': os.path.join(out_dir, f"ghcnm.tavg.v4.0.1.{tag}.qcu.dat"),
+        'inv': os.path.join(out_dir, f"ghcnm.tavg.v4.0.1.{tag}.qcu.inv"),
+        'metadata': os.path.join(out_dir, f"GHCNv4_stations_with_BI_BU_{tag}.csv"),
+        'daily_dir': os.path.join(out_dir, 'station_data'),
+    }
+    write_ghcnm(paths['dat'], paths['inv'], stations, first_year, last_year, seed)
+    write_metadata_csv(paths['metadata'], stations, seed)
+    if daily_stations:
+        write_daily_csvs(paths['daily_dir'], stations.iloc[:daily_stations], max(first_year, 1950), last_year, seed)
+    paths['stations'] = stations
+    return paths
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+LAST_MODIFIED = 'Sun, 16 Jun 2024 00:00:00 GMT'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Serves ``server.files`` with ETag/Last-Modified and conditional 304s. A path can be given
+    a queue of one-off behaviours in ``server.faults``: an HTTP status code, or 'truncate'
+    (announce the full Content-Length, send half of the body and close the connection).
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            queue = server.faults.get(self.path)
+            fault = queue.pop(0) if queue else None
+        body = server.files.get(self.path)
+        if body is None:
+            fault = 404
+        if isinstance(fault, int):
+            self.send_response(fault)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if 'If-None-Match' in self.headers:  # takes precedence over If-Modified-Since
+            not_modified = self.headers['If-None-Match'] == etag
+        else:
+            not_modified = self.headers.get('If-Modified-Since') == LAST_MODIFIED
+        if fault is None and not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if fault == 'truncate':
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class LocalServer:
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.files = {}
+        self.httpd.faults = {}
+        self.httpd.requests = []
+        self.httpd.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def files(self):
+        return self.httpd.files
+
+    @property
+    def faults(self):
+        return self.httpd.faults
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    """Local HTTP stand-in for the NOAA servers."""
+    server = LocalServer()
+    yield server
+    server.close()
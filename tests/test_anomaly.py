@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.anomaly import ensemble_from_series
+
+
+def _monthly(start, end, value):
+    index = pd.period_range(start, end, freq='M').to_timestamp(how='end').normalize()
+    return pd.Series(value, index=index, dtype=float)
+
+
+def test_annual_ensemble_keeps_gap_years():
+    a = _monthly('2000-01', '2001-12', 1.0)
+    b = _monthly('2004-01', '2004-12', 3.0)
+    monthly, annual = ensemble_from_series([a, b])
+    assert len(monthly) == 36
+    assert list(annual.index.year) == [2000, 2001, 2002, 2003, 2004]
+    np.testing.assert_array_equal(annual.to_numpy(), [1.0, 1.0, np.nan, np.nan, 3.0])
+    assert (annual.index == annual.index.to_period('Y').to_timestamp(how='end').normalize()).all()
+
+
+def test_annual_ensemble_min_months_gives_nan():
+    a = pd.concat([_monthly('2000-01', '2000-12', 1.0), _monthly('2001-01', '2001-03', 2.0)])
+    _, annual = ensemble_from_series([a], min_months=6)
+    np.testing.assert_array_equal(annual.to_numpy(), [1.0, np.nan])
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from scipy.stats import linregress
+
+from ghcn_tools.bootstrap import bootstrap_bands, confidence_band, replicate_ensembles, replicate_trends
+
+SEED = 11
+
+
+def _data(n_units=25, n_points=30, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(0, 1, (n_units, n_points)) + np.linspace(0, 1.5, n_points)
+    data[rng.random(data.shape) < 0.3] = np.nan
+    data[3] = np.nan
+    data[:, 4] = np.nan
+    data[:2, 5] = 1.0
+    data[2:, 5] = np.nan
+    return data
+
+
+def _naive_replicates(data, n_replicates, seed, weights=None, min_units=1):
+    """Resample the units one replicate at a time and average what reports."""
+    rng = np.random.default_rng(seed)
+    w = np.ones(len(data)) if weights is None else np.asarray(weights, dtype=np.float64)
+    out = np.full((n_replicates, data.shape[1]), np.nan)
+    for r in range(n_replicates):
+        idx = rng.integers(0, len(data), size=len(data))
+        for p in range(data.shape[1]):
+            values, wts = data[idx, p], w[idx]
+            ok = ~np.isnan(values)
+            if ok.sum() >= max(min_units, 1) and wts[ok].sum() > 0:
+                out[r, p] = np.sum(values[ok] * wts[ok]) / wts[ok].sum()
+    return out
+
+
+@pytest.mark.parametrize('weighted,min_units', [(False, 1), (True, 1), (False, 3)])
+def test_replicates_match_naive_loop(weighted, min_units):
+    data = _data()
+    weights = np.random.default_rng(1).uniform(0.5, 2, len(data)) if weighted else None
+    reps = replicate_ensembles(data, 200, seed=SEED, weights=weights, min_units=min_units)
+    ref = _naive_replicates(data, 200, SEED, weights, min_units)
+    assert reps.shape == ref.shape
+    assert np.array_equal(np.isnan(reps), np.isnan(ref))
+    np.testing.assert_allclose(reps, ref, rtol=1e-5, atol=1e-5)
+
+
+def test_band_and_trends_match_naive_loop():
+    data = _data(seed=2)
+    x = np.arange(1990, 1990 + data.shape[1], dtype=float)
+    reps = replicate_ensembles(data, 300, seed=SEED)
+    ref = _naive_replicates(data, 300, SEED)
+
+    low, high = confidence_band(reps, 0.9)
+    for p in range(data.shape[1]):
+        col = ref[:, p][~np.isnan(ref[:, p])]
+        if len(col) == 0:
+            assert np.isnan(low[p]) and np.isnan(high[p])
+            continue
+        np.testing.assert_allclose([low[p], high[p]], np.percentile(col, [5, 95]), rtol=1e-5, atol=1e-5)
+
+    slopes = replicate_trends(reps, x, start=1995, end=2015)
+    keep = (x >= 1995) & (x <= 2015)
+    for r in range(len(ref)):
+        ok = keep & ~np.isnan(ref[r])
+        assert slopes[r] == pytest.approx(linregress(x[ok], ref[r, ok]).slope, rel=1e-4, abs=1e-6)
+
+
+def test_bootstrap_bands_is_reproducible():
+    data = _data(seed=3)
+    x = np.arange(2000, 2000 + data.shape[1], dtype=float)
+    band, trend = bootstrap_bands(data, x, n_replicates=150, level=0.9, frac=0.5, trend_start=2005, seed=SEED)
+    again, trend_again = bootstrap_bands(data, x, n_replicates=150, level=0.9, frac=0.5, trend_start=2005, seed=SEED)
+    assert band.equals(again) and trend == trend_again
+
+    count = (~np.isnan(data)).sum(axis=0)
+    point = np.where(count > 0, np.nansum(data, axis=0) / np.maximum(count, 1), np.nan)
+    np.testing.assert_allclose(band['ensemble'], point, rtol=1e-5, atol=1e-6)
+    low, high = confidence_band(_naive_replicates(data, 150, SEED), 0.9)
+    np.testing.assert_allclose(band['low'], low, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(band['high'], high, rtol=1e-5, atol=1e-5)
+    assert trend['low'] <= trend['trend_per_decade'] <= trend['high']
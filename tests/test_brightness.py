@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ghcn_tools.brightness import RasterBackend, extract_brightness, read_checkpoint
+
+
+class FlakyBackend(RasterBackend):
+    """Fails the first request for one year, like a transient Earth Engine error."""
+
+    def __init__(self, rasters, fail_year):
+        super().__init__(rasters)
+        self.fail_year = fail_year
+
+    def sample(self, lats, lons, year):
+        if year == self.fail_year:
+            self.fail_year = None
+            raise RuntimeError("transient error")
+        return super().sample(lats, lons, year)
+
+
+def test_failed_batch_is_retried_on_resume(tmp_path):
+    grid = np.arange(180 * 360, dtype=float).reshape(180, 360)
+    rasters = {year: (grid + year, (-180, -90, 180, 90)) for year in (2012, 2020)}
+    stations = pd.DataFrame({'ID': ['A', 'B', 'C'], 'Lat': [10.5, -20.5, 45.5], 'Lon': [5.5, 100.5, -60.5]})
+    checkpoint = str(tmp_path / 'bi.csv')
+
+    first = extract_brightness(stations, FlakyBackend(rasters, fail_year=2020), years=[2012, 2020],
+                               checkpoint_path=checkpoint, batch_size=3, max_workers=1)
+    assert first['BI_2020'].isna().all()
+    assert read_checkpoint(checkpoint).empty
+
+    second = extract_brightness(stations, RasterBackend(rasters), years=[2012, 2020],
+                                checkpoint_path=checkpoint, batch_size=3, max_workers=1)
+    assert second[['BI_2012', 'BI_2020']].notna().all().all()
+    assert sorted(read_checkpoint(checkpoint)['ID']) == ['A', 'B', 'C']
+
+
+def test_checkpoint_for_other_years_is_rejected(tmp_path):
+    grid = np.zeros((180, 360))
+    rasters = {year: (grid + year, (-180, -90, 180, 90)) for year in (2012, 2020)}
+    stations = pd.DataFrame({'ID': ['A', 'B'], 'Lat': [10.5, -20.5], 'Lon': [5.5, 100.5]})
+    checkpoint = str(tmp_path / 'bi.csv')
+    extract_brightness(stations, RasterBackend(rasters), years=[2012], checkpoint_path=checkpoint)
+    before = open(checkpoint).read()
+
+    with pytest.raises(ValueError, match='BI_2020'):
+        extract_brightness(stations, RasterBackend(rasters), years=[2012, 2020], checkpoint_path=checkpoint)
+    assert open(checkpoint).read() == before
+    again = extract_brightness(stations, RasterBackend(rasters), years=[2012], checkpoint_path=checkpoint)
+    assert (again['BI_2012'] == 2012).all()
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ghcn_tools.cache import ResultCache, make_key
+from ghcn_tools.store import ingest_qcu
+from ghcn_tools.synthetic import generate
+from ghcn_tools.sweep import run_sweep, scenario_grid
+
+
+def test_put_get_formats(tmp_path):
+    cache = ResultCache(str(tmp_path / 'c'))
+    arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+    arrays = {'rows': np.arange(5), 'anomalies': np.ones((2, 3))}
+    frame = pd.DataFrame({'group': ['a', 'b'], 'value': [1.5, np.nan]})
+    objects = np.array(['x', None], dtype=object)
+    for stage, value in [('arr', arr), ('dict', arrays), ('frame', frame), ('objects', objects)]:
+        cache.put(stage, 'k', value)
+
+    assert sorted(os.listdir(cache.cache_dir)) == ['arr-k.npy', 'dict-k', 'frame-k.pkl', 'objects-k.pkl']
+    got = cache.get('arr', 'k')
+    assert isinstance(got, np.memmap) and np.array_equal(got, arr) and got.dtype == arr.dtype
+    got = cache.get('dict', 'k')
+    assert sorted(got) == ['anomalies', 'rows']
+    for name in arrays:
+        assert np.array_equal(got[name], arrays[name])
+    pd.testing.assert_frame_equal(cache.get('frame', 'k'), frame)
+    assert cache.get('objects', 'k').tolist() == ['x', None]
+    with pytest.raises(KeyError):
+        cache.get('arr', 'other')
+
+
+def test_memo_counts_hits_and_misses(tmp_path):
+    cache = ResultCache(str(tmp_path / 'c'))
+    calls = []
+
+    def square(x):
+        calls.append(x)
+        return np.asarray(x) ** 2
+
+    first, key = cache.memo('square', square, 3, params={'x': 3})
+    again, key2 = cache.memo('square', square, 3, params={'x': 3})
+    other, key3 = cache.memo('square', square, 4, params={'x': 4}, upstream=key)
+    assert calls == [3, 4] and key == key2 != key3
+    assert key == make_key('square', {'x': 3}) and key3 == make_key('square', {'x': 4}, key)
+    assert int(again) == int(first) == 9 and int(other) == 16
+    summary = cache.summary()
+    assert summary.loc['square', 'hits'] == 1 and summary.loc['square', 'misses'] == 2
+    assert summary.loc['square', 'hit_rate'] == pytest.approx(1 / 3)
+
+
+def test_evict_removes_least_recently_used_first(tmp_path):
+    cache = ResultCache(str(tmp_path / 'c'), max_bytes=1 << 30)
+    block = np.zeros(1000)
+    for i, stage in enumerate(['a', 'b', 'c', 'd']):
+        cache.put(stage, 'k', block)
+        path = cache._find(stage, 'k')
+        os.utime(path, (1_000_000 + i, 1_000_000 + i))
+    cache.get('a', 'k')  # now the most recently used
+    size = int(cache.entries()['bytes'].iloc[0])
+
+    assert cache.evict(2 * size) == 2
+    assert sorted(cache.entries()['stage']) == ['a', 'd']
+    cache.max_bytes = size
+    cache.put('e', 'k', block)
+    assert list(cache.entries()['stage']) == ['e']
+    assert cache.clear() == 1 and cache.entries().empty
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    out = tmp_path_factory.mktemp('cache_sweep')
+    paths = generate(str(out), n_stations=60, first_year=1900, last_year=2020, seed=5)
+    return ingest_qcu(paths['dat'], str(out / 'store')), pd.read_csv(paths['metadata'])
+
+
+def test_sweep_reuses_stages(store, tmp_path):
+    store, metadata = store
+    grid = scenario_grid(frac=[0.1], built_percent_column=['Built_2020_10km_percent'], nbins=[3])
+    plain = run_sweep(store, grid, metadata=metadata, workers=1)
+
+    cache = ResultCache(str(tmp_path / 'c'))
+    cached = run_sweep(store, grid, metadata=metadata, workers=1, cache=cache)
+    assert all(s['misses'] == 1 and s['hits'] == 0 for s in cache.stats.values())
+    cache.stats = {}
+    reloaded = run_sweep(store, grid, metadata=metadata, workers=1, cache=cache)
+    assert all(s['misses'] == 0 and s['hits'] == 1 for s in cache.stats.values())
+    for a, b, c in zip(plain, cached, reloaded):
+        pd.testing.assert_frame_equal(a, b)
+        pd.testing.assert_frame_equal(a, c)
+
+    cache.stats = {}
+    regrid = scenario_grid(frac=[0.1, 0.3], built_percent_column=['Built_2020_10km_percent'], nbins=[3])
+    run_sweep(store, regrid, metadata=metadata, workers=2, cache=cache)
+    stats = cache.summary()
+    assert set(stats.index) == {'filter', 'anomalies', 'bins', 'ensemble', 'loess'}
+    assert stats.loc['loess', 'misses'] == 1 and stats.loc['loess', 'hits'] == 1
+    assert (stats.drop('loess')['misses'] == 0).all() and (stats.drop('loess')['hits'] == 2).all()
@@ -0,0 +1,11 @@
+import pytest
+
+from ghcn_tools.cli import main
+
+
+def test_ghcnm_ingest_rejects_several_elements(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exc:
+        main(['ingest', str(tmp_path / 'x.dat'), '--store', str(tmp_path / 'store'), '--elements', 'TAVG', 'TMAX'])
+    assert exc.value.code == 2
+    assert 'several --elements need --daily' in capsys.readouterr().err
+    assert not (tmp_path / 'store').exists()
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from ghcn_tools.coverage import CoverageIndex
+
+FIRST_YEAR = 1990
+N_YEARS = 7
+
+
+def _mask(seed=0, n_stations=40):
+    rng = np.random.default_rng(seed)
+    density = rng.choice([0.0, 0.3, 0.8, 0.97, 1.0], size=(n_stations, 1, 1))
+    mask = rng.random((n_stations, N_YEARS, 12)) < density
+    mask[5] = True
+    mask[6, 3] = False
+    return mask
+
+
+def _ids(n):
+    return np.array([f'ST{i:09d}' for i in range(n)])
+
+
+def _counts(mask, start, end):
+    """Brute-force months per station and year of the window."""
+    out = np.zeros((len(mask), end - start + 1), dtype=int)
+    for s in range(len(mask)):
+        for j, year in enumerate(range(start, end + 1)):
+            if FIRST_YEAR <= year < FIRST_YEAR + N_YEARS:
+                out[s, j] = sum(bool(mask[s, year - FIRST_YEAR, m]) for m in range(12))
+    return out
+
+
+WINDOWS = [(None, None), (1991, 1995), (1985, 1993), (1994, 2001), (1992, 1992)]
+
+
+@pytest.mark.parametrize('start,end', WINDOWS)
+def test_queries_match_brute_force(start, end):
+    mask = _mask()
+    ids = _ids(len(mask))
+    cov = CoverageIndex.from_mask(ids, np.arange(FIRST_YEAR, FIRST_YEAR + N_YEARS), mask)
+    lo = FIRST_YEAR if start is None else start
+    hi = FIRST_YEAR + N_YEARS - 1 if end is None else end
+    counts = _counts(mask, lo, hi)
+    inside = counts[:, max(FIRST_YEAR - lo, 0):counts.shape[1] - max(hi - (FIRST_YEAR + N_YEARS - 1), 0)]
+
+    assert np.array_equal(cov.months_per_year(start, end), inside)
+
+    for min_months, fraction in [(1, 0.0), (9, 0.7), (12, 1.0), (6, 0.5)]:
+        good = (inside >= min_months).sum(axis=1)
+        needed = max(int(np.ceil(fraction * inside.shape[1] - 1e-9)), 1)
+        assert list(cov.query(min_months, fraction, start, end)) == list(ids[good >= needed])
+
+    for max_missing in [0.0, 0.05, 0.1, 0.5, 1.0]:
+        months = counts.shape[1] * 12
+        expected = [sid for sid, n in zip(ids, counts.sum(axis=1)) if n > 0 and 1 - n / months <= max_missing]
+        assert list(cov.max_pct_missing(max_missing, start, end)) == expected
+
+    for min_months in [1, 9, 12]:
+        runs = []
+        for row in inside:
+            best = run = 0
+            for n in row:
+                run = run + 1 if n >= min_months else 0
+                best = max(best, run)
+            runs.append(best)
+        assert list(cov.longest_run(min_months, start, end)) == runs
+        expected = [sid for sid, row in zip(ids, counts) if (row >= min_months).all()]
+        assert list(cov.continuous(lo, hi, min_months)) == expected
+
+
+def test_max_pct_missing_takes_a_fraction_and_needs_data():
+    mask = np.zeros((3, N_YEARS, 12), dtype=bool)
+    mask[1] = True
+    mask[2, :, :11] = True
+    cov = CoverageIndex.from_mask(_ids(3), np.arange(FIRST_YEAR, FIRST_YEAR + N_YEARS), mask)
+    assert list(cov.max_pct_missing(1.0)) == ['ST000000001', 'ST000000002']
+    assert list(cov.max_pct_missing(0.1)) == ['ST000000001', 'ST000000002']
+    assert list(cov.max_pct_missing(0.05)) == ['ST000000001']
+
+
+def test_save_load_round_trip(tmp_path):
+    mask = _mask(seed=1, n_stations=13)
+    cov = CoverageIndex.from_mask(_ids(13), np.arange(FIRST_YEAR, FIRST_YEAR + N_YEARS), mask)
+    path = str(tmp_path / 'coverage.npz')
+    cov.save(path)
+    loaded = CoverageIndex.load(path)
+    assert loaded.first_year == FIRST_YEAR and loaded.n_years == N_YEARS
+    assert np.array_equal(loaded.station_ids, cov.station_ids)
+    assert np.array_equal(loaded.presence(), mask)
+    ids, matrix = loaded.bitmap(1991, 1993)
+    sums = mask[:, 1:4].reshape(13, -1).sum(axis=1)
+    assert list(ids) == list(_ids(13)[np.argsort(-sums, kind='stable')][:int((sums > 0).sum())])
+    assert np.array_equal(matrix.sum(axis=1), np.sort(sums)[::-1][:len(ids)])
@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from ghcn_tools.daily import (DAILY_DTYPE, MISSING, download_station, fetch_stations, load_daily, load_daily_array,
+                              make_session, station_csv_path, station_npy_path)
+
+CSV = (
+    '"STATION","DATE","TMAX","TMAX_ATTRIBUTES","TMIN","TMIN_ATTRIBUTES"\n'
+    '"{sid}","2020-01-01","105",",,7,0700","-12",",,7,0700"\n'
+    '"{sid}","2020-01-02","","","-20",",,7,0700"\n'
+)
+
+
+def _serve(server, station_ids):
+    for sid in station_ids:
+        server.files[f'/{sid}.csv'] = CSV.format(sid=sid).encode()
+    return server.url('/{station_id}.csv')
+
+
+def _listing(cache_dir):
+    return sorted(os.listdir(cache_dir))
+
+
+def test_download_retries_transient_errors(http_server, tmp_path):
+    base_url = _serve(http_server, ['USW00003054'])
+    http_server.faults['/USW00003054.csv'] = [503, 'truncate']
+    size = download_station('USW00003054', str(tmp_path), base_url=base_url, backoff=0)
+    assert size == len(http_server.files['/USW00003054.csv'])
+    assert len(http_server.requests) == 3
+    assert _listing(tmp_path) == ['USW00003054.csv']
+    with open(tmp_path / 'USW00003054.csv', 'rb') as f:
+        assert f.read() == http_server.files['/USW00003054.csv']
+
+
+def test_failed_download_leaves_no_partial_file(http_server, tmp_path):
+    base_url = _serve(http_server, ['USW00003054'])
+    http_server.faults['/USW00003054.csv'] = ['truncate'] * 3
+    with pytest.raises(requests.exceptions.RequestException):
+        download_station('USW00003054', str(tmp_path), base_url=base_url, retries=2, backoff=0)
+    assert _listing(tmp_path) == []
+
+    # Client errors are not retried.
+    with pytest.raises(requests.exceptions.HTTPError):
+        download_station('USC00000000', str(tmp_path), base_url=base_url, backoff=0)
+    assert len(http_server.requests) == 4
+    assert _listing(tmp_path) == []
+
+
+def test_fetch_stations_on_thread_pool(http_server, tmp_path):
+    ids = [f'USC00{i:06d}' for i in range(20)]
+    base_url = _serve(http_server, ids)
+    http_server.faults[f'/{ids[0]}.csv'] = [500]
+    cache = str(tmp_path)
+
+    results = fetch_stations(ids + ['USC99999999', ids[1]], cache, max_workers=4, base_url=base_url, backoff=0)
+    assert results['USC99999999'] is None
+    assert all(results[sid] == os.path.join(cache, f'{sid}.csv') for sid in ids)
+    assert _listing(cache) == sorted(f'{sid}.csv' for sid in ids)
+    n_requests = len(http_server.requests)
+
+    # Cached stations are skipped; a shared session is accepted.
+    with make_session(4) as session:
+        results = fetch_stations(ids, cache, max_workers=4, session=session, base_url=base_url)
+    assert len(http_server.requests) == n_requests
+    assert all(path is not None for path in results.values())
+
+
+FULL_CSV = (
+    '"STATION","DATE","LATITUDE","TMAX","TMAX_ATTRIBUTES","TMIN","TMIN_ATTRIBUTES","TAVG","TAVG_ATTRIBUTES",'
+    '"PRCP","PRCP_ATTRIBUTES"\n'
+    '"X","1969-12-31","40.0","105",",,7,0700","-12","H,,7,0700","46",",,W","0","T,,7,0700"\n'
+    '"X","2020-01-02","40.0","","","-20",",I,7,0700","","","25",",,7"\n'
+)
+
+
+def test_daily_cache_round_trip(tmp_path):
+    cache = str(tmp_path)
+    with open(station_csv_path('X', cache), 'w') as f:
+        f.write(FULL_CSV)
+    arr = load_daily_array('X', cache)
+    assert arr.dtype == DAILY_DTYPE
+    assert arr['day'].tolist() == [-1, np.datetime64('2020-01-02').astype(int)]
+    assert arr['TMAX'].tolist() == [105, MISSING]
+    assert arr['TMIN'].tolist() == [-12, -20]
+    assert arr['TAVG'].tolist() == [46, MISSING]
+    assert arr['PRCP'].tolist() == [0, 25]
+    assert arr['TMIN_mflag'].tolist() == [b'H', b''] and arr['TMIN_qflag'].tolist() == [b'', b'I']
+    assert arr['TMAX_sflag'].tolist() == [b'7', b''] and arr['TAVG_sflag'].tolist() == [b'W', b'']
+    assert arr['PRCP_mflag'].tolist() == [b'T', b'']
+
+    df = load_daily('X', ('TMAX', 'TMIN'), cache)
+    assert df['DATE'].tolist() == list(pd.to_datetime(['1969-12-31', '2020-01-02']))
+    assert df['TMAX'].tolist()[0] == 105 and np.isnan(df['TMAX'].tolist()[1])
+    assert load_daily('X', 'TAVG', cache)['TAVG'].tolist() == [46]
+
+
+def test_daily_cache_missing_elements_and_rebuild(tmp_path):
+    cache = str(tmp_path)
+    csv_path = station_csv_path('X', cache)
+    with open(csv_path, 'w') as f:
+        f.write(CSV.format(sid='X'))
+    arr = load_daily_array('X', cache)
+    assert arr['TAVG'].tolist() == [MISSING, MISSING] and arr['PRCP'].tolist() == [MISSING, MISSING]
+    assert arr['TAVG_mflag'].tolist() == [b'', b'']
+    built = os.path.getmtime(station_npy_path('X', cache))
+
+    # An unchanged CSV is not reparsed, a newer one is.
+    load_daily_array('X', cache)
+    assert os.path.getmtime(station_npy_path('X', cache)) == built
+    with open(csv_path, 'w') as f:
+        f.write(FULL_CSV)
+    os.utime(csv_path, (built + 10, built + 10))
+    assert load_daily_array('X', cache)['PRCP'].tolist() == [0, 25]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ghcn_tools.dailyagg import aggregate_daily
+
+
+def _dly_line(station_id, year, month, element, values):
+    days = ''.join(f'{v:5d}   ' if v is not None else '-9999   ' for v in values)
+    return f'{station_id}{year:04d}{month:02d}{element}{days}'.ljust(269) + '\n'
+
+
+def _write(path, lines):
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    return str(path)
+
+
+@pytest.mark.parametrize('flush_rows', [1, 1 << 22])
+def test_overlapping_sources_do_not_double_count(tmp_path, flush_rows):
+    sid = 'USC00000001'
+    archive = _write(tmp_path / 'archive.dly', [_dly_line(sid, 2020, 1, 'TMAX', [100] * 31),
+                                               _dly_line(sid, 2020, 2, 'TMAX', [50] * 29 + [None, None])])
+    # Split over two chunks: both halves of the update replace the archive's January.
+    update = _write(tmp_path / 'update.dly', [_dly_line(sid, 2020, 1, 'TMAX', [200] * 15 + [None] * 16),
+                                             _dly_line(sid, 2020, 1, 'TMAX', [None] * 15 + [200] * 16)])
+
+    stores = aggregate_daily([archive] + [update] * 9, str(tmp_path / 'out'), elements=('TMAX',), min_days=20,
+                             chunk_bytes=270, flush_rows=flush_rows)
+    store = stores['TMAX']
+    days = np.load(str(tmp_path / 'out' / 'TMAX' / 'days.npy'))
+    assert days[0, 0, :2].tolist() == [31, 29]
+    # January comes from the last source that reports it, February from the archive.
+    assert store.value[0, 0, :2].tolist() == [2000, 500]
+
+
+def test_truncated_line_counts_only_complete_days(tmp_path):
+    line = _dly_line('USC00000001', 2020, 1, 'TMAX', [150] * 31)
+    source = _write(tmp_path / 'cut.dly', [line[:21 + 20 * 8 + 2] + '\n'])
+    aggregate_daily(source, str(tmp_path / 'out'), elements=('TMAX',), min_days=1)
+    days = np.load(str(tmp_path / 'out' / 'TMAX' / 'days.npy'))
+    value = np.load(str(tmp_path / 'out' / 'TMAX' / 'value.npy'))
+    assert days[0, 0, 0] == 20
+    assert value[0, 0, 0] == 1500
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from ghcn_tools.decode import MISSING, RECORD_WIDTH, annual_means, decode_buffer, decode_records
+
+RNG = np.random.default_rng(0)
+
+
+def _line(station_id, year, element, values):
+    fields = ''.join(f'{v:5d}{"E" if v % 3 == 0 else " "} Q' for v in values)
+    return f'{station_id}{year:04d}{element}{fields}'
+
+
+def _lines(n=40):
+    lines = []
+    for i in range(n):
+        values = RNG.integers(-3000, 3500, 12)
+        values[RNG.random(12) < 0.2] = MISSING
+        element = 'TAVG' if i % 4 else 'TMAX'
+        lines.append(_line(f'US{i % 7:09d}', 1990 + i // 7, element, values))
+    return lines
+
+
+def _reference(lines, element='TAVG'):
+    """The per-line loop of the notebooks; blank or cut-off value fields count as missing."""
+    out = []
+    for line in lines:
+        line = line.ljust(RECORD_WIDTH)
+        if line[15:19] != element:
+            continue
+        fields = [line[19 + m * 8:24 + m * 8] for m in range(12)]
+        values = [int(field) if field[-1].isdigit() else MISSING for field in fields]
+        out.append((line[0:11], int(line[11:15]), values))
+    return out
+
+
+def _check(records, expected):
+    assert records['station_id'].astype(str).tolist() == [sid for sid, _, _ in expected]
+    assert records['year'].tolist() == [year for _, year, _ in expected]
+    assert records['value'].tolist() == [values for _, _, values in expected]
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_strided_paths_match_line_loop(newline):
+    lines = _lines()
+    assert all(len(line) == RECORD_WIDTH for line in lines)
+    records = decode_buffer(newline.join(lines).encode() + newline.encode())
+    _check(records, _reference(lines))
+    assert set(records['element'].tolist()) == {b'TAVG'}
+    flagged = records['value'] % 3 == 0
+    assert (records['mflag'][flagged] == ord('E')).all() and (records['mflag'][~flagged] == ord(' ')).all()
+    assert (records['qflag'] == ord(' ')).all() and (records['sflag'] == ord('Q')).all()
+
+
+def test_ragged_lines_and_blank_fields_are_missing():
+    lines = _lines()
+    lines[1] = lines[1].rstrip() + '   '
+    lines[2] = lines[2][:19 + 5 * 8 + 3]  # cut off inside the sixth value
+    lines[3] = lines[3][:19 + 3 * 8] + ' ' * 5 + lines[3][19 + 3 * 8 + 5:]  # blank fourth value
+    buf = '\r\n'.join(lines[:10]) + '\n' + '\n'.join(lines[10:]) + '\n'
+    records = decode_buffer(buf.encode())
+    expected = _reference(lines)
+    _check(records, expected)
+    keys = [(sid, year) for sid, year, _ in expected]
+    cut = records['value'][keys.index((lines[2][:11], int(lines[2][11:15])))]
+    assert (cut[5:] == MISSING).all()
+    blank = records['value'][keys.index((lines[3][:11], int(lines[3][11:15])))]
+    assert blank[3] == MISSING
+
+
+def test_filters(tmp_path):
+    lines = _lines()
+    path = tmp_path / 'x.dat'
+    path.write_text('\n'.join(lines) + '\n')
+    wanted = ['US000000002', 'US000000005']
+    records = decode_records(str(path), 'TMAX', station_ids=wanted, start_year=1991, end_year=1994,
+                             chunk_bytes=300)
+    expected = [r for r in _reference(lines, 'TMAX') if r[0] in wanted and 1991 <= r[1] <= 1994]
+    assert expected
+    _check(records, expected)
+
+    records = decode_records(str(path), min_months=11)
+    expected = [r for r in _reference(lines) if sum(v != MISSING for v in r[2]) >= 11]
+    _check(records, expected)
+    np.testing.assert_allclose(annual_means(records),
+                               [np.mean([v for v in r[2] if v != MISSING]) / 100 for r in expected])
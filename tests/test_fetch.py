@@ -0,0 +1,96 @@
+import io
+import os
+import tarfile
+
+import pytest
+import requests
+
+from ghcn_tools.fetch import fetch, fetch_ghcnm
+
+PATH = '/ghcnm.tavg.latest.qcu.tar.gz'
+
+
+def _tarball(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _objects(cache_dir):
+    return sorted(os.listdir(os.path.join(cache_dir, 'objects')))
+
+
+def test_fetch_caches_and_revalidates(http_server, tmp_path):
+    cache = str(tmp_path / 'cache')
+    http_server.files[PATH] = b'x' * 100_000
+    url = http_server.url(PATH)
+
+    path = fetch(url, cache, chunk_size=4096)
+    with open(path, 'rb') as f:
+        assert f.read() == http_server.files[PATH]
+    assert len(http_server.requests) == 1
+
+    # Within max_age: no request at all.
+    assert fetch(url, cache) == path
+    assert len(http_server.requests) == 1
+
+    # Stale: conditional request answered with 304, same object.
+    assert fetch(url, cache, max_age=0) == path
+    assert len(http_server.requests) == 2
+    headers = http_server.requests[-1][1]
+    assert headers['If-None-Match'].startswith('"')
+    assert headers['If-Modified-Since']
+    assert _objects(cache) == [os.path.basename(path)]
+
+    # Offline runs use the cache and never touch the server.
+    assert fetch(url, cache, offline=True) == path
+    assert len(http_server.requests) == 2
+
+
+def test_fetch_new_version_gets_new_object(http_server, tmp_path):
+    cache = str(tmp_path / 'cache')
+    url = http_server.url(PATH)
+    http_server.files[PATH] = b'release 1'
+    first = fetch(url, cache)
+    http_server.files[PATH] = b'release 2'
+    second = fetch(url, cache, max_age=0)
+    assert first != second
+    with open(second, 'rb') as f:
+        assert f.read() == b'release 2'
+
+
+def test_interrupted_download_leaves_no_object(http_server, tmp_path):
+    cache = str(tmp_path / 'cache')
+    url = http_server.url(PATH)
+    http_server.files[PATH] = os.urandom(200_000)
+    http_server.faults[PATH] = ['truncate']
+
+    with pytest.raises(requests.exceptions.RequestException):
+        fetch(url, cache, chunk_size=4096)
+    assert _objects(cache) == []
+    assert not os.path.exists(os.path.join(cache, 'index.json'))
+    with pytest.raises(FileNotFoundError):
+        fetch(url, cache, offline=True)
+
+    path = fetch(url, cache)
+    with open(path, 'rb') as f:
+        assert f.read() == http_server.files[PATH]
+
+
+def test_fetch_ghcnm_extracts_members_once(http_server, tmp_path):
+    cache = str(tmp_path / 'cache')
+    http_server.files[PATH] = _tarball({
+        'ghcnm.v4/ghcnm.tavg.v4.qcu.dat': b'data\n',
+        'ghcnm.v4/ghcnm.tavg.v4.qcu.inv': b'inventory\n',
+        'ghcnm.v4/readme.txt': b'ignored\n',
+    })
+    dat, inv = fetch_ghcnm(http_server.url(PATH), cache)
+    with open(dat, 'rb') as f:
+        assert f.read() == b'data\n'
+    with open(inv, 'rb') as f:
+        assert f.read() == b'inventory\n'
+    assert fetch_ghcnm(http_server.url(PATH), cache, offline=True) == (dat, inv)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ghcn_tools.gridded import Grid, GriddedAggregator, latitude_bands, region_masks
+
+
+@pytest.mark.parametrize('cell_deg', [5.0, 2.5, 7.0])
+@pytest.mark.parametrize('equal_area', [False, True])
+def test_cell_areas_sum_to_one(cell_deg, equal_area):
+    grid = Grid(cell_deg, equal_area)
+    codes = np.arange(grid.n_cells)
+    assert grid.area(codes).sum() == pytest.approx(1.0, abs=1e-12)
+    lat, lon = grid.centers(codes)
+    assert np.array_equal(grid.cells(lat, lon), codes)
+    if equal_area:
+        area = grid.area(codes)
+        band_area = np.add.reduceat(area, grid.offsets[:-1])
+        np.testing.assert_allclose(band_area, 1 / grid.n_bands)
+
+
+def _stations(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.clip(rng.normal(35, 25, n), -89.9, 89.9)
+    lon = rng.uniform(-180, 180, n)
+    lat[:60] = rng.uniform(30, 45, 60)      # a dense cluster
+    lon[:60] = rng.uniform(-100, -85, 60)
+    lat[5] = np.nan
+    values = rng.normal(0, 1, (n, 24)) + np.where(np.arange(n) < 60, 2.0, 0.0)[:, None]
+    values[rng.random(values.shape) < 0.25] = np.nan
+    return lat, lon, values
+
+
+def _reference(grid, lat, lon, values, mask, min_stations):
+    """Cell means with pandas, then the area-weighted mean of the cells with enough stations."""
+    frame = pd.DataFrame(values[mask])
+    frame['cell'] = grid.cells(lat[mask], lon[mask])
+    frame = frame[frame['cell'] >= 0]
+    out = []
+    for t in range(values.shape[1]):
+        per_cell = frame.groupby('cell')[t].agg(['mean', 'count'])
+        per_cell = per_cell[per_cell['count'] >= min_stations]
+        w = grid.area(per_cell.index.to_numpy())
+        out.append(np.sum(w * per_cell['mean']) / w.sum() if len(per_cell) else np.nan)
+    return np.array(out)
+
+
+@pytest.mark.parametrize('equal_area', [False, True])
+@pytest.mark.parametrize('min_stations', [1, 2])
+def test_region_means_match_groupby(equal_area, min_stations):
+    lat, lon, values = _stations()
+    agg = GriddedAggregator(lat, lon, cell_deg=10.0, equal_area=equal_area)
+    rng = np.random.default_rng(1)
+    regions = {'global': np.ones(len(lat), dtype=bool), 'north': lat > 0, 'cluster': np.arange(len(lat)) < 60,
+               'none': np.zeros(len(lat), dtype=bool)}
+    for i in range(9):  # overlapping random regions: 13 in total, more than one packbits byte
+        regions[f'r{i}'] = rng.random(len(lat)) < 0.3
+    names, means = agg.region_means(values, regions, min_stations=min_stations)
+    assert names == list(regions)
+    for name, row in zip(names, means):
+        np.testing.assert_allclose(row, _reference(agg.grid, lat, lon, values, regions[name], min_stations),
+                                   rtol=1e-10, atol=1e-12)
+    assert np.isnan(means[names.index('none')]).all()
+
+    frame = agg.region_frame(values, np.arange(2000, 2024), regions, min_stations)
+    assert list(frame.columns) == names and np.array_equal(frame.to_numpy().T, means, equal_nan=True)
+
+
+def test_cell_means_and_min_stations():
+    lat = np.array([10.0, 11.0, 12.0, -40.0, np.nan])
+    lon = np.array([20.0, 21.0, 22.0, 100.0, 0.0])
+    values = np.array([[1.0, 2.0], [3.0, np.nan], [5.0, np.nan], [7.0, 8.0], [9.0, 9.0]])
+    agg = GriddedAggregator(lat, lon, cell_deg=5.0)
+    cells, means = agg.cell_means(values)
+    assert list(cells) == sorted(set(agg.grid.cells(lat[:4], lon[:4])))
+    assert means.tolist() == [[7.0, 8.0], [3.0, 2.0]]
+    cells, means = agg.cell_means(values, min_stations=2)
+    assert np.array_equal(means, [[np.nan, np.nan], [3.0, np.nan]], equal_nan=True)
+
+    names, glob = agg.region_means(values, min_stations=2)
+    assert names == ['global'] and np.array_equal(glob, [[3.0, np.nan]], equal_nan=True)
+    names, glob = agg.region_means(values)
+    w = agg.grid.area(cells)
+    np.testing.assert_allclose(glob[0], (w[:, None] * [[7.0, 8.0], [3.0, 2.0]]).sum(axis=0) / w.sum())
+
+
+def test_region_labels():
+    labels = latitude_bands([-90, -45, 0, 10, 89.9, 90, np.nan])
+    assert labels.tolist() == ['90S-60S', '60S-30S', '0-30N', '0-30N', '60N-90N', '60N-90N', None]
+    masks = region_masks(labels)
+    assert list(masks) == ['0-30N', '60N-90N', '60S-30S', '90S-60S']
+    assert masks['0-30N'].tolist() == [False, False, True, True, False, False, False]
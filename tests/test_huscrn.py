@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from ghcn_tools import huscrn
+from ghcn_tools.huscrn import STATION_PAIRS, get_station_data, monthly_means, process_pairs
+
+
+def test_monthly_means_keeps_empty_months():
+    dates = pd.to_datetime(['2020-01-01', '2020-01-02', '2020-04-30'])
+    monthly = monthly_means(pd.Series([1.0, 3.0, 5.0], index=pd.Index(dates, name='DATE')))
+    assert monthly.index.tolist() == list(pd.to_datetime(['2020-01-31', '2020-02-29', '2020-03-31', '2020-04-30']))
+    assert monthly.index.name == 'DATE'
+    np.testing.assert_array_equal(monthly.to_numpy(), [2.0, np.nan, np.nan, 5.0])
+
+
+def test_offline_never_downloads(tmp_path, monkeypatch):
+    def download_station(*args, **kwargs):
+        raise AssertionError("offline run tried to download")
+
+    monkeypatch.setattr(huscrn, 'download_station', download_station)
+    assert get_station_data('USC00000001', cache_dir=str(tmp_path), offline=True) is None
+    results = process_pairs(STATION_PAIRS[:2], cache_dir=str(tmp_path), offline=True)
+    assert results['strict'] == [] and results['inclusive'] == []
+    assert len(results['dropped']) == 2
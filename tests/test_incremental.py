@@ -0,0 +1,59 @@
+import numpy as np
+
+from ghcn_tools.anomaly import ensemble_mean
+from ghcn_tools.incremental import full_anomalies, pad_years, refresh_anomalies, refresh_ensemble, update_store
+from ghcn_tools.store import FLAG_NAMES, ingest_qcu
+
+
+def _ghcnm_lines(n_stations, first_year, last_year, seed):
+    """TAVG records of stations starting between first_year and 2000, with some missing months."""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(n_stations):
+        for year in range(int(rng.integers(first_year, 2001)), last_year + 1):
+            values = rng.integers(-2000, 3000, 12)
+            values[rng.random(12) < 0.05] = -9999
+            fields = ''.join(f'{v:5d}  ' + (' ' if v == -9999 else 'G') for v in values)
+            lines.append(f'USC{i:08d}{year}TAVG{fields}\n'.encode())
+    return lines
+
+
+def _release(tmp_path, lines, name):
+    path = str(tmp_path / name)
+    with open(path, 'wb') as f:
+        f.writelines(lines)
+    return path
+
+
+def test_update_grows_year_axis(tmp_path):
+    lines = _ghcnm_lines(30, 1985, 2022, seed=1)
+    old_lines = [line for line in lines if 1995 <= int(line[11:15]) <= 2020]
+    # Only stations of the old release, a new station would force a full re-ingest.
+    stations = {line[:11] for line in old_lines}
+    full = _release(tmp_path, [line for line in lines if line[:11] in stations], 'new.dat')
+    first_year = min(int(line[11:15]) for line in lines if line[:11] in stations)
+    store_dir = str(tmp_path / 'store')
+    store = ingest_qcu(_release(tmp_path, old_lines, 'old.dat'), store_dir)
+    anoms, clim = full_anomalies(store, 1995, 2010)
+    mean, count = ensemble_mean(anoms)
+
+    store, report = update_store(store_dir, full)
+    assert not report.attrs['rebuilt'] and first_year < 1995
+    assert report.attrs['years_added'] == (1995 - first_year, 2)
+    assert (store.first_year, store.last_year) == (first_year, 2022)
+    assert set(report['change']) == {'added'}
+    assert set(report['year']) == set(range(first_year, 1995)) | {2021, 2022}
+
+    expected = ingest_qcu(full, str(tmp_path / 'expected'))
+    for name in ('value',) + FLAG_NAMES:
+        np.testing.assert_array_equal(getattr(store, name), getattr(expected, name))
+
+    anoms, mean = pad_years(anoms, report), pad_years(mean, report, axis=0)
+    count = pad_years(count, report, axis=0, fill=0)
+    _, years = refresh_anomalies(store, anoms, clim, report, 1995, 2010)
+    refresh_ensemble(anoms, mean, count, years)
+    full_anoms, _ = full_anomalies(store, 1995, 2010)
+    np.testing.assert_allclose(anoms, full_anoms)
+    full_mean, full_count = ensemble_mean(full_anoms)
+    np.testing.assert_allclose(mean, full_mean)
+    np.testing.assert_array_equal(count, full_count)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from statsmodels.nonparametric.smoothers_lowess import lowess as sm_lowess
+
+from ghcn_tools import loess
+from ghcn_tools.loess import clear_cache, lowess, lowess_batch
+
+
+def _series(n=120, n_series=6, seed=0, ties=False):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=float) if not ties else np.repeat(np.arange(n // 3, dtype=float), 3)
+    x = rng.permutation(x)
+    Y = np.sin(x / 9)[None, :] + 0.02 * x[None, :] + rng.normal(0, 0.4, (n_series, n))
+    Y[:, rng.random(n) < 0.05] += 4  # outliers for the robustifying iterations
+    return Y, x
+
+
+def _statsmodels(y, x, frac, it):
+    keep = ~np.isnan(y)
+    fitted = sm_lowess(y[keep], x[keep], frac=frac, it=it, delta=0.0, return_sorted=False)
+    out = np.full(len(y), np.nan)
+    out[keep] = fitted
+    return out
+
+
+@pytest.mark.parametrize('frac, it', [(0.1, 0), (0.3, 3), (2 / 3, 1), (1.0, 3)])
+@pytest.mark.parametrize('ties', [False, True])
+def test_matches_statsmodels(frac, it, ties):
+    Y, x = _series(ties=ties)
+    rng = np.random.default_rng(1)
+    # Two gap patterns shared by several rows each, plus a complete row.
+    gaps = [rng.random(len(x)) < 0.15, rng.random(len(x)) < 0.3]
+    for row in range(1, len(Y)):
+        Y[row, gaps[row % 2]] = np.nan
+    got = lowess_batch(Y, x, frac=frac, it=it, cache=False)
+    expected = np.vstack([_statsmodels(y, x, frac, it) for y in Y])
+    np.testing.assert_array_equal(np.isnan(got), np.isnan(Y))
+    np.testing.assert_allclose(got, expected, rtol=1e-10, atol=1e-10)
+
+
+def test_lowess_wrapper_matches_statsmodels():
+    Y, x = _series(n_series=1)
+    y = Y[0]
+    y[::11] = np.nan
+    keep = ~np.isnan(y)
+    expected = sm_lowess(y, x, frac=0.2, it=3, delta=0.0, missing='drop')
+    np.testing.assert_allclose(lowess(y, x, frac=0.2, it=3, cache=False), expected, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(lowess(y, x, frac=0.2, it=3, return_sorted=False, cache=False)[keep],
+                               _statsmodels(y, x, 0.2, 3)[keep], rtol=1e-10, atol=1e-10)
+
+
+def test_repeated_call_hits_memo(monkeypatch, tmp_path):
+    clear_cache()
+    Y, x = _series()
+    first = lowess_batch(Y, x, frac=0.2, cache_dir=str(tmp_path))
+
+    def fail(*args):
+        raise AssertionError("recomputed a memoized result")
+
+    monkeypatch.setattr(loess, '_lowess_block', fail)
+    assert lowess_batch(Y, x, frac=0.2) is first
+    clear_cache()
+    np.testing.assert_array_equal(lowess_batch(Y, x, frac=0.2, cache_dir=str(tmp_path)), first)
+    with pytest.raises(AssertionError):
+        lowess_batch(Y, x, frac=0.25)
+
+
+def test_workers_match_single_process():
+    Y, x = _series(n_series=9)
+    Y[::2, :10] = np.nan
+    single = lowess_batch(Y, x, frac=0.2, workers=1, cache=False)
+    pooled = lowess_batch(Y, x, frac=0.2, workers=3, cache=False)
+    np.testing.assert_array_equal(pooled, single)
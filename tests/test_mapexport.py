@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.mapexport import export_station_map, simplify_attributes
+
+STATIONS = pd.DataFrame({
+    'station_id': ['USC00000001', 'USC00000002', 'USC00000003'],
+    'latitude': [40.123456, 41.0, 42.0],
+    'longitude': [-100.0, -101.0, -102.0],
+    'name': ['PLAIN', '</script><script>alert(1)</script>', 'A & B'],
+    'urbanization_bin': ['rural', np.nan, 'urban'],
+})
+
+
+def test_missing_category_gets_unknown_label():
+    table, labels = simplify_attributes(STATIONS, 'urbanization_bin', ('station_id',))
+    assert labels == ['rural', 'urban', 'unknown']
+    assert table['cat'].tolist() == [0, 2, 1]
+    assert table['lat'].tolist()[0] == 40.1235
+
+
+def test_export_escapes_attributes(tmp_path):
+    path = str(tmp_path / 'map.html')
+    export_station_map(STATIONS, path, category='urbanization_bin', popup_columns=('station_id', 'name'),
+                       title='Urbanization <2020>')
+    with open(path) as f:
+        page = f.read()
+    assert '<script>alert(1)' not in page
+    assert '<b>Urbanization &lt;2020&gt;</b><div>' in page
+    assert 'textContent' in page
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import linregress
+
+from ghcn_tools.metadata import METADATA_CSV, derive_trends, endpoint_change, lsq_lines, update_metadata_csv
+
+SHIPPED_CSV = os.path.join(os.path.dirname(__file__), '..', METADATA_CSV)
+BI_YEARS = [2012, 2017, 2020, 2023]
+
+
+def test_lsq_lines_match_linregress_with_missing_years():
+    rng = np.random.default_rng(3)
+    years = np.array([1975, 1990, 2000, 2014, 2020])
+    values = rng.normal(size=(200, len(years))) * 5 + np.arange(len(years))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    slope, intercept, n = lsq_lines(values, years)
+
+    assert np.array_equal(n, (~np.isnan(values)).sum(axis=1))
+    for row in range(len(values)):
+        ok = ~np.isnan(values[row])
+        if ok.sum() < 2:
+            assert np.isnan(slope[row]) and np.isnan(intercept[row])
+            continue
+        ref = linregress(years[ok], values[row, ok])
+        assert slope[row] == pytest.approx(ref.slope, rel=1e-9, abs=1e-12)
+        assert intercept[row] == pytest.approx(ref.intercept, rel=1e-9, abs=1e-9)
+
+    slope3, _, _ = lsq_lines(values, years, min_points=3)
+    assert np.all(np.isnan(slope3[n < 3]))
+    assert np.array_equal(slope3[n >= 3], slope[n >= 3])
+
+
+def test_endpoint_change_uses_first_and_last_available_year():
+    values = np.array([[1.0, 2.0, 4.0], [np.nan, 2.0, 5.0], [3.0, np.nan, np.nan], [np.nan] * 3])
+    change = endpoint_change(values, [2000, 2010, 2020])
+    assert change[0] == pytest.approx(1.5)
+    assert change[1] == pytest.approx(3.0)
+    assert np.isnan(change[2]) and np.isnan(change[3])
+
+
+def test_reproduces_shipped_bi_columns():
+    shipped = pd.read_csv(SHIPPED_CSV)
+    values = shipped[[f'BI_{y}' for y in BI_YEARS]].to_numpy(dtype=np.float64)
+    slope, intercept, _ = lsq_lines(values, BI_YEARS)
+    # The notebook rounded linregress results to 2 decimals; the unrounded fits lie within
+    # half a unit of the stored values (ties such as 0.045 may round either way).
+    assert np.abs(slope - shipped['BI_trend_lsq']).max() <= 0.005 + 1e-8
+    assert np.abs(intercept + slope * 2020 - shipped['BI_2020_lsq']).max() <= 0.005 + 1e-8
+
+    derived = derive_trends(shipped.copy(), 'BI', 'BI_')
+    assert np.array_equal(derived['BI_change_decade'], shipped['BI_change_decade'])
+    for col in ['BI_2020_lsq', 'BI_trend_lsq']:
+        assert np.abs(derived[col] - shipped[col]).max() <= 0.01 + 1e-8
+        assert (derived[col] == shipped[col]).mean() > 0.99
+
+
+def test_update_metadata_csv_drops_duplicates(tmp_path):
+    df = pd.DataFrame({'ID': ['A', 'B', 'A'], 'BI_2012': [1.0, 2.0, 3.0], 'BI_2020': [2.0, np.nan, 7.0],
+                       'Built_1975_10km_percent': [1.0, 1.0, 1.0], 'Built_2020_10km_percent': [2.0, 4.5, 1.0]})
+    path = tmp_path / 'meta.csv'
+    df.to_csv(path, index=False)
+    out = update_metadata_csv(str(path))
+    assert list(out['ID']) == ['B', 'A']
+    assert out['BI_trend_lsq'].isna().tolist() == [True, False]
+    assert out['BI_trend_lsq'].iloc[1] == 0.5
+    assert list(out['Built_10km_trend_lsq']) == [0.08, 0.0]
+    assert pd.read_csv(path).equals(out.reset_index(drop=True))
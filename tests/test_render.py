@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from ghcn_tools.huscrn import comparison_panels
+from ghcn_tools.loess import lowess_batch
+from ghcn_tools.render import RENDERERS, render_jobs
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+
+def _sweep_frames(empty_bin=None):
+    years = np.arange(1950, 2021)
+    rng = np.random.default_rng(0)
+    rows, trends = [], [('all', np.nan, np.nan, 40, 0.2)]
+    for group in ['all', '0', '1', '2']:
+        anomaly = rng.normal(0, 0.3, len(years)) + (years - 1950) * 0.01
+        loess = np.full(len(years), np.nan) if group == empty_bin else lowess_batch(anomaly, years, frac=0.3)
+        rows.append(pd.DataFrame({'group': group, 'year': years, 'anomaly': anomaly, 'loess': loess,
+                                  'n_stations': 10}))
+        if group != 'all':
+            trends.append((group, int(group) * 5.0, int(group) * 5.0 + 5, 10, 0.1 * (int(group) + 1)))
+    trends = pd.DataFrame(trends, columns=['group', 'bin_low', 'bin_high', 'n_stations', 'trend_per_decade'])
+    return pd.concat(rows, ignore_index=True), trends
+
+
+def _pair_results():
+    dates = pd.date_range('1950-01-01', '2020-12-01', freq='MS')
+    rng = np.random.default_rng(1)
+    monthly = pd.Series(rng.normal(0, 1, len(dates)), index=dates)
+    monthly.iloc[100:130] = np.nan
+    annual = monthly.resample('YS').mean()
+    info = [{'name': 'A / B', 'state': 'TX', 'strict_qualified': True, 'inclusive_qualified': True},
+            {'name': 'C / D', 'state': 'NM', 'strict_qualified': False, 'inclusive_qualified': True}]
+    results = {'inclusive': [{}, {}], 'strict': [{}], 'dropped': [], 'pair_info': info}
+    return results, {'inclusive': (monthly, annual), 'strict': (monthly, annual)}
+
+
+def test_comparison_panels_are_precomputed():
+    results, ensembles = _pair_results()
+    panels = comparison_panels(results, ensembles)
+    monthly = ensembles['strict'][0].dropna()
+    frac = min(0.1, max(0.02, 120 / len(monthly)))
+    smooth = lowess_batch(monthly.to_numpy(), np.arange(len(monthly)), frac=frac, it=3)
+    np.testing.assert_array_equal(panels['monthly_loess'], smooth)
+    title = next(iter(panels['annual']))
+    assert title.startswith('INCLUSIVE Approach: 2 Station Pairs')
+    rolling = ensembles['inclusive'][1].rolling(10, center=True, min_periods=5).mean()
+    pd.testing.assert_series_equal(panels['annual_mean'][title], rolling)
+    assert panels['stats'][title] == f"Recent 10yr: {ensembles['inclusive'][1].tail(10).mean():+.2f}°C"
+    assert 'Strict Approach (1 pairs): TX' in panels['footnote']
+    assert 'Inclusive Approach (2 pairs): TX, NM' in panels['footnote']
+
+
+def test_render_jobs_writes_every_renderer(tmp_path):
+    ensemble, trends = _sweep_frames()
+    empty_ensemble, _ = _sweep_frames(empty_bin='2')
+    only_empty = _sweep_frames(empty_bin='1')[0].query("group != '2'")
+    results, ensembles = _pair_results()
+    stations = pd.DataFrame({'longitude': [-100.0, -90.5, 10.0], 'latitude': [35.0, 40.2, 50.0],
+                             'bin': ['0', '1', '1']})
+    jobs = [
+        ('loess', 'loess_by_bins', dict(ensemble=ensemble, trends=trends)),
+        ('stripes', 'stripes_by_bins', dict(ensemble=ensemble, trends=trends, footer='synthetic')),
+        ('stripes_empty_bin', 'stripes_by_bins', dict(ensemble=empty_ensemble, trends=trends)),
+        ('stripes_all_empty', 'stripes_by_bins', dict(ensemble=only_empty)),
+        ('stripes_no_bins', 'stripes_by_bins', dict(ensemble=ensemble[ensemble['group'] == 'all'])),
+        ('map', 'station_map', dict(stations=stations, group_column='bin', cache_dir=str(tmp_path / 'basemap'))),
+        ('panels', 'ensemble_panels', comparison_panels(results, ensembles)),
+        ('panels_no_inclusive', 'ensemble_panels',
+         dict(annual={'INCLUSIVE': None, 'STRICT': ensembles['strict'][1]})),
+    ]
+    assert {renderer for _, renderer, _ in jobs} == set(RENDERERS)
+    written = render_jobs(jobs, str(tmp_path / 'figures'), workers=2)
+    assert set(written) == {name for name, _, _ in jobs}
+    for name, paths in written.items():
+        assert paths == [str(tmp_path / 'figures' / f'{name}.png')]
+        with open(paths[0], 'rb') as f:
+            assert f.read(8) == PNG_MAGIC
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from ghcn_tools.spatial import discover_pairs
+
+KM_PER_DEG_LAT = 111.195
+
+
+def _stations(offsets_km):
+    return pd.DataFrame({
+        'station_id': list(offsets_km),
+        'latitude': [40.0 + km / KM_PER_DEG_LAT for km in offsets_km.values()],
+        'longitude': -100.0,
+        'elevation': 100.0,
+    })
+
+
+def test_discover_pairs_reassigns_taken_candidate():
+    # R1 has L1 at 5 km and L2 at 10 km; R2 has L2 at 12 km (and L1 at 27 km).
+    stations = _stations({'R1': 0.0, 'L1': 5.0, 'L2': -10.0, 'R2': -22.0})
+    pairs = discover_pairs(stations, ['R1', 'R2'], max_km=50)
+    assert list(zip(pairs['reference_id'], pairs['legacy_id'])) == [('R1', 'L1'), ('R2', 'L2')]
+    assert pairs['distance_km'].round(1).tolist() == [5.0, 12.0]
+
+
+def test_discover_pairs_non_unique_shares_legacy():
+    stations = _stations({'R1': 0.0, 'L1': 5.0, 'R2': 12.0})
+    pairs = discover_pairs(stations, ['R1', 'R2'], max_km=50, unique=False)
+    assert sorted(pairs['reference_id']) == ['R1', 'R2']
+    assert set(pairs['legacy_id']) == {'L1'}
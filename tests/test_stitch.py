@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ghcn_tools.huscrn import stitch_station_data
+from ghcn_tools.stitch import overlap_stats, pair_rows, stitch_pairs
+
+DATES = pd.date_range('2000-01-01', periods=400, freq='D')
+
+
+def _daily(seed, start, stop, gaps=0.2):
+    """A GHCN-Daily style frame (DATE, TMAX in tenths of °C) for DATES[start:stop] with dropped days."""
+    rng = np.random.default_rng(seed)
+    dates = DATES[start:stop]
+    keep = rng.random(len(dates)) > gaps
+    return pd.DataFrame({'DATE': dates[keep], 'TMAX': rng.integers(-100, 350, keep.sum()).astype(float)})
+
+
+def _array(frames):
+    """(stations, days) °C array on DATES."""
+    return np.stack([f.set_index('DATE')['TMAX'].reindex(DATES).to_numpy() / 10 for f in frames])
+
+
+def test_cutover_matches_stitch_station_data():
+    pairs = [(_daily(0, 0, 300), _daily(1, 150, 400)),
+             (_daily(2, 50, 200), _daily(3, 100, 399, gaps=0.5)),
+             (_daily(4, 0, 400), _daily(5, 0, 0)),
+             (_daily(6, 200, 300), _daily(7, 20, 380))]
+    values = _array([f for pair in pairs for f in pair])
+    out, stats = stitch_pairs(values, np.arange(0, 8, 2), np.arange(1, 8, 2), method='cutover')
+    for i, (legacy, uscrn) in enumerate(pairs):
+        ref = stitch_station_data(legacy, uscrn, 'TMAX')['TMAX'].reindex(DATES).to_numpy()
+        np.testing.assert_array_equal(out[i], ref)
+        first = uscrn['DATE'].min()
+        assert stats['cutover'][i] == (-1 if uscrn.empty else DATES.get_loc(first))
+    assert (stats['offset'] == 0).all()
+
+
+def _notebook_average(legacy, uscrn):
+    """The year loop of HUSCRN.ipynb: mean of whichever station reports."""
+    df_legacy = pd.Series(legacy).dropna()
+    df_uscrn = pd.Series(uscrn).dropna()
+    combined = {}
+    for y in sorted(set(df_legacy.index).union(df_uscrn.index)):
+        temps = []
+        if y in df_legacy.index:
+            temps.append(df_legacy.loc[y])
+        if y in df_uscrn.index:
+            temps.append(df_uscrn.loc[y])
+        if temps:
+            combined[y] = np.mean(temps)
+    return combined
+
+
+def test_average_matches_notebook_year_loop():
+    rng = np.random.default_rng(8)
+    values = rng.normal(10, 3, (6, 60))
+    values[rng.random(values.shape) < 0.35] = np.nan
+    values[5] = np.nan
+    legacy_rows, uscrn_rows = np.array([0, 2, 4, 1]), np.array([1, 3, 5, -1])
+    out, _ = stitch_pairs(values, legacy_rows, uscrn_rows, method='average')
+    for i, (lr, ur) in enumerate(zip(legacy_rows, uscrn_rows)):
+        uscrn = values[ur] if ur >= 0 else np.full(60, np.nan)
+        ref = _notebook_average(values[lr], uscrn)
+        assert set(np.flatnonzero(~np.isnan(out[i]))) == set(ref)
+        for y, v in ref.items():
+            assert out[i, y] == pytest.approx(v, rel=1e-12)
+
+
+def test_offset_shifts_legacy_by_overlap_mean():
+    rng = np.random.default_rng(9)
+    values = rng.normal(15, 2, (6, 50))
+    values[1, :30] = np.nan          # pair 0: overlap 30-49
+    values[2, 45:] = np.nan          # pair 1: overlap 40-44 (5 values)
+    values[3, :40] = np.nan
+    values[5, :] = np.nan            # pair 2: legacy only
+    legacy_rows, uscrn_rows = np.array([0, 2, 4]), np.array([1, 3, 5])
+
+    out, stats = stitch_pairs(values, legacy_rows, uscrn_rows, method='offset', min_overlap=6)
+    for i, (lr, ur) in enumerate(zip(legacy_rows, uscrn_rows)):
+        both = ~np.isnan(values[lr]) & ~np.isnan(values[ur])
+        mean_diff = np.mean(values[ur, both] - values[lr, both]) if both.any() else np.nan
+        assert stats['n_overlap'][i] == both.sum()
+        np.testing.assert_allclose(stats['mean_diff'][i], mean_diff, rtol=1e-12)
+        expected = mean_diff if both.sum() >= 6 else 0.0
+        assert stats['offset'][i] == pytest.approx(expected, rel=1e-12, abs=0)
+        cut = stats['cutover'][i]
+        end = cut if cut >= 0 else 50
+        np.testing.assert_allclose(out[i, :end], values[lr, :end] + expected, rtol=1e-12)
+        np.testing.assert_array_equal(out[i, end:], values[ur, end:])
+
+    _, stats = stitch_pairs(values, legacy_rows, uscrn_rows, method='offset', min_overlap=5)
+    assert stats['offset'][1] == pytest.approx(stats['mean_diff'][1])
+
+
+def test_overlap_stats_match_pandas_and_nan_for_short_overlaps():
+    rng = np.random.default_rng(10)
+    legacy = rng.normal(0, 1, (5, 40))
+    uscrn = legacy * 0.8 + rng.normal(0.5, 0.3, (5, 40))
+    uscrn[1, 1:] = np.nan           # one overlapping value
+    uscrn[2, 2:] = np.nan           # two
+    legacy[3, :] = np.nan           # none
+    stats = overlap_stats(legacy, uscrn)
+    for i in (0, 4):
+        diff = pd.Series(uscrn[i] - legacy[i])
+        assert stats['mean_diff'][i] == pytest.approx(diff.mean())
+        assert stats['std_diff'][i] == pytest.approx(diff.std())
+        assert stats['correlation'][i] == pytest.approx(pd.Series(legacy[i]).corr(pd.Series(uscrn[i])))
+    assert list(stats['n_overlap']) == [40, 1, 2, 0, 40]
+    assert np.isnan(stats['std_diff'][1]) and np.isnan(stats['correlation'][1])
+    assert np.isfinite(stats['std_diff'][2]) and np.isnan(stats['correlation'][2])
+    assert stats[['mean_diff', 'std_diff', 'correlation']].iloc[3].isna().all()
+
+    values = np.vstack([legacy, uscrn])
+    pairs = [{'legacy_id': 'L0', 'uscrn_id': 'U0'}, {'legacy_id': 'L1', 'uscrn_id': 'XX'},
+             {'legacy_id': 'XX', 'uscrn_id': 'U1'}]
+    legacy_rows, uscrn_rows = pair_rows(pairs, [f'L{i}' for i in range(5)] + [f'U{i}' for i in range(5)])
+    assert list(legacy_rows) == [0, 1, -1] and list(uscrn_rows) == [5, -1, 6]
+    out, stats = stitch_pairs(values, legacy_rows, uscrn_rows, method='offset')
+    assert stats['n_overlap'].tolist() == [40, 0, 0]
+    assert stats.loc[1:, ['mean_diff', 'std_diff', 'correlation']].isna().all().all()
+    assert stats['offset'].tolist()[1:] == [0.0, 0.0]
+    np.testing.assert_array_equal(out[1], legacy[1])
+    np.testing.assert_array_equal(out[2], uscrn[1])
@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ghcn_tools.decode import MISSING
+from ghcn_tools.inventory import read_station_inventory
+from ghcn_tools.store import analyze_station_data, ensure_store, ingest_qcu
+from ghcn_tools.synthetic import synthetic_stations, write_ghcnm
+
+STATIONS = ['CA000000001', 'US000000001', 'US000000002', 'USW00000003']
+
+
+def _write_dat(path, seed=0, first_year=1950, last_year=1979):
+    """Random TAVG records with missing months and years; returns {(station, year): values}."""
+    rng = np.random.default_rng(seed)
+    records = {}
+    with open(path, 'w') as f:
+        for sid in STATIONS:
+            for year in range(first_year, last_year + 1):
+                if rng.random() < 0.2:
+                    continue
+                values = rng.integers(-2500, 3500, 12)
+                values[rng.random(12) < 0.1] = MISSING
+                records[sid, year] = values
+                fields = ''.join(f'{v:5d}  E' for v in values)
+                f.write(f'{sid}{year}TAVG{fields}\n')
+            f.write(f'{sid}{first_year}TMAX' + '  100   ' * 12 + '\n')
+    return records
+
+
+def _dense(records, station_ids, years):
+    out = np.full((len(station_ids), len(years), 12), MISSING, dtype=np.int16)
+    for i, sid in enumerate(station_ids):
+        for j, year in enumerate(years):
+            if (sid, year) in records:
+                out[i, j] = records[sid, year]
+    return out
+
+
+def test_ingest_and_select_match_records(tmp_path):
+    dat = str(tmp_path / 'x.dat')
+    records = _write_dat(dat)
+    store = ingest_qcu(dat, str(tmp_path / 'store'))
+    assert store.station_ids.astype(str).tolist() == STATIONS
+    assert (store.first_year, store.last_year) == (1950, 1979)
+    assert store.meta['n_records'] == len(records)
+
+    block = store.select()
+    np.testing.assert_array_equal(block.value, _dense(records, STATIONS, range(1950, 1980)))
+
+    block = store.select(station_ids=['US000000002', 'XX000000000', 'CA000000001'], start_year=1960, end_year=1965)
+    assert block.station_ids.tolist() == ['CA000000001', 'US000000002']
+    assert block.years.tolist() == list(range(1960, 1966))
+    np.testing.assert_array_equal(block.value, _dense(records, block.station_ids, block.years))
+
+    block = store.select(country_codes=['US'], start_year=1900, end_year=1955, flags=True)
+    assert block.station_ids.tolist() == STATIONS[1:]
+    assert block.years.tolist() == list(range(1950, 1956))
+    np.testing.assert_array_equal(block.value, _dense(records, block.station_ids, block.years))
+    assert (block.mflag[block.mask] == ord(' ')).all() and (block.sflag[block.mask] == ord('E')).all()
+    np.testing.assert_allclose(block.celsius()[block.mask], block.value[block.mask] / 100, rtol=1e-6)
+    assert np.isnan(block.celsius()[~block.mask]).all()
+
+    long = block.to_long()
+    assert len(long) == block.mask.sum()
+    assert set(long['month']) <= set(range(1, 13))
+
+
+def test_ensure_store_rebuilds_only_on_new_source(tmp_path, capsys):
+    dat, store_dir = str(tmp_path / 'x.dat'), str(tmp_path / 'store')
+    _write_dat(dat)
+    first = ensure_store(dat, store_dir)
+    assert 'Ingested' in capsys.readouterr().out
+    mtime = os.path.getmtime(os.path.join(store_dir, 'value.npy'))
+
+    again = ensure_store(dat, store_dir)
+    assert 'Ingested' not in capsys.readouterr().out
+    assert os.path.getmtime(os.path.join(store_dir, 'value.npy')) == mtime
+    np.testing.assert_array_equal(again.value, first.value)
+
+    records = _write_dat(dat, seed=1, last_year=1985)
+    rebuilt = ensure_store(dat, store_dir)
+    assert 'another file' in capsys.readouterr().out
+    assert rebuilt.last_year == 1985
+    np.testing.assert_array_equal(rebuilt.value, _dense(records, STATIONS, range(1950, 1986)))
+
+
+def _notebook_analyze(file_path, station_file_path, start_year, end_year, lat_min=None, lat_max=None,
+                      country_codes=None, max_pct_missing=0, all_years=False):
+    """analyze_station_data of Plot_T_anomalies_GHCN.ipynb (all_years: GHCN_US-vs-global.ipynb's rule)."""
+    stations = read_station_inventory(station_file_path)
+    if lat_min is not None:
+        stations = stations[stations['latitude'] >= lat_min]
+    if lat_max is not None:
+        stations = stations[stations['latitude'] <= lat_max]
+    if country_codes is not None:
+        stations = stations[stations['country_code'].isin(country_codes)]
+    colspecs = [(0, 11), (11, 15), (15, 19)]
+    columns = ['station_id', 'year', 'element']
+    for i in range(12):
+        start = 19 + i * 8
+        colspecs.extend([(start, start + 5), (start + 5, start + 6), (start + 6, start + 7), (start + 7, start + 8)])
+        columns.extend([f'value_{i + 1}', f'mflag_{i + 1}', f'qflag_{i + 1}', f'sflag_{i + 1}'])
+    chunk = pd.read_fwf(file_path, colspecs=colspecs, header=None, names=columns)
+    chunk = chunk[chunk['element'] == 'TAVG']
+    chunk = chunk[chunk['station_id'].isin(stations['station_id'])]
+    value_cols = [f'value_{i}' for i in range(1, 13)]
+    chunk[value_cols] = chunk[value_cols].replace(-9999, np.nan)
+    chunk = chunk[(chunk['year'] >= start_year) & (chunk['year'] <= end_year)]
+    data = chunk.melt(id_vars=['station_id', 'year'], value_vars=value_cols, var_name='month', value_name='tavg')
+    data['month'] = data['month'].str.extract(r'value_(\d+)', expand=False).astype(int)
+    data = data.dropna(subset=['tavg'])
+    if all_years:
+        n_years = data.groupby('station_id')['year'].nunique()
+        valid = n_years.index[n_years == end_year - start_year + 1]
+    else:
+        observed = data.groupby('station_id').size()
+        valid = observed.index[1 - observed / ((end_year - start_year + 1) * 12) <= max_pct_missing]
+    data = data[data['station_id'].isin(valid)]
+    return data.merge(stations[['station_id', 'latitude', 'longitude', 'elevation', 'name', 'country_code']],
+                      on='station_id', how='left')
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(start_year=1950, end_year=2000, max_pct_missing=0.1),
+    dict(start_year=1900, end_year=2020, max_pct_missing=0.5, lat_min=20, lat_max=60),
+    dict(start_year=1980, end_year=1999, max_pct_missing=0.05, country_codes=['US', 'CA']),
+    dict(start_year=1970, end_year=2010, all_years=True),
+])
+def test_analyze_station_data_matches_notebook(tmp_path, kwargs):
+    dat, inv = str(tmp_path / 'x.dat'), str(tmp_path / 'x.inv')
+    write_ghcnm(dat, inv, synthetic_stations(80, seed=4), first_year=1880, last_year=2020, seed=4)
+    got = analyze_station_data(dat, inv, store_dir=str(tmp_path / 'store'), **kwargs)
+    ref = _notebook_analyze(dat, inv, **kwargs)
+
+    assert ref['station_id'].nunique() > 0
+    key = ['station_id', 'year', 'month']
+    got = got.sort_values(key).reset_index(drop=True)
+    ref = ref.sort_values(key).reset_index(drop=True)
+    assert got[key].astype(str).equals(ref[key].astype(str))
+    np.testing.assert_array_equal(got['tavg'].to_numpy(dtype=float), ref['tavg'].to_numpy(dtype=float))
+    for col in ['latitude', 'longitude', 'elevation']:
+        np.testing.assert_array_equal(got[col].to_numpy(dtype=float), ref[col].to_numpy(dtype=float))
+    assert got['name'].tolist() == ref['name'].tolist()
+    assert got['country_code'].tolist() == ref['country_code'].tolist()
@@ -0,0 +1,73 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ghcn_tools import sweep
+from ghcn_tools.inventory import read_station_inventory
+from ghcn_tools.store import ingest_qcu
+from ghcn_tools.synthetic import generate
+from ghcn_tools.sweep import _bin_stage, run_sweep, scenario_grid
+
+
+@pytest.fixture(scope='module')
+def synthetic(tmp_path_factory):
+    out = tmp_path_factory.mktemp('sweep')
+    paths = generate(str(out), n_stations=120, first_year=1900, last_year=2020, seed=2)
+    store = ingest_qcu(paths['dat'], str(out / 'store'))
+    return store, read_station_inventory(paths['inv']), pd.read_csv(paths['metadata'])
+
+
+GRID = dict(baseline_start=[1931, 1951], baseline_end=[1960], start_year=[1920], end_year=[2020],
+            frac=[0.1, 0.3], country_codes=[None, ['US']], max_pct_missing=[0.5],
+            built_percent_column=['Built_2020_10km_percent'], nbins=[4])
+
+
+def test_pool_matches_single_process(synthetic):
+    store, stations, metadata = synthetic
+    grid = scenario_grid(**GRID)
+    serial = run_sweep(store, grid, stations=stations, metadata=metadata, workers=1)
+    pooled = run_sweep(store, grid, stations=stations, metadata=metadata, workers=3)
+
+    ensembles, trends = serial
+    assert set(ensembles['config_id']) == set(range(len(grid)))
+    assert set(trends['group']) == {'all', '0', '1', '2', '3'}
+    for a, b in zip(serial, pooled):
+        pd.testing.assert_frame_equal(a, b)
+
+
+def test_bins_are_qcut_quantiles():
+    rng = np.random.default_rng(0)
+    built = rng.gamma(0.6, 6, 200)
+    built[::17] = np.nan
+    rows = np.arange(5, 205)
+    columns = {'Built': np.concatenate([np.zeros(5), built])}
+    groups = _bin_stage({'built_percent_column': 'Built', 'nbins': 5}, columns, rows)
+
+    ok = ~np.isnan(built)
+    labels, edges = pd.qcut(built[ok], 5, labels=False, retbins=True)
+    assert groups[0][0] == 'all' and groups[0][3].all()
+    assert [g[0] for g in groups[1:]] == list(range(5))
+    for b, (_, low, high, member) in enumerate(groups[1:]):
+        assert (low, high) == (edges[b], edges[b + 1])
+        assert np.array_equal(np.flatnonzero(member), np.flatnonzero(ok)[labels == b])
+    assert sum(g[3].sum() for g in groups[1:]) == ok.sum()
+
+
+def test_shared_memory_is_unlinked_when_a_worker_raises(synthetic, monkeypatch):
+    store, _, _ = synthetic
+    created = []
+
+    class Recording(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if kwargs.get('create'):
+                created.append(self.name)
+
+    monkeypatch.setattr(sweep.shared_memory, 'SharedMemory', Recording)
+    with pytest.raises(ValueError, match='Latitude filters'):
+        run_sweep(store, scenario_grid(lat_min=[30]), workers=2)
+    assert len(created) == 1
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=created[0])